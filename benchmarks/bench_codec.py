@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of SSC message handling.
+
+Compares the eval()/json.dumps path the GUI used to take with ssc_codec.
+Run from the repository root:
+
+    python -m benchmarks.bench_codec
+"""
+import argparse
+import json
+import timeit
+
+import ssc_codec
+from ssc_codec import LEVEL_PATH, encode_set, extract, extract_level
+
+RESPONSE = '{"audio":{"out":{"level":85.5}}}'
+SPACED_RESPONSE = '{"audio": {"out": {"level": 85.5}}}'
+REORDERED_RESPONSE = '{"audio":{"out":{"mute":false,"level":85.5}}}'
+
+
+def eval_parse(raw):
+    return float(eval(raw)['audio']['out']['level'])
+
+
+def json_parse(raw):
+    return float(json.loads(raw)['audio']['out']['level'])
+
+
+def dumps_request(level):
+    return json.dumps({"audio": {"out": {"level": level}}})
+
+
+def lookup_parse(raw):
+    return float(ssc_codec.lookup(ssc_codec.decode(raw), LEVEL_PATH))
+
+
+CASES = [
+    ('parse: eval (old)', lambda: eval_parse(RESPONSE)),
+    ('parse: json.loads', lambda: json_parse(RESPONSE)),
+    (f"parse: codec decode ({'orjson' if ssc_codec.orjson else 'json'})", lambda: lookup_parse(RESPONSE)),
+    ('parse: codec extract_level', lambda: extract_level(RESPONSE)),
+    ('parse: codec extract_level, spaced', lambda: extract_level(SPACED_RESPONSE)),
+    ('parse: codec extract, fallback', lambda: extract(REORDERED_RESPONSE, LEVEL_PATH)),
+    ('build: json.dumps (old)', lambda: dumps_request(85.5)),
+    ('build: codec encode_set', lambda: encode_set(LEVEL_PATH, 85.5)),
+]
+
+
+def run(number, repeat):
+    results = {}
+    for name, func in CASES:
+        best = min(timeit.repeat(func, number=number, repeat=repeat))
+        results[name] = best / number * 1e9
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='SSC codec micro-benchmark')
+    parser.add_argument('--number', '-n', type=int, default=100000,
+                        help='Calls per timing run (default: 100000)')
+    parser.add_argument('--repeat', '-r', type=int, default=5,
+                        help='Timing runs per case; the best is reported (default: 5)')
+    args = parser.parse_args()
+
+    results = run(args.number, args.repeat)
+    baselines = {'parse': results['parse: eval (old)'], 'build': results['build: json.dumps (old)']}
+    for name, ns in results.items():
+        speedup = baselines[name.split(':')[0]] / ns
+        print(f"{name:40s} {ns:9.0f} ns/call  {speedup:6.1f}x vs old")
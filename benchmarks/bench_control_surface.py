@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Control surface load test: thousands of OSC messages a second into the engine.
+
+A generator thread plays an encoder over UDP at each rate: mostly
+/speaker/step detents with now and then a /speaker/fader move. It then
+sends a final /speaker/level. The messages go to a ControlSurface on the
+engine's loop, which drives a simulated fleet. For each rate the test
+reports:
+  * how many messages arrived;
+  * how many coalesced changes and speaker writes they became;
+  * the latency from input to speaker acknowledgement, against
+    control_surface.LATENCY_BUDGET;
+  * how long after the last message every speaker held its level.
+Run from the repository root:
+
+    python -m benchmarks.bench_control_surface
+    python -m benchmarks.bench_control_surface --rates 1000 10000 --devices 32 --seconds 3
+"""
+import argparse
+import asyncio
+import random
+import socket
+import threading
+import time
+
+from command_scheduler import LatencyStats, percentile
+from control_surface import LATENCY_BUDGET, ControlSurface, encode_osc
+from device_tracking import DeviceRecord
+from speaker_engine import SpeakerEngine
+from ssc_simulator import start_fleet
+
+
+def generate(port, rate, seconds, final_level, seed=1):
+    """Send rate messages a second for seconds, then final_level; returns (sent, final send time)"""
+    rng = random.Random(seed)
+    steps = [encode_osc('/speaker/step', 0.1), encode_osc('/speaker/step', -0.1)]
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    address = ('127.0.0.1', port)
+    sent = 0
+    start = time.perf_counter()
+    while True:
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            break
+        due = int(elapsed * rate) + 1
+        while sent < due:
+            if sent % 500 == 499:
+                sock.sendto(encode_osc('/speaker/fader', rng.uniform(0.55, 0.75)), address)
+            else:
+                sock.sendto(steps[rng.random() < 0.5], address)
+            sent += 1
+        time.sleep(0.0005)
+    time.sleep(0.05)  # The final level must not overtake the stream
+    final_at = time.monotonic()
+    sock.sendto(encode_osc('/speaker/level', final_level), address)
+    sock.close()
+    return sent + 1, final_at
+
+
+async def wait_for(predicate, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Condition not reached")
+        await asyncio.sleep(0.001)
+
+
+def run_rate(engine, surface, fleet, rate, seconds, final_level):
+    engine.scheduler.latency = LatencyStats(size=100000)
+    received, changes, writes = surface.received, surface.changes, engine.scheduler.sent
+    sent, final_at = generate(surface.port, rate, seconds, final_level)
+    engine.transport.submit(wait_for(lambda: all(
+        device.state['audio']['out']['level'] == final_level for device in fleet))).result()
+    settled = time.monotonic() - final_at
+    latency = list(engine.scheduler.latency.samples)
+    return {
+        'sent': sent,
+        'received': surface.received - received,
+        'changes': surface.changes - changes,
+        'writes': engine.scheduler.sent - writes,
+        'p50': percentile(latency, 0.5),
+        'p95': percentile(latency, 0.95),
+        'max': max(latency),
+        'settled': settled,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Control surface input load test')
+    parser.add_argument('--rates', type=int, nargs='+', default=[1000, 5000, 20000],
+                        help='OSC messages per second (default: 1000 5000 20000)')
+    parser.add_argument('--seconds', '-s', type=float, default=2.0,
+                        help='Seconds of input per rate (default: 2)')
+    parser.add_argument('--devices', '-n', type=int, default=8, help='Simulated devices (default: 8)')
+    parser.add_argument('--latency', '-l', type=float, default=2.0,
+                        help='Simulated response time in ms (default: 2)')
+    args = parser.parse_args()
+
+    sim_loop = asyncio.new_event_loop()
+    threading.Thread(target=sim_loop.run_forever, name='simulator', daemon=True).start()
+    fleet = asyncio.run_coroutine_threadsafe(
+        start_fleet(args.devices, seed=1, latency=args.latency / 1000.0), sim_loop).result()
+
+    engine = SpeakerEngine(devices=[DeviceRecord(d.name, d.host, d.port) for d in fleet]).start()
+    surface = ControlSurface(engine.transport.loop, engine.handle_control,
+                             host='127.0.0.1', port=0).start().result()
+    try:
+        engine.transport.submit(wait_for(lambda: engine.group_members() and all(
+            engine.level_cache.is_valid(name) for name in engine.group_members()))).result()
+        print(f"{args.devices} speakers, {args.seconds:.0f} s of input per rate, "
+              f"budget p95 {LATENCY_BUDGET * 1000:.0f} ms:")
+        for index, rate in enumerate(args.rates):
+            result = run_rate(engine, surface, fleet, rate, args.seconds, 50.0 + index)
+            verdict = 'within budget' if result['p95'] <= LATENCY_BUDGET else 'OVER BUDGET'
+            print(f"{rate:6d} msg/s: received {result['received']}/{result['sent']}, "
+                  f"{result['changes']} changes, {result['writes']} writes; input to ack "
+                  f"p50 {result['p50'] * 1000:5.1f} ms  p95 {result['p95'] * 1000:5.1f} ms  "
+                  f"max {result['max'] * 1000:5.1f} ms ({verdict}); "
+                  f"settled {result['settled'] * 1000:5.1f} ms after the last message")
+    finally:
+        surface.stop()
+        engine.stop()
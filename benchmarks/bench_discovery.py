@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+Time to first speaker: interface-by-interface scans vs. browsing them all at once.
+
+Each fake interface is a loopback /24 (127.0.1.0/24, 127.0.2.0/24, ...):
+the browser listens on its .1 address and that link's speakers are
+advertised from .10. A browser only accepts speakers from its own /24,
+as if each were a separate link. The main fleet sits on the last
+interface and, with three or more interfaces, one stray speaker on the
+second.
+
+The serial case scans one interface at a time, giving each --dwell
+seconds before moving on, the way switching the network selector
+worked. The concurrent case browses every interface from one loop with
+MultiInterfaceTracker and reports when the first speaker appeared, when
+all had, which interface pick_interface() settled on and whether every
+speaker was tagged with the right interface. Real zeroconf is used
+throughout. Run from the repository root:
+
+    python -m benchmarks.bench_discovery
+    python -m benchmarks.bench_discovery --interfaces 8 --devices 6 --dwell 2
+"""
+import argparse
+import asyncio
+import ipaddress
+import threading
+import time
+
+from command_scheduler import percentile
+from multi_discovery import MultiInterfaceTracker, pick_interface, zeroconf_browse
+from ssc_simulator import FleetAdvertiser, start_fleet
+
+
+async def loopback_browse(interface, found, lost):
+    """zeroconf_browse on one fake link, ignoring speakers of the others"""
+    link = ipaddress.ip_network(f"{interface}/24", strict=False)
+
+    def found_here(iface, record):
+        if ipaddress.ip_address(record.ip) in link:
+            found(iface, record)
+    await zeroconf_browse(interface, found_here, lost, binding=[interface])
+
+
+async def start_interfaces(count, devices):
+    """Advertise the fleets; returns (interfaces, {interface: speaker names}, advertisers)"""
+    interfaces = [f"127.0.{i + 1}.1" for i in range(count)]
+    layout = {interfaces[-1]: devices}
+    if count >= 3:
+        layout[interfaces[1]] = 1  # A stray speaker on another interface
+    placed = {}
+    advertisers = []
+    for index, (interface, size) in enumerate(layout.items()):
+        host = interface[:-1] + '10'
+        fleet = await start_fleet(size, prefix=f"if{index}", host=host)
+        advertisers.append(await FleetAdvertiser(host).start(fleet))
+        placed[interface] = {device.name for device in fleet}
+    return interfaces, placed, advertisers
+
+
+async def serial_scan(interfaces, dwell):
+    """Seconds until a speaker turns up, scanning one interface at a time"""
+    start = time.perf_counter()
+    for interface in interfaces:
+        found = asyncio.get_running_loop().create_future()
+        tracker = MultiInterfaceTracker([interface], asyncio.get_running_loop(), loopback_browse)
+        tracker.register_callback(lambda setup: setup.ssc_devices and not found.done()
+                                  and found.set_result(None))
+        await tracker.astart()
+        await asyncio.wait([found], timeout=dwell)
+        await tracker.astop()
+        if found.done():
+            return time.perf_counter() - start, interface
+    return None, None
+
+
+async def concurrent_scan(interfaces, placed, timeout):
+    """Browse every interface at once; returns the timings, pick and tagging"""
+    loop = asyncio.get_running_loop()
+    expected = {name: interface for interface, names in placed.items() for name in names}
+    everyone = loop.create_future()
+    first = []
+    start = time.perf_counter()
+
+    def on_change(setup):
+        if setup.ssc_devices and not first:
+            first.append(time.perf_counter() - start)
+        if {device.name for device in setup.ssc_devices} >= set(expected) and not everyone.done():
+            everyone.set_result(time.perf_counter() - start)
+
+    tracker = MultiInterfaceTracker(interfaces, loop, loopback_browse)
+    tracker.register_callback(on_change)
+    await tracker.astart()
+    await asyncio.wait([everyone], timeout=timeout)
+    devices = tracker.devices()
+    await tracker.astop()
+    return {
+        'first': first[0] if first else None,
+        'all': everyone.result() if everyone.done() else None,
+        'picked': pick_interface(devices),
+        'tagged': sum(1 for device in devices if expected.get(device.name) == device.interface),
+        'found': len(devices),
+    }
+
+
+async def run(args):
+    interfaces, placed, advertisers = await start_interfaces(args.interfaces, args.devices)
+    main_interface = interfaces[-1]
+    results = {'serial': [], 'first': [], 'all': []}
+    picks = []
+    try:
+        for _ in range(args.rounds):
+            elapsed, interface = await serial_scan(interfaces, args.dwell)
+            results['serial'].append((elapsed, interface))
+            outcome = await concurrent_scan(interfaces, placed, args.dwell * len(interfaces))
+            results['first'].append(outcome['first'])
+            results['all'].append(outcome['all'])
+            picks.append(outcome)
+    finally:
+        for advertiser in advertisers:
+            await advertiser.stop()
+    return interfaces, main_interface, results, picks
+
+
+def _ms(samples):
+    samples = [sample for sample in samples if sample is not None]
+    if not samples:
+        return "    none"
+    return f"p50 {percentile(samples, 0.5) * 1000:7.1f} ms  p95 {percentile(samples, 0.95) * 1000:7.1f} ms"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time to first speaker across several interfaces')
+    parser.add_argument('--interfaces', '-i', type=int, default=4,
+                        help='Fake interfaces (default: 4)')
+    parser.add_argument('--devices', '-n', type=int, default=4,
+                        help='Speakers on the last interface (default: 4)')
+    parser.add_argument('--dwell', type=float, default=1.0,
+                        help='Seconds a serial scan waits on each interface (default: 1.0)')
+    parser.add_argument('--rounds', '-r', type=int, default=3, help='Rounds per case (default: 3)')
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='discovery', daemon=True).start()
+    interfaces, main_interface, results, picks = asyncio.run_coroutine_threadsafe(
+        run(args), loop).result()
+    total = args.devices + (1 if args.interfaces >= 3 else 0)
+    serial_hits = sorted({interface for _, interface in results['serial'] if interface})
+    print(f"{args.interfaces} interfaces, {args.devices} speakers on {main_interface}"
+          + (f", 1 on {interfaces[1]}" if args.interfaces >= 3 else ""))
+    print(f"{'serial, first':>18}: {_ms([elapsed for elapsed, _ in results['serial']])}"
+          f"  (stopped on {', '.join(serial_hits) or 'nothing'})")
+    print(f"{'concurrent, first':>18}: {_ms(results['first'])}")
+    print(f"{'concurrent, all':>18}: {_ms(results['all'])}")
+    correct = sum(1 for outcome in picks if outcome['picked'] == main_interface)
+    tagged = min(outcome['tagged'] for outcome in picks)
+    print(f"picked {main_interface} in {correct}/{len(picks)} rounds, "
+          f"at least {tagged}/{total} speakers tagged with their interface")
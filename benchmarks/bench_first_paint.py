@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+GUI cold start: time to first paint and what is imported before it.
+
+Starts the application in fresh interpreters and times from process
+spawn to the window's first paintEvent, once as shipped (networking is
+imported after the first paint) and once with the discovery and
+networking modules imported up front, as the GUI used to. A separate
+run with -X importtime lists the slowest imports on the path to the
+first paint and any networking module that was loaded too early.
+
+    python -m benchmarks.bench_first_paint
+    python -m benchmarks.bench_first_paint --rounds 20 --target-ms 250 --output paint.json
+
+Exits 1 if the median time to first paint misses --target-ms or a
+networking module is imported before the first paint.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from command_scheduler import percentile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_TARGET_MS = 300.0
+# Must not be imported before the window has painted
+BACKEND_MODULES = ['asyncio', 'zeroconf', 'pyssc', 'netifaces', 'subprocess', 'ssc_transport',
+                   'level_monitor', 'connection_supervisor', 'command_scheduler', 'level_ramp',
+                   'net_interfaces', 'snapshots', 'room_status', 'multi_discovery',
+                   'metering', 'numpy', 'intent_queue', 'control_surface', 'level_history',
+                   'speaker_engine', 'ssc_codec', 'orjson']
+PAINTED = 'first-paint'
+
+# Runs in the measured interpreter, given the modules to import first as
+# arguments. Kept free of benchmark imports so the profile only shows the
+# application's own.
+CHILD = f"""
+import os, sys
+for module in sys.argv[1:]:
+    try:
+        __import__(module)
+    except ImportError:
+        pass
+from PyQt6.QtWidgets import QApplication
+import speaker_control
+
+class Window(speaker_control.SpeakerControlWindow):
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        print({PAINTED!r}, flush=True)
+        os._exit(0)  # Skip the backend and teardown; only the paint is measured
+
+app = QApplication(sys.argv[:1])
+window = Window(interface='%lo0')
+window.show()
+app.exec()
+"""
+
+
+def child_env():
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [ROOT, env.get('PYTHONPATH')]))
+    if sys.platform.startswith('linux') and not (env.get('DISPLAY') or env.get('WAYLAND_DISPLAY')):
+        env.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    return env
+
+
+def time_to_paint(eager, extra_args=()):
+    """Seconds from spawning the interpreter to the first paint, and its stderr"""
+    command = [sys.executable, *extra_args, '-c', CHILD, *(BACKEND_MODULES if eager else [])]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=ROOT, env=child_env(), stdout=subprocess.PIPE,
+                               stderr=subprocess.PIPE, text=True)
+    for line in process.stdout:
+        if line.strip() == PAINTED:
+            elapsed = time.perf_counter() - start
+            break
+    else:
+        elapsed = None
+    _, stderr = process.communicate()
+    if elapsed is None:
+        raise RuntimeError(f"The window never painted:\n{stderr}")
+    return elapsed, stderr
+
+
+def parse_importtime(stderr):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        imports.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return imports
+
+
+def import_profile(top):
+    _, stderr = time_to_paint(False, ['-X', 'importtime'])
+    imports = parse_importtime(stderr)
+    loaded = {name for name, _, _, _ in imports}
+    return {
+        'total_ms': round(sum(cumulative for _, _, cumulative, depth in imports if depth == 0) / 1000.0, 2),
+        'modules': len(imports),
+        'slowest': [{'module': name, 'cumulative_ms': round(cumulative / 1000.0, 2)}
+                    for name, _, cumulative, depth in
+                    sorted(imports, key=lambda entry: -entry[2])[:top]],
+        'backend_loaded_before_paint': [module for module in BACKEND_MODULES if module in loaded],
+    }
+
+
+def summarize(samples):
+    return {'count': len(samples),
+            'p50_ms': round(percentile(samples, 0.5) * 1000.0, 2),
+            'p95_ms': round(percentile(samples, 0.95) * 1000.0, 2),
+            'min_ms': round(min(samples) * 1000.0, 2)}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='GUI time to first paint and import profile')
+    parser.add_argument('--rounds', '-r', type=int, default=10,
+                        help='Cold starts to time per mode (default: 10)')
+    parser.add_argument('--target-ms', '-t', type=float, default=DEFAULT_TARGET_MS,
+                        help=f'Median time to first paint to stay under (default: {DEFAULT_TARGET_MS:.0f})')
+    parser.add_argument('--top', type=int, default=15, help='Slowest imports to list (default: 15)')
+    parser.add_argument('--output', '-o', help='Write the results to this JSON file')
+    args = parser.parse_args()
+
+    time_to_paint(False)  # Warm the OS file cache so the first sample is not an outlier
+    lazy = [time_to_paint(False)[0] for _ in range(args.rounds)]
+    eager = [time_to_paint(True)[0] for _ in range(args.rounds)]
+    report = {
+        'benchmark': 'bench_first_paint',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': sys.version.split()[0],
+        'target_ms': args.target_ms,
+        'results': {
+            'first_paint': summarize(lazy),
+            'first_paint_eager_imports': summarize(eager),
+            'imports': import_profile(args.top),
+        },
+    }
+    results = report['results']
+    report['passed'] = (results['first_paint']['p50_ms'] <= args.target_ms
+                        and not results['imports']['backend_loaded_before_paint'])
+
+    if args.output:
+        with open(args.output, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+    print(f"first paint:             p50 {results['first_paint']['p50_ms']:7.1f} ms  "
+          f"p95 {results['first_paint']['p95_ms']:7.1f} ms  (target {args.target_ms:.0f} ms)")
+    print(f"with eager networking:   p50 {results['first_paint_eager_imports']['p50_ms']:7.1f} ms  "
+          f"p95 {results['first_paint_eager_imports']['p95_ms']:7.1f} ms")
+    print(f"imports before paint:    {results['imports']['total_ms']:.1f} ms "
+          f"in {results['imports']['modules']} modules")
+    for entry in results['imports']['slowest']:
+        print(f"  {entry['cumulative_ms']:8.2f} ms  {entry['module']}")
+    if results['imports']['backend_loaded_before_paint']:
+        print(f"loaded before paint: {', '.join(results['imports']['backend_loaded_before_paint'])}")
+    sys.exit(0 if report['passed'] else 1)
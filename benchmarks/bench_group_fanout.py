@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Group-wide level change latency against a simulated fleet.
+
+For each fleet size, measures the time from queueing a group level change
+to every device acknowledging it, through the same CommandScheduler path
+the GUI uses, and compares it with writing the devices one after another
+the way Ssc_device_setup.send_all does. Run from the repository root:
+
+    python -m benchmarks.bench_group_fanout
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from command_scheduler import CommandScheduler, percentile
+from device_groups import DeviceGroup
+from ssc_codec import LEVEL_PATH, encode_set
+from ssc_simulator import start_fleet
+from ssc_transport import SscTransport
+
+FLEET_SIZES = [1, 2, 4, 8, 16, 32, 64]
+
+
+def start_simulator_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='simulator', daemon=True).start()
+    return loop
+
+
+def measure_scheduler(transport, group, names, rounds):
+    done = threading.Event()
+    remaining = [0]
+    lock = threading.Lock()
+
+    def on_ack(ack):
+        with lock:
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                done.set()
+
+    scheduler = CommandScheduler(transport, on_ack=on_ack, max_rate=None)
+    samples = []
+    for i in range(rounds):
+        targets = group.targets(60.0 + i % 20, names, 0, 90)
+        remaining[0] = len(targets)
+        done.clear()
+        start = time.perf_counter()
+        scheduler.set_levels(targets)
+        done.wait(10)
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def measure_sequential(transport, names, rounds):
+    async def write_one_by_one(level):
+        for name in names:
+            await transport.arequest(name, encode_set(LEVEL_PATH, level))
+
+    samples = []
+    for i in range(rounds):
+        start = time.perf_counter()
+        transport.submit(write_one_by_one(60.0 + i % 20)).result()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def run(sizes, rounds, latency):
+    simulator_loop = start_simulator_loop()
+    results = []
+    for size in sizes:
+        fleet = asyncio.run_coroutine_threadsafe(start_fleet(size, latency=latency), simulator_loop).result()
+        transport = SscTransport().start()
+        transport.set_devices(fleet).result()
+        names = [device.name for device in fleet]
+        group = DeviceGroup('Bench', offsets={names[-1]: -3.0})
+        parallel = measure_scheduler(transport, group, names, rounds)
+        sequential = measure_sequential(transport, names, rounds)
+        transport.stop()
+        for device in fleet:
+            asyncio.run_coroutine_threadsafe(device.stop(), simulator_loop).result()
+        results.append((size, parallel, sequential))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Group fan-out latency vs. fleet size')
+    parser.add_argument('--rounds', '-r', type=int, default=50,
+                        help='Level changes per fleet size (default: 50)')
+    parser.add_argument('--max-devices', '-n', type=int, default=64,
+                        help='Largest fleet to simulate (default: 64)')
+    parser.add_argument('--latency', '-l', type=float, default=2.0,
+                        help='Simulated device response time in ms (default: 2)')
+    args = parser.parse_args()
+
+    sizes = [size for size in FLEET_SIZES if size <= args.max_devices]
+    print(f"{'devices':>7}  {'parallel p50':>12}  {'parallel p95':>12}  {'sequential p50':>14}")
+    for size, parallel, sequential in run(sizes, args.rounds, args.latency / 1000.0):
+        print(f"{size:7d}  {percentile(parallel, 0.5) * 1000:9.2f} ms  "
+              f"{percentile(parallel, 0.95) * 1000:9.2f} ms  "
+              f"{percentile(sequential, 0.5) * 1000:11.2f} ms")
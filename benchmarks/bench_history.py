@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Level history: memory per million samples and chart query latency.
+
+Records a week of synthetic level changes from a room of speakers, as
+random walks at an even rate. They go into LevelHistory, with its
+memory-mapped segments, and into a list of dicts, the obvious
+in-process log. For each the benchmark reports:
+  * heap memory still held after recording a million samples
+    (tracemalloc), and the bytes LevelHistory put on disk;
+  * the cost of one append;
+  * the p50 time to get about --points min/max buckets for the last
+    hour, day and week, for the whole room and for one speaker. The list
+    is scanned and bucketed in Python.
+Run from the repository root:
+
+    python -m benchmarks.bench_history
+    python -m benchmarks.bench_history --samples 2000000 --devices 32 --repeat 20
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from command_scheduler import percentile
+from level_history import CLICK, REMOTE, LevelHistory
+
+WEEK = 7 * 86400
+SPANS = (('hour', 3600), ('day', 86400), ('week', WEEK))
+
+
+def synthetic_changes(samples, devices, end, seed=1):
+    """(time, name, level, source) of samples changes over the week before end"""
+    rng = random.Random(seed)
+    names = [f"speaker{index}" for index in range(devices)]
+    levels = dict.fromkeys(names, 70.0)
+    step = WEEK / samples
+    for index in range(samples):
+        name = names[index % devices]
+        level = levels[name] + rng.choice((-0.5, 0.5))
+        levels[name] = level = min(100.0, max(40.0, level))
+        yield end - WEEK + index * step, name, level, CLICK if index % 7 else REMOTE
+
+
+def record_history(changes, directory):
+    """(LevelHistory, heap bytes held, seconds per append)"""
+    tracemalloc.start()
+    history = LevelHistory(directory, max_segments=1 << 10)
+    history.open()
+    elapsed = 0.0
+    appended = 0
+    for when, name, level, source in changes:
+        start = time.perf_counter()
+        history.record(name, level, source, when)
+        elapsed += time.perf_counter() - start
+        appended += 1
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return history, held, elapsed / appended
+
+
+def record_list(changes):
+    """(list of dicts, heap bytes held, seconds per append)"""
+    tracemalloc.start()
+    log = []
+    start = time.perf_counter()
+    for when, name, level, source in changes:
+        log.append({'time': when, 'device': name, 'level': level, 'source': source})
+    elapsed = time.perf_counter() - start
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return log, held, elapsed / len(log)
+
+
+def scan_list(log, start, end, device, points):
+    """Min/max buckets by scanning every entry"""
+    width = (end - start) / points
+    buckets = {}
+    for entry in log:
+        if entry['time'] < start or entry['time'] >= end:
+            continue
+        if device is not None and entry['device'] != device:
+            continue
+        bucket = int((entry['time'] - start) // width)
+        low, high = buckets.get(bucket, (entry['level'], entry['level']))
+        buckets[bucket] = (min(low, entry['level']), max(high, entry['level']))
+    return buckets
+
+
+def p50(function, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append(time.perf_counter() - start)
+    return percentile(samples, 0.5)
+
+
+def disk_bytes(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Level history memory and query benchmark')
+    parser.add_argument('--samples', type=int, default=1000000, help='Changes recorded (default: 1000000)')
+    parser.add_argument('--devices', '-n', type=int, default=16, help='Speakers (default: 16)')
+    parser.add_argument('--points', type=int, default=1000, help='Buckets per query (default: 1000)')
+    parser.add_argument('--repeat', '-r', type=int, default=10,
+                        help='Queries timed per case, the list scan gets a third (default: 10)')
+    args = parser.parse_args()
+
+    end = time.time()
+    per_million = 1e6 / args.samples
+    with tempfile.TemporaryDirectory() as directory:
+        history, history_heap, history_append = record_history(
+            synthetic_changes(args.samples, args.devices, end), directory)
+        log, list_heap, list_append = record_list(synthetic_changes(args.samples, args.devices, end))
+        history.close()
+        history.open()  # Queries below read sealed segments back from disk
+        on_disk = disk_bytes(directory)
+        print(f"{len(history)} changes from {args.devices} speakers over a week; per million samples:")
+        print(f"{'list of dicts':>16}: {list_heap * per_million / 2**20:7.1f} MiB heap, "
+              f"append {list_append * 1e6:5.2f} us")
+        print(f"{'LevelHistory':>16}: {history_heap * per_million / 2**20:7.1f} MiB heap, "
+              f"{on_disk * per_million / 2**20:.1f} MiB on disk (records and summaries), "
+              f"append {history_append * 1e6:5.2f} us")
+        print(f"Query p50 for {args.points} buckets:")
+        for device in (None, 'speaker0'):
+            for label, span in SPANS:
+                fast = p50(lambda: history.query(end - span, end, device, args.points), args.repeat)
+                slow = p50(lambda: scan_list(log, end - span, end, device, args.points),
+                           max(1, args.repeat // 3))
+                print(f"{label:>6} {device or 'room':>9}: LevelHistory {fast * 1000:8.2f} ms  "
+                      f"list scan {slow * 1000:8.2f} ms  ({slow / fast:6.1f}x)")
+        history.close()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Cost of request instrumentation.
+
+Times back-to-back requests to one simulated device with metrics off
+(the default) and on, and the cost of a single histogram observation.
+Run from the repository root:
+
+    python -m benchmarks.bench_instrumentation
+"""
+import argparse
+import asyncio
+import threading
+import time
+import timeit
+
+from command_scheduler import percentile
+from instrumentation import Histogram, Metrics
+from ssc_codec import LEVEL_PATH, encode_get
+from ssc_simulator import start_fleet
+from ssc_transport import SscTransport
+
+
+def measure(fleet, metrics, requests):
+    """Per-request times of sequential requests awaited on the transport loop"""
+    transport = SscTransport(metrics=metrics).start()
+    command = encode_get(LEVEL_PATH)
+    name = fleet[0].name
+
+    async def run():
+        samples = []
+        for _ in range(requests):
+            start = time.perf_counter()
+            await transport.arequest(name, command)
+            samples.append(time.perf_counter() - start)
+        return samples
+
+    try:
+        transport.set_devices(fleet).result()
+        transport.submit(run()).result()  # Warm up
+        return transport.submit(run()).result()
+    finally:
+        transport.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Overhead of request instrumentation')
+    parser.add_argument('--requests', '-r', type=int, default=2000,
+                        help='Requests to time per round (default: 2000)')
+    parser.add_argument('--rounds', type=int, default=5,
+                        help='Rounds per mode, alternating between modes (default: 5)')
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='simulator', daemon=True).start()
+    fleet = asyncio.run_coroutine_threadsafe(start_fleet(1), loop).result()
+
+    histogram = Histogram()
+    observe = timeit.timeit(lambda: histogram.observe(0.0012), number=100000) / 100000
+    print(f"Histogram.observe: {observe * 1e9:.0f} ns")
+    results = {'metrics off': [], 'metrics on': []}
+    for _ in range(args.rounds):  # Alternate so neither mode gets the warmer process
+        results['metrics off'].extend(measure(fleet, None, args.requests))
+        results['metrics on'].extend(measure(fleet, Metrics(), args.requests))
+    for label, samples in results.items():
+        print(f"{label:>12}: p50 {percentile(samples, 0.5) * 1e6:7.1f} us  "
+              f"p95 {percentile(samples, 0.95) * 1e6:7.1f} us  "
+              f"mean {sum(samples) / len(samples) * 1e6:7.1f} us")
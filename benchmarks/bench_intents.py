@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Reconnect to correct level: queued offline changes vs. clicking again.
+
+Each round powers the whole simulated fleet off, waits for the engine
+to see every speaker offline, then changes the level while they are
+gone and powers them on again. With the intent queue the change is
+written in one batch as each speaker reconnects. The old behaviour
+dropped the change, so the user had to click again once the speakers
+were back, which costs a level read and then a write per speaker; that
+case is timed with no reaction time at all, so it is a lower bound.
+Both report, per speaker, the time from the supervisor seeing it online
+to the device holding the wanted level. Run from the repository root:
+
+    python -m benchmarks.bench_intents
+    python -m benchmarks.bench_intents --devices 32 --latency 5 --clicks 10
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from command_scheduler import percentile
+from connection_supervisor import ONLINE
+from device_tracking import DeviceRecord
+from speaker_engine import SpeakerEngine
+from ssc_codec import LEVEL_PATH, encode_get, encode_set, extract_level
+from ssc_simulator import start_fleet
+
+
+def device_level(device):
+    return device.state['audio']['out']['level']
+
+
+async def power(sim_loop, fleet, on):
+    """Power the simulated speakers on or off, from the engine's loop"""
+    async def switch():
+        await asyncio.gather(*(device.start() if on else device.stop() for device in fleet))
+    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(switch(), sim_loop))
+
+
+async def wait_for(predicate, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Condition not reached")
+        await asyncio.sleep(0.001)
+
+
+async def reclick(engine, name, target):
+    """What a click right after the reconnect cost: read the level, then write"""
+    extract_level(await engine.transport.arequest(name, encode_get(LEVEL_PATH)))
+    await engine.transport.arequest(name, encode_set(LEVEL_PATH, target))
+
+
+async def run_round(engine, sim_loop, fleet, target, clicks, queued):
+    """Seconds from each speaker coming online to it holding target"""
+    await power(sim_loop, fleet, False)
+    await wait_for(lambda: not engine.group_members())
+    if queued:
+        for click in range(clicks):
+            # Several clicks during the dropout collapse into one write
+            await engine.aset_level(target - (clicks - 1 - click) * 0.5)
+    online = {}
+    reclicks = []
+    on_state = engine.supervisor.on_state
+
+    def record(name, state):
+        if state == ONLINE and name not in online:
+            online[name] = time.monotonic()
+            if not queued:
+                reclicks.append(asyncio.ensure_future(reclick(engine, name, target)))
+        on_state(name, state)
+
+    engine.supervisor.on_state = record
+    reached = {}
+    try:
+        await power(sim_loop, fleet, True)
+
+        def all_reached():
+            now = time.monotonic()
+            for device in fleet:
+                if device.name not in reached and device_level(device) == target:
+                    reached[device.name] = now
+            return len(reached) == len(fleet)
+        await wait_for(all_reached)
+        await asyncio.gather(*reclicks, return_exceptions=True)
+    finally:
+        engine.supervisor.on_state = on_state
+    return [reached[name] - online.get(name, reached[name]) for name in reached]
+
+
+async def run(engine, sim_loop, fleet, args):
+    await wait_for(lambda: len(engine.group_members()) == len(fleet))
+    results = {'click again after reconnect': [], 'queued while offline': []}
+    for round_number in range(args.rounds):
+        target = 60.0 + round_number % 10
+        results['click again after reconnect'] += await run_round(
+            engine, sim_loop, fleet, target + 0.5, args.clicks, False)
+        results['queued while offline'] += await run_round(
+            engine, sim_loop, fleet, target, args.clicks, True)
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Reconnect to correct level latency')
+    parser.add_argument('--devices', '-n', type=int, default=8, help='Simulated devices (default: 8)')
+    parser.add_argument('--rounds', '-r', type=int, default=5, help='Power cycles per case (default: 5)')
+    parser.add_argument('--clicks', type=int, default=5,
+                        help='Level changes made during each dropout (default: 5)')
+    parser.add_argument('--latency', '-l', type=float, default=2.0,
+                        help='Simulated response time in ms (default: 2)')
+    parser.add_argument('--jitter', '-j', type=float, default=1.0,
+                        help='Random extra response time of up to this many ms (default: 1)')
+    args = parser.parse_args()
+
+    sim_loop = asyncio.new_event_loop()
+    threading.Thread(target=sim_loop.run_forever, name='simulator', daemon=True).start()
+    fleet = asyncio.run_coroutine_threadsafe(start_fleet(
+        args.devices, seed=1, latency=args.latency / 1000.0, jitter=args.jitter / 1000.0),
+        sim_loop).result()
+
+    engine = SpeakerEngine(devices=[DeviceRecord(d.name, d.host, d.port) for d in fleet])
+    # Reconnect quickly, so the rounds do not wait out a long backoff
+    engine.supervisor.min_backoff = 0.05
+    engine.supervisor.max_backoff = 0.2
+    engine.start()
+    try:
+        results = engine.transport.submit(run(engine, sim_loop, fleet, args)).result()
+        stats = engine.intents.stats()
+    finally:
+        engine.stop()
+    print(f"{args.devices} speakers, {args.rounds} power cycles, "
+          f"{args.clicks} level changes per dropout:")
+    for label, samples in results.items():
+        print(f"{label:>28}: p50 {percentile(samples, 0.5) * 1000:7.2f} ms  "
+              f"p95 {percentile(samples, 0.95) * 1000:7.2f} ms  max {max(samples) * 1000:7.2f} ms")
+    print(f"queued {stats['queued']} changes, {stats['collapsed']} collapsed, "
+          f"{stats['count']} applied (reconnect to acknowledgement p95 {stats['p95_ms']} ms)")
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Caller-side cost of logging: synchronous file handler vs. log_pipeline.
+
+Times a log call as seen by the calling thread (the Qt thread or the
+transport loop in the application), first with a plain FileHandler as
+the GUI used to have, then through configure_logging(): once for info
+records, which all reach the file, and once for a storm of errors from
+one call site, which the rate limiter drops before they reach the queue.
+On a local SSD the file write is cheap; the pipeline's gain is that a
+slow or stalled disk no longer holds up the caller. Run from the
+repository root:
+
+    python -m benchmarks.bench_logging
+    python -m benchmarks.bench_logging --records 50000 --json
+"""
+import argparse
+import logging
+import os
+import tempfile
+import time
+
+from command_scheduler import percentile
+from log_pipeline import configure_logging, stop_logging
+
+
+def time_calls(logger, records, storm):
+    samples = []
+    for i in range(records):
+        start = time.perf_counter()
+        if storm:
+            logger.error(f"Write to sim-{i % 64} failed: connection lost")
+        else:
+            logger.info(f"Level {i % 90} acknowledged by sim-{i % 64} after 1.2 ms")
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def report(label, samples):
+    print(f"{label:>28}: p50 {percentile(samples, 0.5) * 1e6:7.2f} us  "
+          f"p99 {percentile(samples, 0.99) * 1e6:8.2f} us  "
+          f"max {max(samples) * 1e6:9.1f} us")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Caller-side logging cost')
+    parser.add_argument('--records', '-r', type=int, default=20000,
+                        help='Log calls to time per case (default: 20000)')
+    parser.add_argument('--json', action='store_true', help='Write JSON lines through the pipeline')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        sync_logger = logging.getLogger('bench.sync')
+        sync_logger.propagate = False
+        handler = logging.FileHandler(os.path.join(directory, 'sync.log'))
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s'))
+        sync_logger.addHandler(handler)
+        sync_logger.setLevel(logging.INFO)
+        report('FileHandler, info', time_calls(sync_logger, args.records, False))
+        handler.close()
+
+        configure_logging(logging.INFO, path=os.path.join(directory, 'queued.log'),
+                          json_lines=args.json, console=False)
+        queued_logger = logging.getLogger('bench.queued')
+        report('pipeline, info', time_calls(queued_logger, args.records, False))
+        report('pipeline, error storm', time_calls(queued_logger, args.records, True))
+        start = time.perf_counter()
+        stop_logging()
+        print(f"{'writer drained in':>28}: {(time.perf_counter() - start) * 1000:.1f} ms")
+        with open(os.path.join(directory, 'queued.log')) as log_file:
+            print(f"{'records written':>28}: {sum(1 for _ in log_file)} of {2 * args.records}")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Metering cost: per-sample rendering vs. ring buffers reduced once per frame.
+
+Part one feeds synthetic meter samples for one simulated second at
+several device counts and sample rates. The naive case keeps a deque
+per device and recomputes that device's level, RMS and peak on every
+sample, as a handler that repaints per message would; MeterBank queues
+the samples and reduces every device once per frame at FRAME_RATE. Both
+report the CPU time spent per second of metering.
+
+Part two streams meters from a simulated fleet through MeterMonitor and
+reports the samples received and frames delivered per second; frames
+should stay at or below FRAME_RATE however fast the devices meter. Run
+from the repository root:
+
+    python -m benchmarks.bench_metering
+    python -m benchmarks.bench_metering --devices 8 64 256 --rates 50 200 1000 --live-devices 16
+"""
+import argparse
+import asyncio
+import collections
+import math
+import random
+import threading
+import time
+
+from metering import FLOOR_DB, FRAME_RATE, RING_SIZE, MeterBank, MeterMonitor
+from ssc_simulator import start_fleet
+from ssc_transport import SscTransport
+
+
+def synthetic_feed(devices, rate, seed=1):
+    """One second of samples as (time, name, dBFS), in arrival order"""
+    rng = random.Random(seed)
+    feed = []
+    for index in range(devices):
+        phase = rng.random()
+        for step in range(rate):
+            t = (step + phase) / rate
+            feed.append((t, f"dev{index}", -20.0 + 6.0 * math.sin(2 * math.pi * 3 * t)
+                         + rng.gauss(0.0, 1.5)))
+    feed.sort()
+    return feed
+
+
+def run_naive(feed, names):
+    """CPU seconds to recompute a device's reading on every sample"""
+    rings = {name: collections.deque(maxlen=RING_SIZE) for name in names}
+    peaks = dict.fromkeys(names, FLOOR_DB)
+    readings = {}
+    start = time.process_time()
+    for _, name, value in feed:
+        ring = rings[name]
+        ring.append(value)
+        power = sum(10.0 ** (sample / 10.0) for sample in ring) / len(ring)
+        peaks[name] = max(peaks[name], value)
+        readings[name] = (value, 10.0 * math.log10(power), peaks[name])
+    return time.process_time() - start
+
+
+def run_bank(feed, names):
+    """CPU seconds for queueing every sample plus one reduction per frame"""
+    bank = MeterBank()
+    for name in names:
+        bank.add(name)
+    interval = 1.0 / FRAME_RATE
+    next_frame = interval
+    frames = 0
+    start = time.process_time()
+    for t, name, value in feed:
+        while t >= next_frame:
+            bank.frame(next_frame)
+            frames += 1
+            next_frame += interval
+        bank.push(name, value)
+    bank.frame(next_frame)
+    return time.process_time() - start, frames + 1
+
+
+async def stream(transport, names, seconds):
+    """(samples/s, frames/s, mean devices per frame) from a live MeterMonitor"""
+    sizes = []
+    monitor = MeterMonitor(transport, lambda frame: sizes.append(len(frame)))
+    await monitor.aadd(names)
+    await asyncio.sleep(1.0)  # Let every subscription start
+    samples, frames = monitor.samples, monitor.frames
+    await asyncio.sleep(seconds)
+    result = ((monitor.samples - samples) / seconds, (monitor.frames - frames) / seconds,
+              sum(sizes) / max(len(sizes), 1))
+    await monitor.astop()
+    return result
+
+
+def run_live(devices, rate, seconds):
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='simulator', daemon=True).start()
+    fleet = asyncio.run_coroutine_threadsafe(
+        start_fleet(devices, prefix=f"meter{rate}", seed=1, meter_rate=rate), loop).result()
+    transport = SscTransport().start()
+    try:
+        transport.set_devices(fleet).result()
+        return transport.submit(stream(transport, [d.name for d in fleet], seconds)).result()
+    finally:
+        transport.stop()
+        for device in fleet:
+            asyncio.run_coroutine_threadsafe(device.stop(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Metering CPU cost and frame rate')
+    parser.add_argument('--devices', '-n', type=int, nargs='+', default=[8, 64, 256],
+                        help='Device counts for the synthetic feed (default: 8 64 256)')
+    parser.add_argument('--rates', type=int, nargs='+', default=[50, 200, 1000],
+                        help='Samples per second per device (default: 50 200 1000)')
+    parser.add_argument('--live-devices', type=int, default=8,
+                        help='Simulated devices for the live stream (default: 8)')
+    parser.add_argument('--seconds', '-s', type=float, default=3.0,
+                        help='Seconds each live stream is measured (default: 3)')
+    args = parser.parse_args()
+
+    print(f"CPU per second of metering (ring of {RING_SIZE}, {FRAME_RATE} frames/s):")
+    for devices in args.devices:
+        names = [f"dev{index}" for index in range(devices)]
+        for rate in args.rates:
+            feed = synthetic_feed(devices, rate)
+            naive = run_naive(feed, names)
+            bank, frames = run_bank(feed, names)
+            print(f"{devices:4d} devices x {rate:4d} Hz ({len(feed):7d} samples): "
+                  f"per sample {naive * 1000:8.1f} ms  "
+                  f"per frame {bank * 1000:7.1f} ms ({frames} frames)  "
+                  f"{naive / bank if bank else float('inf'):6.1f}x")
+
+    print(f"\nLive stream, {args.live_devices} simulated devices:")
+    for rate in args.rates:
+        samples, frames, size = run_live(args.live_devices, rate, args.seconds)
+        print(f"{rate:4d} Hz per device: {samples:8.0f} samples/s -> "
+              f"{frames:5.1f} frames/s of {size:.0f} devices")
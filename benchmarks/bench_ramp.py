@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Fade accuracy: the ramp engine vs. a loop of send_all calls.
+
+Fades a simulated fleet by --delta dB over --duration seconds, first as
+a Python loop that sleeps a tick and then sends the next level to every
+device (so each round trip adds to the fade), then with RampEngine for
+both curve shapes. Reports how long each fade really took, how late the
+ticks were, how far apart the devices acknowledged each step and
+whether every device ended on the target. Run from the repository root:
+
+    python -m benchmarks.bench_ramp
+    python -m benchmarks.bench_ramp --devices 32 --latency 3 --jitter 4
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from command_scheduler import encode_level
+from level_ramp import LINEAR, RAMP_TICK, S_CURVE, RampEngine, ramp_curve
+from ssc_simulator import start_fleet
+from ssc_transport import SscTransport
+
+
+async def naive_fade(transport, names, start_level, end_level, duration, tick):
+    """The fade as a loop of send_all calls, for comparison"""
+    started = time.perf_counter()
+    writes = 0
+    for _, fraction in ramp_curve(duration, tick, LINEAR):
+        await asyncio.sleep(tick)
+        await transport.arequest_all(
+            encode_level(round(start_level + (end_level - start_level) * fraction, 1)), names)
+        writes += len(names)
+    return {'duration_ms': round((time.perf_counter() - started) * 1000.0, 1), 'writes': writes}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fade timing accuracy against simulated speakers')
+    parser.add_argument('--devices', '-n', type=int, default=8, help='Simulated devices (default: 8)')
+    parser.add_argument('--delta', type=float, default=-10.0, help='Fade size in dB (default: -10)')
+    parser.add_argument('--duration', '-d', type=float, default=2.0,
+                        help='Fade duration in seconds (default: 2.0)')
+    parser.add_argument('--tick', type=float, default=RAMP_TICK,
+                        help=f'Seconds between writes (default: {RAMP_TICK})')
+    parser.add_argument('--latency', '-l', type=float, default=1.0,
+                        help='Simulated response time in ms (default: 1)')
+    parser.add_argument('--jitter', '-j', type=float, default=2.0,
+                        help='Random extra response time of up to this many ms (default: 2)')
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='simulator', daemon=True).start()
+    fleet = asyncio.run_coroutine_threadsafe(start_fleet(
+        args.devices, seed=1, latency=args.latency / 1000.0, jitter=args.jitter / 1000.0),
+        loop).result()
+    names = [device.name for device in fleet]
+    start_level = fleet[0].state['audio']['out']['level']
+    end_level = start_level + args.delta
+
+    transport = SscTransport().start()
+    try:
+        transport.set_devices(fleet).result()
+        engine = RampEngine(transport, tick=args.tick)
+        naive = transport.submit(naive_fade(transport, names, start_level, end_level,
+                                            args.duration, args.tick)).result()
+        print(f"{'send_all loop':>14}: {naive['duration_ms']:7.1f} ms for a "
+              f"{args.duration * 1000:.0f} ms fade, {naive['writes']} writes")
+        for shape in (LINEAR, S_CURVE):
+            levels = [start_level, end_level] if shape == LINEAR else [end_level, start_level]
+            report = engine.ramp(dict.fromkeys(names, levels[0]), dict.fromkeys(names, levels[1]),
+                                 args.duration, shape).result()
+            on_target = sum(1 for device in fleet if device.state['audio']['out']['level'] == levels[1])
+            print(f"{shape:>14}: {report['duration_ms']:7.1f} ms for a "
+                  f"{report['planned_ms']:.0f} ms fade, {report['writes']} writes, "
+                  f"{report['skipped']} skipped, late p50 {report['late_p50_ms']} ms "
+                  f"p95 {report['late_p95_ms']} ms, ack spread p95 {report['spread_p95_ms']} ms, "
+                  f"{on_target}/{len(fleet)} on target")
+    finally:
+        transport.stop()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Dead-speaker handling: detection, fail-fast requests and recovery.
+
+Supervises simulated devices and, per round, powers one off and on
+again. Measures how long the supervisor takes to report it offline, how
+long a request to it takes while it is offline (it should fail at once
+instead of waiting for a connect timeout), how long the device takes to
+come back online once it is listening again, and how long a hung device
+(connected but silent) takes to be caught by a health probe. Run from
+the repository root:
+
+    python -m benchmarks.bench_reconnect
+    python -m benchmarks.bench_reconnect --rounds 20 --probe-interval 0.5
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from command_scheduler import percentile
+from connection_supervisor import OFFLINE, ONLINE, ConnectionSupervisor
+from ssc_codec import LEVEL_PATH, encode_get
+from ssc_simulator import SimulatedSscDevice
+from ssc_transport import SscError, SscTransport
+
+
+class StateLog:
+    """Records when each device changed state, for waiting on transitions"""
+
+    def __init__(self):
+        self.events = {}  # (name, state) -> asyncio.Event
+        self.times = {}   # (name, state) -> time.perf_counter() of the last transition
+
+    def event(self, name, state):
+        return self.events.setdefault((name, state), asyncio.Event())
+
+    def on_state(self, name, state):
+        self.times[(name, state)] = time.perf_counter()
+        self.event(name, state).set()
+
+    async def wait(self, name, state, timeout=30.0):
+        await asyncio.wait_for(self.event(name, state).wait(), timeout)
+        self.event(name, state).clear()
+        return self.times[(name, state)]
+
+
+async def run(transport, args):
+    """Runs on the transport loop, which also hosts the simulated devices"""
+    devices = [await SimulatedSscDevice(f"sim-{i}").start() for i in range(args.devices)]
+    log = StateLog()
+    supervisor = ConnectionSupervisor(transport, on_state=log.on_state,
+                                      probe_interval=args.probe_interval, seed=1)
+    await transport.aset_devices([(d.name, d.host, d.port) for d in devices])
+    await supervisor.aadd([d.name for d in devices])
+    for device in devices:
+        await log.wait(device.name, ONLINE)
+
+    command = encode_get(LEVEL_PATH)
+    detect, fail_fast, recover, hung = [], [], [], []
+    for round_number in range(args.rounds):
+        device = devices[round_number % len(devices)]
+        powered_off = time.perf_counter()
+        await device.stop()
+        detect.append(await log.wait(device.name, OFFLINE) - powered_off)
+
+        start = time.perf_counter()
+        try:
+            await transport.arequest(device.name, command)
+        except SscError:
+            pass
+        fail_fast.append(time.perf_counter() - start)
+
+        await asyncio.sleep(args.downtime)
+        listening = time.perf_counter()
+        await device.start()
+        recover.append(await log.wait(device.name, ONLINE) - listening)
+
+        device.latency = args.timeout * 10  # Stops answering but keeps the connection open
+        silent = time.perf_counter()
+        hung.append(await log.wait(device.name, OFFLINE) - silent)
+        device.latency = 0.0
+        device.disconnect_clients()
+        await log.wait(device.name, ONLINE)
+
+    await supervisor.astop()
+    for device in devices:
+        await device.stop()
+    return {'offline detected': detect, 'request while offline': fail_fast,
+            'back online': recover, 'hung device detected': hung}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Dead-speaker detection and recovery times')
+    parser.add_argument('--devices', '-n', type=int, default=4, help='Simulated devices (default: 4)')
+    parser.add_argument('--rounds', '-r', type=int, default=8,
+                        help='Power cycles to time (default: 8)')
+    parser.add_argument('--downtime', type=float, default=1.0,
+                        help='Seconds each device stays off (default: 1.0)')
+    parser.add_argument('--probe-interval', type=float, default=1.0,
+                        help='Seconds without traffic before a health probe (default: 1.0)')
+    parser.add_argument('--timeout', type=float, default=0.5,
+                        help='SSC request and connect timeout in seconds (default: 0.5)')
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.CRITICAL)  # Failed probes and connects are expected
+
+    transport = SscTransport(timeout=args.timeout).start()
+    try:
+        results = transport.submit(run(transport, args)).result()
+    finally:
+        transport.stop()
+    for label, samples in results.items():
+        print(f"{label:>22}: p50 {percentile(samples, 0.5) * 1000:8.2f} ms  "
+              f"max {max(samples) * 1000:8.2f} ms")
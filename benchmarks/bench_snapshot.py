@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Snapshot capture and recall: batched vs. one request per parameter.
+
+Recalls a four-parameter snapshot (level, mute, delay, EQ bypass) on a
+simulated fleet, once the way single-address writes would do it (one
+request per parameter, all devices at once per parameter) and once
+with snapshots.arecall (one combined request per device). Capture is
+timed the same way. Run from the repository root:
+
+    python -m benchmarks.bench_snapshot
+    python -m benchmarks.bench_snapshot --devices 64 --latency 3 --jitter 2
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from command_scheduler import percentile
+from snapshots import SNAPSHOT_PATHS, acapture, arecall
+from ssc_codec import encode_get, encode_set
+from ssc_simulator import start_fleet
+from ssc_transport import SscTransport
+
+
+async def recall_per_parameter(transport, devices):
+    for path in SNAPSHOT_PATHS:
+        await asyncio.gather(*(transport.arequest(name, encode_set(path, values[path]))
+                               for name, values in devices.items()))
+
+
+async def capture_per_parameter(transport, names):
+    for path in SNAPSHOT_PATHS:
+        await transport.arequest_all(encode_get(path), names)
+
+
+async def time_rounds(rounds, make):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await make()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def run(transport, names, rounds):
+    snapshot = await acapture(transport, names)
+    for values in snapshot.values():
+        values.update({'/audio/out/level': 70.0, '/audio/out/mute': True,
+                       '/audio/out/delay': 1.5, '/audio/out/eq2/bypass': True})
+    return {
+        'capture, per parameter': await time_rounds(rounds, lambda: capture_per_parameter(transport, names)),
+        'capture, batched': await time_rounds(rounds, lambda: acapture(transport, names)),
+        'recall, per parameter': await time_rounds(rounds, lambda: recall_per_parameter(transport, snapshot)),
+        'recall, batched': await time_rounds(rounds, lambda: arecall(transport, snapshot)),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Snapshot capture and recall latency')
+    parser.add_argument('--devices', '-n', type=int, default=16, help='Simulated devices (default: 16)')
+    parser.add_argument('--rounds', '-r', type=int, default=20, help='Rounds per case (default: 20)')
+    parser.add_argument('--latency', '-l', type=float, default=2.0,
+                        help='Simulated response time in ms (default: 2)')
+    parser.add_argument('--jitter', '-j', type=float, default=1.0,
+                        help='Random extra response time of up to this many ms (default: 1)')
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='simulator', daemon=True).start()
+    fleet = asyncio.run_coroutine_threadsafe(start_fleet(
+        args.devices, seed=1, latency=args.latency / 1000.0, jitter=args.jitter / 1000.0),
+        loop).result()
+
+    transport = SscTransport().start()
+    try:
+        transport.set_devices(fleet).result()
+        results = transport.submit(run(transport, [d.name for d in fleet], args.rounds)).result()
+    finally:
+        transport.stop()
+    for label, samples in results.items():
+        print(f"{label:>22}: p50 {percentile(samples, 0.5) * 1000:7.2f} ms  "
+              f"p95 {percentile(samples, 0.95) * 1000:7.2f} ms")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Time from startup to a usable level, with a cold and a warm discovery cache.
+
+Cold: wait for discovery, then connect and read the level. Warm: load the
+cached speakers, connect to them directly and read the level while
+discovery is still running. mDNS discovery time depends on the network's
+responders, so it is modelled as a fixed delay (--discovery-time). Run
+from the repository root:
+
+    python -m benchmarks.bench_startup
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import threading
+import time
+
+from command_scheduler import percentile
+from device_tracking import DeviceDiff, DeviceRecord
+from discovery_cache import DiscoveryCache
+from ssc_codec import LEVEL_PATH, encode_get, extract_level
+from ssc_simulator import start_fleet
+from ssc_transport import SscTransport
+
+INTERFACE = '%lo0'
+
+
+def first_level(records):
+    """Connect to records and read the level of the first one"""
+    transport = SscTransport().start()
+    try:
+        results = transport.apply_diff(DeviceDiff(added=records), INTERFACE).result()
+        if any(results.values()):
+            raise RuntimeError(f"Connection failed: {results}")
+        return extract_level(transport.send(records[0].name, encode_get(LEVEL_PATH)).result())
+    finally:
+        transport.stop()
+
+
+def cold_start(records, discovery_time):
+    start = time.perf_counter()
+    time.sleep(discovery_time)  # Waiting for mDNS before anything can connect
+    first_level(records)
+    return time.perf_counter() - start
+
+
+def warm_start(cache_path):
+    start = time.perf_counter()
+    first_level(DiscoveryCache(cache_path).load(INTERFACE))
+    return time.perf_counter() - start
+
+
+def run(devices, rounds, discovery_time, latency):
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='simulator', daemon=True).start()
+    fleet = asyncio.run_coroutine_threadsafe(start_fleet(devices, latency=latency), loop).result()
+    records = [DeviceRecord(device.name, device.ip, device.port) for device in fleet]
+    with tempfile.TemporaryDirectory() as directory:
+        cache_path = os.path.join(directory, 'devices.json')
+        DiscoveryCache(cache_path).store(INTERFACE, records).result()
+        cold = [cold_start(records, discovery_time) for _ in range(rounds)]
+        warm = [warm_start(cache_path) for _ in range(rounds)]
+    return cold, warm
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Startup time with a cold vs. warm discovery cache')
+    parser.add_argument('--devices', '-n', type=int, default=2,
+                        help='Number of simulated speakers (default: 2)')
+    parser.add_argument('--rounds', '-r', type=int, default=10,
+                        help='Startups to time per mode (default: 10)')
+    parser.add_argument('--discovery-time', '-d', type=float, default=1.0,
+                        help='Modelled mDNS discovery time in seconds (default: 1.0)')
+    parser.add_argument('--latency', '-l', type=float, default=2.0,
+                        help='Simulated device response time in ms (default: 2)')
+    args = parser.parse_args()
+
+    cold, warm = run(args.devices, args.rounds, args.discovery_time, args.latency / 1000.0)
+    for name, samples in (('cold cache', cold), ('warm cache', warm)):
+        print(f"{name}: p50 {percentile(samples, 0.5) * 1000:8.1f} ms  "
+              f"p95 {percentile(samples, 0.95) * 1000:8.1f} ms")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Room status refresh: one combined parallel read vs. polling device by device.
+
+Reads level and mute from growing subsets of a simulated fleet three
+ways: one request per device and address in turn (a poll loop), one
+fan-out per address, and room_status.aread_status (one combined request
+per device, all devices at once). The combined read should cost about
+one round trip however many devices there are. Run from the repository
+root:
+
+    python -m benchmarks.bench_status
+    python -m benchmarks.bench_status --devices 64 --latency 3 --jitter 2
+"""
+import argparse
+import asyncio
+import threading
+import time
+
+from command_scheduler import percentile
+from room_status import STATUS_PATHS, aread_status
+from ssc_codec import encode_get
+from ssc_simulator import start_fleet
+from ssc_transport import SscTransport
+
+
+async def read_sequential(transport, names):
+    for name in names:
+        for path in STATUS_PATHS:
+            await transport.arequest(name, encode_get(path))
+
+
+async def read_per_path(transport, names):
+    for path in STATUS_PATHS:
+        await transport.arequest_all(encode_get(path), names)
+
+
+async def time_rounds(rounds, make):
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        await make()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+async def run(transport, names, rounds):
+    results = []
+    count = 1
+    while True:
+        subset = names[:count]
+        results.append((len(subset), {
+            'sequential': await time_rounds(rounds, lambda: read_sequential(transport, subset)),
+            'per address': await time_rounds(rounds, lambda: read_per_path(transport, subset)),
+            'combined': await time_rounds(rounds, lambda: aread_status(transport, subset)),
+        }))
+        if count >= len(names):
+            return results
+        count = min(count * 4, len(names))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Room status refresh latency')
+    parser.add_argument('--devices', '-n', type=int, default=16, help='Simulated devices (default: 16)')
+    parser.add_argument('--rounds', '-r', type=int, default=20, help='Rounds per case (default: 20)')
+    parser.add_argument('--latency', '-l', type=float, default=2.0,
+                        help='Simulated response time in ms (default: 2)')
+    parser.add_argument('--jitter', '-j', type=float, default=1.0,
+                        help='Random extra response time of up to this many ms (default: 1)')
+    args = parser.parse_args()
+
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='simulator', daemon=True).start()
+    fleet = asyncio.run_coroutine_threadsafe(start_fleet(
+        args.devices, seed=1, latency=args.latency / 1000.0, jitter=args.jitter / 1000.0),
+        loop).result()
+
+    transport = SscTransport().start()
+    try:
+        transport.set_devices(fleet).result()
+        results = transport.submit(run(transport, [d.name for d in fleet], args.rounds)).result()
+    finally:
+        transport.stop()
+    for count, cases in results:
+        print(f"{count} device{'s' if count != 1 else ''}:")
+        for label, samples in cases.items():
+            print(f"{label:>14}: p50 {percentile(samples, 0.5) * 1000:7.2f} ms  "
+                  f"p95 {percentile(samples, 0.95) * 1000:7.2f} ms")
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite against an in-process simulated SSC fleet.
+
+Measures mDNS discovery, connection setup, single get/set latency,
+group fan-out latency versus device count and sustained commands per
+second. Every timing uses time.perf_counter() and is summarised as
+percentiles; the results are written as JSON so runs can be compared:
+
+    python -m benchmarks.bench_suite --output before.json
+    python -m benchmarks.bench_suite --output after.json --baseline before.json
+
+Discovery advertises the fleet as _ssc._tcp services on loopback with
+the simulator's FleetAdvertiser, the way the speakers announce
+themselves; it is skipped if zeroconf is missing or multicast does not
+work on loopback. --jitter, --loss and --disconnect-rate add the
+simulator's fault injection to every device.
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import threading
+import time
+
+from command_scheduler import percentile
+from ssc_codec import LEVEL_PATH, encode_get, encode_set
+from ssc_simulator import SERVICE_TYPE, FleetAdvertiser, start_fleet
+from ssc_transport import SscError, SscTransport, failed_devices
+FLEET_SIZES = [1, 2, 4, 8, 16, 32, 64, 128, 256]
+PERCENTILES = [0.5, 0.9, 0.95, 0.99]
+# Metrics checked by --baseline; min, max and mean are too noisy to compare
+COMPARED = ('p50_ms', 'p95_ms', 'per_second')
+# Metrics where a larger value is better; everything else is a latency
+HIGHER_IS_BETTER = ('per_second',)
+
+
+def summarize(samples):
+    """Percentile summary of a list of durations in seconds, in milliseconds"""
+    if not samples:
+        return {'count': 0}
+    summary = {'count': len(samples),
+               'mean_ms': round(sum(samples) / len(samples) * 1000.0, 4),
+               'min_ms': round(min(samples) * 1000.0, 4)}
+    for fraction in PERCENTILES:
+        summary[f'p{round(fraction * 100)}_ms'] = round(percentile(samples, fraction) * 1000.0, 4)
+    summary['max_ms'] = round(max(samples) * 1000.0, 4)
+    return summary
+
+
+def start_simulator_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name='simulator', daemon=True).start()
+    return loop
+
+
+# Discovery
+
+def measure_discovery(fleet, simulator_loop, rounds, timeout):
+    """Time from starting an mDNS browse to seeing the first and the last device"""
+    try:
+        from zeroconf import IPVersion, ServiceBrowser, Zeroconf
+    except ImportError:
+        return {'skipped': 'zeroconf is not installed'}
+
+    advertiser = asyncio.run_coroutine_threadsafe(FleetAdvertiser().start(fleet),
+                                                  simulator_loop).result()
+    try:
+        first, last = [], []
+        for _ in range(rounds):
+            seen = []
+            done = threading.Event()
+
+            class Listener:
+                def add_service(self, zc, type_, name):
+                    seen.append(time.perf_counter())
+                    if len(seen) == len(fleet):
+                        done.set()
+
+                def remove_service(self, zc, type_, name):
+                    pass
+
+                def update_service(self, zc, type_, name):
+                    pass
+
+            browser_zc = Zeroconf(interfaces=['127.0.0.1'], ip_version=IPVersion.V4Only)
+            try:
+                start = time.perf_counter()
+                browser = ServiceBrowser(browser_zc, SERVICE_TYPE, Listener())
+                if not done.wait(timeout):
+                    return {'skipped': f'found {len(seen)} of {len(fleet)} devices '
+                                       f'within {timeout} s'}
+                browser.cancel()
+            finally:
+                browser_zc.close()
+            first.append(seen[0] - start)
+            last.append(seen[-1] - start)
+    finally:
+        asyncio.run_coroutine_threadsafe(advertiser.stop(), simulator_loop).result()
+    return {'first_device': summarize(first), 'all_devices': summarize(last)}
+
+
+# Connections and requests
+
+def measure_connect(fleet, rounds):
+    """Time to open one connection, and connections to the whole fleet"""
+    single, everyone = [], []
+    for _ in range(rounds):
+        transport = SscTransport().start()
+        try:
+            transport.set_devices(fleet[:1], connect=False).result()
+            start = time.perf_counter()
+            transport.connect_all().result()
+            single.append(time.perf_counter() - start)
+            transport.set_devices(fleet, connect=False).result()
+            transport.submit(transport.aclose_all()).result()
+            start = time.perf_counter()
+            transport.connect_all().result()
+            everyone.append(time.perf_counter() - start)
+        finally:
+            transport.stop()
+    return {'single': summarize(single), 'fleet': summarize(everyone)}
+
+
+def measure_request(transport, name, command, rounds):
+    """Latency of successful requests; failed ones are only counted"""
+    samples, errors = [], 0
+    for _ in range(rounds):
+        start = time.perf_counter()
+        try:
+            transport.send(name, command).result()
+            samples.append(time.perf_counter() - start)
+        except SscError:
+            errors += 1  # The next request reconnects
+    return dict(errors=errors, **summarize(samples))
+
+
+def measure_fanout(transport, names, sizes, rounds):
+    """Latency of setting the level on n devices at once, for each n"""
+    results = []
+    for size in sizes:
+        subset = names[:size]
+        samples, errors = [], 0
+        for i in range(rounds):
+            command = encode_set(LEVEL_PATH, 60.0 + i % 20)
+            start = time.perf_counter()
+            failed = failed_devices(transport.send_all(command, subset).result())
+            samples.append(time.perf_counter() - start)
+            errors += len(failed)
+        results.append(dict(devices=size, errors=errors, **summarize(samples)))
+    return results
+
+
+def measure_throughput(transport, names, duration, window):
+    """Completed requests per second with window requests in flight per device"""
+    command = encode_get(LEVEL_PATH)
+
+    async def worker(name, deadline, counts):
+        while time.perf_counter() < deadline:
+            try:
+                await transport.arequest(name, command)
+                counts[0] += 1
+            except SscError:
+                counts[1] += 1  # The next request reconnects
+
+    async def run():
+        counts = [0, 0]
+        start = time.perf_counter()
+        deadline = start + duration
+        await asyncio.gather(*(worker(name, deadline, counts)
+                               for name in names for _ in range(window)),
+                             return_exceptions=True)
+        return counts[0] / (time.perf_counter() - start), counts[1]
+
+    per_second, errors = transport.submit(run()).result()
+    return round(per_second, 1), errors
+
+
+def run(devices, rounds, latency, duration, window, discovery_rounds, discovery_timeout,
+        faults):
+    simulator_loop = start_simulator_loop()
+    fleet = asyncio.run_coroutine_threadsafe(start_fleet(devices, latency=latency, **faults),
+                                             simulator_loop).result()
+    names = [device.name for device in fleet]
+    results = {'discovery': measure_discovery(fleet, simulator_loop, discovery_rounds,
+                                              discovery_timeout)
+               if discovery_rounds else {'skipped': 'disabled'},
+               'connect': measure_connect(fleet, rounds)}
+
+    transport = SscTransport().start()
+    try:
+        transport.set_devices(fleet).result()
+        results['get'] = measure_request(transport, names[0], encode_get(LEVEL_PATH), rounds)
+        results['set'] = measure_request(transport, names[0], encode_set(LEVEL_PATH, 70.0), rounds)
+        results['fanout'] = measure_fanout(
+            transport, names, [size for size in FLEET_SIZES if size < devices] + [devices], rounds)
+        single, single_errors = measure_throughput(transport, names[:1], duration, window)
+        fleet_rate, fleet_errors = measure_throughput(transport, names, duration, window)
+        results['throughput'] = {
+            'window': window,
+            'duration_s': duration,
+            'single_device_per_second': single,
+            'single_device_errors': single_errors,
+            'fleet_per_second': fleet_rate,
+            'fleet_errors': fleet_errors,
+        }
+    finally:
+        transport.stop()
+        for device in fleet:
+            asyncio.run_coroutine_threadsafe(device.stop(), simulator_loop).result()
+    return results
+
+
+# Comparison
+
+def _flatten(results, prefix=''):
+    """Yield (metric path, value) for every number in a result tree"""
+    if isinstance(results, dict):
+        for key, value in results.items():
+            yield from _flatten(value, f'{prefix}.{key}' if prefix else key)
+    elif isinstance(results, list):
+        for item in results:
+            label = f"{prefix}[{item.get('devices')}]" if isinstance(item, dict) else prefix
+            yield from _flatten({k: v for k, v in item.items() if k != 'devices'}, label)
+    elif isinstance(results, (int, float)):
+        yield prefix, results
+
+
+def compare(baseline, current, threshold):
+    """Return (metric, before, after, change) for metrics that got worse by more than threshold"""
+    before = dict(_flatten(baseline['results']))
+    regressions = []
+    for metric, after in _flatten(current['results']):
+        old = before.get(metric)
+        if not old or not metric.endswith(COMPARED):
+            continue
+        change = (after - old) / old
+        if metric.endswith(HIGHER_IS_BETTER):
+            change = -change
+        if change > threshold:
+            regressions.append((metric, old, after, change))
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='SSC benchmark suite against a simulated fleet')
+    parser.add_argument('--devices', '-n', type=int, default=16,
+                        help='Number of simulated speakers (default: 16)')
+    parser.add_argument('--rounds', '-r', type=int, default=200,
+                        help='Samples per latency measurement (default: 200)')
+    parser.add_argument('--latency', '-l', type=float, default=0.0,
+                        help='Simulated device response time in ms (default: 0)')
+    parser.add_argument('--jitter', '-j', type=float, default=0.0,
+                        help='Simulated random extra response time in ms (default: 0)')
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help='Fraction of simulated replies delayed by a TCP retransmission '
+                             '(default: 0)')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0,
+                        help='Fraction of simulated requests that drop the connection (default: 0)')
+    parser.add_argument('--seed', type=int, default=1,
+                        help='Random seed for the simulated faults (default: 1)')
+    parser.add_argument('--duration', '-d', type=float, default=2.0,
+                        help='Seconds per throughput measurement (default: 2)')
+    parser.add_argument('--window', '-w', type=int, default=8,
+                        help='Requests in flight per device for throughput (default: 8)')
+    parser.add_argument('--discovery-rounds', type=int, default=5,
+                        help='mDNS browses to time, 0 to skip discovery (default: 5)')
+    parser.add_argument('--discovery-timeout', type=float, default=10.0,
+                        help='Seconds to wait for every device to be discovered (default: 10)')
+    parser.add_argument('--output', '-o', help='Write the results to this JSON file')
+    parser.add_argument('--baseline', '-b', help='Compare against an earlier JSON result file')
+    parser.add_argument('--threshold', '-t', type=float, default=0.25,
+                        help='Relative p50/p95/throughput change reported as a regression '
+                             '(default: 0.25)')
+    args = parser.parse_args()
+
+    report = {
+        'benchmark': 'bench_suite',
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'devices': args.devices, 'rounds': args.rounds, 'latency_ms': args.latency,
+                       'jitter_ms': args.jitter, 'loss': args.loss,
+                       'disconnect_rate': args.disconnect_rate, 'seed': args.seed},
+        'results': run(args.devices, args.rounds, args.latency / 1000.0, args.duration,
+                       args.window, args.discovery_rounds, args.discovery_timeout,
+                       {'jitter': args.jitter / 1000.0, 'loss': args.loss,
+                        'disconnect_rate': args.disconnect_rate, 'seed': args.seed}),
+    }
+    if args.output:
+        with open(args.output, 'w') as json_file:
+            json.dump(report, json_file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as json_file:
+            regressions = compare(json.load(json_file), report, args.threshold)
+        for metric, old, new, change in regressions:
+            print(f"REGRESSION {metric}: {old} -> {new} ({change * 100:+.1f}%)", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
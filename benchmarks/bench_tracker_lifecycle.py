@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Idle wakeups and interface-switch latency of the tracker thread.
+
+Compares TrackerThread with the sleep loop it replaced (wake every 100 ms,
+stop the tracker on the caller's thread, caller waits for the thread).
+The pyssc tracker is swapped for a null tracker whose stop() takes
+--tracker-stop-ms, so only the thread lifecycle is measured, not mDNS.
+Wakeups are read from /proc, so that part needs Linux. Run from the
+repository root:
+
+    python -m benchmarks.bench_tracker_lifecycle
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+
+from PyQt6.QtCore import QCoreApplication, QThread
+
+from command_scheduler import percentile
+from speaker_control import TrackerThread
+
+
+class NullTracker:
+    def __init__(self, stop_seconds):
+        self.stop_seconds = stop_seconds
+
+    def register_callback(self, callback):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        time.sleep(self.stop_seconds)
+
+
+class SleepLoopThread(QThread):
+    """The previous TrackerThread lifecycle"""
+
+    def __init__(self, tracker):
+        super().__init__()
+        self.tracker = tracker
+        self.running = True
+        self.native_id = None
+
+    def run(self):
+        self.native_id = threading.get_native_id()
+        self.tracker.start()
+        while self.running:
+            time.sleep(0.1)
+
+    def stop(self):
+        self.running = False
+        self.tracker.stop()
+
+
+class MeasuredTrackerThread(TrackerThread):
+    def __init__(self, tracker):
+        super().__init__('%lo0')
+        self.tracker = tracker
+        self.native_id = None
+
+    def run(self):
+        self.native_id = threading.get_native_id()
+        super().run()
+
+
+def context_switches(native_id):
+    path = f"/proc/self/task/{native_id}/status"
+    if not os.path.exists(path):
+        return None
+    with open(path) as status:
+        for line in status:
+            if line.startswith('voluntary_ctxt_switches'):
+                return int(line.split()[1])
+    return None
+
+
+def start(thread):
+    thread.start()
+    while thread.native_id is None:
+        time.sleep(0.001)
+    return thread
+
+
+def idle_wakeups(make_thread, seconds):
+    thread = start(make_thread())
+    before = context_switches(thread.native_id)
+    time.sleep(seconds)
+    after = context_switches(thread.native_id)
+    thread.stop()
+    thread.wait()
+    if before is None or after is None:
+        return None
+    return (after - before) / seconds
+
+
+def switch_latency(make_thread, wait_for_thread, rounds):
+    """Time the GUI thread is blocked by stopping a tracker, and time until it has finished"""
+    blocked, finished = [], []
+    for _ in range(rounds):
+        thread = start(make_thread())
+        time.sleep(0.05)
+        begin = time.perf_counter()
+        thread.stop()
+        if wait_for_thread:
+            thread.wait()
+        blocked.append(time.perf_counter() - begin)
+        thread.wait()
+        finished.append(time.perf_counter() - begin)
+    return blocked, finished
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Tracker thread idle wakeups and stop latency')
+    parser.add_argument('--idle-seconds', '-s', type=float, default=3.0,
+                        help='Idle time to count wakeups over (default: 3)')
+    parser.add_argument('--rounds', '-r', type=int, default=20,
+                        help='Interface switches to time (default: 20)')
+    parser.add_argument('--tracker-stop-ms', '-t', type=float, default=50.0,
+                        help='Time the null tracker takes to stop, in ms (default: 50)')
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    stop_seconds = args.tracker_stop_ms / 1000.0
+    variants = [
+        ('sleep loop (old)', lambda: SleepLoopThread(NullTracker(stop_seconds)), True),
+        ('event loop', lambda: MeasuredTrackerThread(NullTracker(stop_seconds)), False),
+    ]
+    for name, make_thread, wait_for_thread in variants:
+        wakeups = idle_wakeups(make_thread, args.idle_seconds)
+        blocked, finished = switch_latency(make_thread, wait_for_thread, args.rounds)
+        wakeup_text = 'n/a' if wakeups is None else f"{wakeups:6.1f}/s"
+        print(f"{name:18s} idle wakeups {wakeup_text:>8s}  "
+              f"switch blocks UI p50 {percentile(blocked, 0.5) * 1000:7.2f} ms  "
+              f"p95 {percentile(blocked, 0.95) * 1000:7.2f} ms  "
+              f"thread done p50 {percentile(finished, 0.5) * 1000:7.2f} ms")
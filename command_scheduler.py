@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Coalescing command scheduler.
+
+Rapid level changes are collapsed per device: only the newest target is
+kept, at most one write per device is in flight, and writes to a device
+are spaced at least 1/max_rate seconds apart. Intermediate targets that
+were superseded before they could be sent are dropped.
+
+The scheduler lives on the SSC transport loop; set_level() may be called
+from any thread.
+"""
+
+import asyncio
+import collections
+import logging
+import math
+import time
+
+from instrumentation import to_ms
+from ssc_codec import LEVEL_PATH, encode_set
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_RATE = 20.0  # Writes per second per device
+LATENCY_SAMPLES = 1000
+
+# Result of one write. latency runs from the oldest click folded into the
+# write to the device's acknowledgement, in seconds.
+Ack = collections.namedtuple('Ack', 'name value response error latency')
+
+
+def encode_level(level):
+    return encode_set(LEVEL_PATH, level)
+
+
+def percentile(samples, fraction):
+    """Nearest-rank percentile of a sequence of numbers"""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+    return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)]
+
+
+class LatencyStats:
+    """Rolling window of click-to-acknowledgement latencies"""
+
+    def __init__(self, size=LATENCY_SAMPLES):
+        self.samples = collections.deque(maxlen=size)
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+
+    def summary(self):
+        samples = list(self.samples)
+        return {
+            'count': len(samples),
+            'p50_ms': to_ms(percentile(samples, 0.50)),
+            'p95_ms': to_ms(percentile(samples, 0.95)),
+            'max_ms': to_ms(max(samples) if samples else None),
+        }
+
+
+class _DeviceSlot:
+    def __init__(self):
+        self.value = None       # Newest target not yet sent
+        self.clicked_at = None  # Oldest click folded into that target
+        self.last_sent = None   # Loop time of the previous write
+        self.task = None
+
+
+class CommandScheduler:
+    """Sends the latest target per device at a bounded rate"""
+
+    def __init__(self, transport, on_ack=None, max_rate=DEFAULT_MAX_RATE, encode=encode_level):
+        self.transport = transport
+        self.on_ack = on_ack
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.encode = encode
+        self.slots = {}
+        self.latency = LatencyStats()
+        self.sent = 0
+        self.dropped = 0
+
+    # Thread-safe API
+
+    def set_level(self, names, value, clicked_at=None):
+        """Queue value for the given devices; clicked_at is a time.monotonic() stamp"""
+        self.set_levels({name: value for name in names}, clicked_at)
+
+    def set_levels(self, targets, clicked_at=None):
+        """Queue a separate value per device, given as {name: value}"""
+        if clicked_at is None:
+            clicked_at = time.monotonic()
+        self.transport.loop.call_soon_threadsafe(self._enqueue, dict(targets), clicked_at)
+
+    def clear(self):
+        """Drop every target that has not been sent yet"""
+        self.transport.loop.call_soon_threadsafe(self._clear)
+
+    def forget(self, names):
+        """Drop unsent targets and rate state of devices that went away"""
+        self.transport.loop.call_soon_threadsafe(self._forget, list(names))
+
+    # Loop-side implementation
+
+    def _enqueue(self, targets, clicked_at):
+        for name, value in targets.items():
+            slot = self.slots.setdefault(name, _DeviceSlot())
+            if slot.value is not None:
+                self.dropped += 1  # Superseded before it was sent
+            else:
+                slot.clicked_at = clicked_at
+            slot.value = value
+            if slot.task is None or slot.task.done():
+                slot.task = self.transport.loop.create_task(self._drain(name, slot))
+
+    def _clear(self):
+        for slot in self.slots.values():
+            slot.value = None
+            slot.clicked_at = None
+
+    def _forget(self, names):
+        for name in names:
+            slot = self.slots.get(name)
+            if slot is None:
+                continue
+            slot.value = slot.clicked_at = None
+            # A write still in flight keeps the slot, so the next target
+            # waits for it and for the rate limit instead of racing it
+            if slot.task is None or slot.task.done():
+                del self.slots[name]
+
+    async def _drain(self, name, slot):
+        loop = asyncio.get_running_loop()
+        while slot.value is not None:
+            if slot.last_sent is not None:
+                delay = slot.last_sent + self.min_interval - loop.time()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                    if slot.value is None:
+                        break  # Cleared while waiting
+            value, clicked_at = slot.value, slot.clicked_at
+            slot.value = slot.clicked_at = None
+            slot.last_sent = loop.time()
+            self.sent += 1
+            response = error = None
+            try:
+                response = await self.transport.arequest(name, self.encode(value))
+            except Exception as e:
+                error = e
+                logger.error(f"Write to {name} failed: {e}")
+            latency = time.monotonic() - clicked_at
+            self.latency.add(latency)
+            if self.on_ack is not None:
+                try:
+                    self.on_ack(Ack(name, value, response, error, latency))
+                except Exception as e:
+                    logger.error(f"Acknowledgement handler failed: {e}")
+
+    def stats(self):
+        summary = self.latency.summary()
+        summary.update(sent=self.sent, dropped=self.dropped)
+        return summary
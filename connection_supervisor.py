@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Per-device connection supervision.
+
+Each device gets a task on the SSC transport loop that keeps its
+connection open. A connection that has been quiet for a while is probed
+with a cheap read; when the probe fails or the connection drops, the
+device is reported offline at once and reconnected in the background
+with exponential backoff plus jitter, so a dead speaker never holds up
+the UI and a fleet that lost power does not reconnect in lockstep.
+
+While a device is offline its requests fail immediately instead of each
+waiting for a connect timeout. on_state(name, state) is called on the
+transport loop whenever a device goes ONLINE or OFFLINE.
+"""
+
+import asyncio
+import logging
+import random
+import time
+
+from ssc_codec import encode_get
+from ssc_transport import SscError
+
+logger = logging.getLogger(__name__)
+
+PROBE_PATH = '/device/identity/product'  # Any answer, even an error, proves the device is alive
+PROBE_INTERVAL = 10.0  # Probe after this many seconds without traffic
+MIN_BACKOFF = 0.5
+MAX_BACKOFF = 30.0
+
+ONLINE = 'online'
+OFFLINE = 'offline'
+
+
+def backoff_delay(attempt, rng=random, min_delay=MIN_BACKOFF, max_delay=MAX_BACKOFF):
+    """Delay before reconnect attempt number attempt (from 0), with equal jitter"""
+    delay = min(max_delay, min_delay * 2 ** attempt)
+    return rng.uniform(delay / 2, delay)
+
+
+class ConnectionSupervisor:
+    """Keeps every device connected and reports when one goes offline"""
+
+    def __init__(self, transport, on_state=None, probe_interval=PROBE_INTERVAL,
+                 min_backoff=MIN_BACKOFF, max_backoff=MAX_BACKOFF, seed=None):
+        self.transport = transport
+        self.on_state = on_state
+        self.probe_interval = probe_interval
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.random = random.Random(seed)
+        self.tasks = {}
+        self.states = {}    # name -> ONLINE or OFFLINE
+        self.attempts = {}  # name -> failed reconnects since the device was last online
+
+    # Thread-safe API
+
+    def add(self, names):
+        """Start (or restart) supervising the given devices"""
+        return self.transport.submit(self.aadd(list(names)))
+
+    def remove(self, names):
+        return self.transport.submit(self.aremove(list(names)))
+
+    def stop(self):
+        return self.transport.submit(self.astop())
+
+    # Loop-side implementation
+
+    async def aadd(self, names):
+        await self.aremove(names)
+        loop = asyncio.get_running_loop()
+        for name in names:
+            if name in self.transport.connections:
+                self.tasks[name] = loop.create_task(self._supervise(name))
+
+    async def aremove(self, names):
+        tasks = [self.tasks.pop(name) for name in names if name in self.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for name in names:
+            self.states.pop(name, None)
+            self.attempts.pop(name, None)
+
+    async def astop(self):
+        await self.aremove(list(self.tasks))
+
+    def _set_state(self, name, state):
+        if self.states.get(name) == state:
+            return
+        self.states[name] = state
+        logger.info(f"{name} is {state}")
+        if self.on_state is not None:
+            try:
+                self.on_state(name, state)
+            except Exception as e:
+                logger.error(f"Connection state handler failed: {e}")
+
+    async def _supervise(self, name):
+        conn = self.transport.connections[name]
+        self.attempts[name] = 0
+        while True:
+            if not conn.connected:
+                conn.down = False  # Let connect() through
+                try:
+                    await conn.connect()
+                except SscError as e:
+                    conn.down = True
+                    self._set_state(name, OFFLINE)
+                    delay = backoff_delay(self.attempts[name], self.random,
+                                          self.min_backoff, self.max_backoff)
+                    self.attempts[name] += 1
+                    logger.debug(f"Reconnecting {name} in {delay:.1f}s: {e}")
+                    await asyncio.sleep(delay)
+                    continue
+            self.attempts[name] = 0
+            self._set_state(name, ONLINE)
+            await self._watch(conn)
+            conn.down = True
+            self._set_state(name, OFFLINE)
+
+    async def _watch(self, conn):
+        """Return once the connection has dropped or failed a health probe"""
+        # asyncio.wait rather than wait_for, which can swallow a cancellation
+        # that arrives just as the connection closes
+        closed = asyncio.ensure_future(conn.wait_closed())
+        try:
+            while not closed.done():
+                idle = time.monotonic() - conn.last_activity
+                if idle < self.probe_interval:
+                    await asyncio.wait([closed], timeout=self.probe_interval - idle)
+                    continue  # Closed, or traffic may have arrived meanwhile
+                try:
+                    await conn.request(encode_get(PROBE_PATH))
+                except SscError as e:
+                    logger.error(f"Health probe of {conn.name} failed: {e}")
+                    await conn.close()
+                    return
+        finally:
+            closed.cancel()
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hardware control surface input: OSC over UDP, and MIDI CC through mido.
+
+A fader sets the group level, an encoder steps it. OSC messages
+(OSC_ADDRESSES) and MIDI control changes (FADER_CC and ENCODER_CC) are
+reduced to those two kinds of event. An encoder can send hundreds of
+events a second, far more than a speaker should be written. So events
+are coalesced before they reach the level controls: the newest fader
+position wins and the encoder steps after it are summed. on_change then
+gets one ControlChange, at most once per flush_interval. That change goes
+through the same path as a +/- click, so the command scheduler spaces the
+writes to each speaker as usual.
+
+Events are stamped when they are read. The latency from that stamp to
+the speaker acknowledging the write is recorded by the command
+scheduler. LATENCY_BUDGET is the p95 it should stay within: one flush
+interval, one write slot at the scheduler's rate, and the round trip.
+
+OSC is unauthenticated, so by default it is only accepted from this
+machine (OSC_HOST). Listening on the network, e.g. for a tablet or a
+desk on the LAN, has to be asked for with host='0.0.0.0' or the
+address of one interface; anyone who can reach that port can then
+change the room's level.
+
+ControlSurface runs on an asyncio loop, normally the SSC transport's.
+start() and stop() may be called from any thread. MIDI needs the
+optional mido package with a backend such as python-rtmidi.
+"""
+
+import asyncio
+import collections
+import ipaddress
+import logging
+import socket
+import struct
+import time
+
+from device_groups import MAX_LEVEL, MIN_LEVEL
+
+logger = logging.getLogger(__name__)
+
+OSC_HOST = '127.0.0.1'  # Loopback only; see the module docstring
+OSC_PORT = 9000
+FLUSH_INTERVAL = 0.01  # Seconds between coalesced changes, at most 100 a second
+LATENCY_BUDGET = 0.1  # Seconds from input to speaker acknowledgement, p95
+ENCODER_STEP = 0.5  # dB per encoder detent
+FADER_CC = 7  # MIDI CC of the fader (channel volume), 0-127 across the level range
+ENCODER_CC = 16  # MIDI CC of the encoder, relative two's complement (1 = +1, 127 = -1)
+RECEIVE_BUFFER = 1 << 20  # Bytes of OSC the socket holds while the loop is busy
+STOP_TIMEOUT = 2.0
+
+LEVEL = 'level'
+STEP = 'step'
+
+# OSC address -> (kind, scale): level takes dB, fader 0-1 across the
+# level range, step dB; up and down need no argument
+OSC_ADDRESSES = {
+    '/speaker/level': (LEVEL, None),
+    '/speaker/fader': (LEVEL, 'fader'),
+    '/speaker/step': (STEP, None),
+    '/speaker/up': (STEP, 1.0),
+    '/speaker/down': (STEP, -1.0),
+}
+
+# level is the group level to set (None to step from the current one), delta
+# the dB to add to it; received_at is the time.monotonic() of the oldest
+# event folded in and count how many events were
+ControlChange = collections.namedtuple('ControlChange', 'level delta received_at count')
+
+
+class OscError(ValueError):
+    """A datagram that is not a valid OSC packet"""
+
+
+def _osc_string(data, offset):
+    end = data.find(b'\0', offset)
+    if end < 0:
+        raise OscError("Unterminated string")
+    return data[offset:end].decode('utf-8', 'replace'), (end + 4) & ~3
+
+
+def parse_osc(data):
+    """[(address, [arguments])] of an OSC message or bundle"""
+    if data.startswith(b'#bundle\0'):
+        messages = []
+        offset = 16  # After "#bundle" and the time tag
+        while offset + 4 <= len(data):
+            size, = struct.unpack_from('>i', data, offset)
+            if size < 0 or offset + 4 + size > len(data):
+                raise OscError("Truncated bundle element")
+            messages.extend(parse_osc(data[offset + 4:offset + 4 + size]))
+            offset += 4 + size
+        return messages
+    if not data.startswith(b'/'):
+        raise OscError("Not an OSC message")
+    try:
+        address, offset = _osc_string(data, 0)
+        if offset >= len(data):
+            return [(address, [])]  # No type tag string: no arguments
+        tags, offset = _osc_string(data, offset)
+        arguments = []
+        for tag in tags[1:]:
+            if tag == 'f':
+                arguments.append(struct.unpack_from('>f', data, offset)[0])
+                offset += 4
+            elif tag == 'i':
+                arguments.append(struct.unpack_from('>i', data, offset)[0])
+                offset += 4
+            elif tag == 'd':
+                arguments.append(struct.unpack_from('>d', data, offset)[0])
+                offset += 8
+            elif tag == 'h':
+                arguments.append(struct.unpack_from('>q', data, offset)[0])
+                offset += 8
+            elif tag == 's':
+                value, offset = _osc_string(data, offset)
+                arguments.append(value)
+            elif tag in 'TF':
+                arguments.append(tag == 'T')
+            elif tag == 'N':
+                arguments.append(None)
+            else:
+                raise OscError(f"Unsupported type tag {tag!r}")
+    except struct.error as e:
+        raise OscError(f"Truncated argument: {e}")
+    return [(address, arguments)]
+
+
+def encode_osc(address, *arguments):
+    """OSC message with float, int or string arguments"""
+    def padded(text):
+        raw = text.encode('utf-8') + b'\0'
+        return raw + b'\0' * (-len(raw) % 4)
+    tags = ','
+    payload = b''
+    for argument in arguments:
+        if isinstance(argument, float):
+            tags += 'f'
+            payload += struct.pack('>f', argument)
+        elif isinstance(argument, int):
+            tags += 'i'
+            payload += struct.pack('>i', argument)
+        else:
+            tags += 's'
+            payload += padded(str(argument))
+    return padded(address) + padded(tags) + payload
+
+
+def osc_event(address, arguments, addresses=OSC_ADDRESSES):
+    """(kind, value) for an OSC message, or None if it is not for us"""
+    mapping = addresses.get(address)
+    if mapping is None:
+        return None
+    kind, scale = mapping
+    if isinstance(scale, float):
+        return kind, scale
+    if not arguments or not isinstance(arguments[0], (int, float)) or isinstance(arguments[0], bool):
+        return None
+    value = float(arguments[0])
+    if scale == 'fader':
+        value = MIN_LEVEL + min(1.0, max(0.0, value)) * (MAX_LEVEL - MIN_LEVEL)
+    return kind, value
+
+
+def midi_event(message, fader_cc=FADER_CC, encoder_cc=ENCODER_CC, encoder_step=ENCODER_STEP):
+    """(kind, value) for a mido control change message, or None"""
+    if getattr(message, 'type', None) != 'control_change':
+        return None
+    if message.control == fader_cc:
+        return LEVEL, MIN_LEVEL + message.value / 127.0 * (MAX_LEVEL - MIN_LEVEL)
+    if message.control == encoder_cc and message.value not in (0, 64):
+        ticks = message.value if message.value < 64 else message.value - 128
+        return STEP, ticks * encoder_step
+    return None
+
+
+class _OscProtocol(asyncio.DatagramProtocol):
+    def __init__(self, surface):
+        self.surface = surface
+
+    def datagram_received(self, data, addr):
+        self.surface.handle_datagram(data, time.monotonic())
+
+    def error_received(self, exc):
+        logger.error(f"OSC socket error: {exc}")
+
+
+class ControlSurface:
+    """Turns fader and encoder input into coalesced level changes"""
+
+    def __init__(self, loop, on_change, host=OSC_HOST, port=OSC_PORT, midi_port=None,
+                 flush_interval=FLUSH_INTERVAL, addresses=OSC_ADDRESSES):
+        self.loop = loop
+        self.on_change = on_change  # on_change(ControlChange), called on the loop
+        self.host = host
+        self.port = port  # None: no OSC listener; 0: any free port
+        self.midi_port = midi_port  # MIDI input name, '' for the default, None for none
+        self.flush_interval = flush_interval
+        self.addresses = addresses
+        self.transport = None
+        self.midi_input = None
+        self.level = None  # Newest fader level not yet flushed
+        self.delta = 0.0  # Encoder steps after it
+        self.received_at = None  # Oldest event not yet flushed
+        self.count = 0
+        self.flush_handle = None
+        self.last_flush = 0.0
+        self.received = 0
+        self.ignored = 0
+        self.changes = 0
+
+    # Thread-safe API
+
+    def start(self):
+        return asyncio.run_coroutine_threadsafe(self.astart(), self.loop)
+
+    def stop(self):
+        future = asyncio.run_coroutine_threadsafe(self.astop(), self.loop)
+        try:
+            future.result(STOP_TIMEOUT)
+        except Exception as e:
+            logger.error(f"Error stopping the control surface: {e}")
+
+    # Loop-side implementation
+
+    async def astart(self):
+        if self.port is not None:
+            self.transport, _ = await self.loop.create_datagram_endpoint(
+                lambda: _OscProtocol(self), local_addr=(self.host, self.port))
+            self.port = self.transport.get_extra_info('sockname')[1]
+            try:
+                # An encoder burst must not overflow the default buffer
+                self.transport.get_extra_info('socket').setsockopt(
+                    socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+            except OSError as e:
+                logger.debug(f"Cannot enlarge the OSC receive buffer: {e}")
+            logger.info(f"Listening for OSC on {self.host}:{self.port}")
+            if not ipaddress.ip_address(self.transport.get_extra_info('sockname')[0]).is_loopback:
+                logger.warning(f"OSC on {self.host} is reachable from the network without "
+                               f"authentication; anyone who can reach it can change levels")
+        if self.midi_port is not None:
+            self._open_midi()
+        return self
+
+    async def astop(self):
+        if self.transport is not None:
+            self.transport.close()
+            self.transport = None
+        if self.midi_input is not None:
+            self.midi_input.close()
+            self.midi_input = None
+        if self.flush_handle is not None:
+            self.flush_handle.cancel()
+            self.flush_handle = None
+
+    def _open_midi(self):
+        try:
+            import mido
+        except ImportError:
+            logger.error("MIDI input needs the mido package (pip install mido python-rtmidi)")
+            return
+        loop = self.loop
+
+        def on_message(message):
+            # Called on mido's thread
+            loop.call_soon_threadsafe(self.handle_midi, message, time.monotonic())
+        try:
+            self.midi_input = mido.open_input(self.midi_port or None, callback=on_message)
+        except (IOError, OSError) as e:
+            logger.error(f"Cannot open MIDI input {self.midi_port or '(default)'}: {e}")
+            return
+        logger.info(f"Listening for MIDI on {self.midi_input.name}")
+
+    def handle_datagram(self, data, received_at):
+        try:
+            messages = parse_osc(data)
+        except OscError as e:
+            self.ignored += 1
+            logger.debug(f"Ignoring datagram: {e}")
+            return
+        for address, arguments in messages:
+            self.handle_event(osc_event(address, arguments, self.addresses), received_at)
+
+    def handle_midi(self, message, received_at):
+        self.handle_event(midi_event(message), received_at)
+
+    def handle_event(self, event, received_at):
+        """Fold one (kind, value) event into the pending change"""
+        if event is None:
+            self.ignored += 1
+            return
+        self.received += 1
+        kind, value = event
+        if kind == LEVEL:
+            self.level = value
+            self.delta = 0.0  # Steps before a fader move no longer matter
+        else:
+            self.delta += value
+        if self.received_at is None:
+            self.received_at = received_at
+        self.count += 1
+        if self.flush_handle is None:
+            when = max(self.loop.time(), self.last_flush + self.flush_interval)
+            self.flush_handle = self.loop.call_at(when, self._flush)
+
+    def _flush(self):
+        self.flush_handle = None
+        self.last_flush = self.loop.time()
+        change = ControlChange(self.level, self.delta, self.received_at, self.count)
+        self.level = None
+        self.delta = 0.0
+        self.received_at = None
+        self.count = 0
+        self.changes += 1
+        try:
+            self.on_change(change)
+        except Exception as e:
+            logger.error(f"Control change handler failed: {e}")
+
+    def stats(self):
+        return {'received': self.received, 'ignored': self.ignored, 'changes': self.changes}
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Named groups of SSC devices.
+
+A group has a list of member device names and an optional level offset
+per member, so e.g. a subwoofer can sit 3 dB below the mains while the
+whole group moves together. Groups are read from a JSON file:
+
+    {
+        "groups": {
+            "Mains": {"members": ["KH 150 L", "KH 150 R"]},
+            "Room": {"offsets": {"KH 750": -3.0}}
+        }
+    }
+
+A group without a "members" list contains every discovered device; an
+empty list contains none. The built-in group "All" always exists and
+contains every device with no offsets. Asking for a group that is not
+configured is an error rather than a fallback to "All", so a mistyped
+name cannot change every speaker in the room.
+"""
+
+import json
+import logging
+import os
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_GROUPS_PATH = os.path.expanduser('~/.speaker_control_groups.json')
+ALL_GROUP = 'All'
+MIN_LEVEL = 0   # Speaker level range in dB
+MAX_LEVEL = 90
+
+
+class DeviceGroup:
+    """A named set of devices with per-device level offsets in dB"""
+
+    def __init__(self, name, members=None, offsets=None):
+        self.name = name
+        self.members = None if members is None else list(members)  # None: every device
+        self.offsets = dict(offsets or {})
+
+    def resolve(self, available):
+        """Members present in the available device names, in order"""
+        if self.members is None:
+            return list(available)
+        present = set(available)
+        return [name for name in self.members if name in present]
+
+    def offset(self, name):
+        return float(self.offsets.get(name, 0.0))
+
+    def targets(self, level, available, min_level, max_level):
+        """Per-device levels for a group level, clamped to the device range"""
+        return {name: min(max_level, max(min_level, level + self.offset(name)))
+                for name in self.resolve(available)}
+
+    def group_level(self, name, device_level):
+        """Group level implied by one member's level"""
+        return device_level - self.offset(name)
+
+    def to_dict(self):
+        if self.members is None:
+            return {'offsets': self.offsets}
+        return {'members': self.members, 'offsets': self.offsets}
+
+
+class GroupManager:
+    """Holds the configured groups"""
+
+    def __init__(self, groups=None):
+        self.groups = {ALL_GROUP: DeviceGroup(ALL_GROUP)}
+        for group in groups or []:
+            self.groups[group.name] = group
+
+    def get(self, name=None):
+        """The named group, or "All" if name is None; raises ValueError if it is not configured"""
+        if name is None:
+            return self.groups[ALL_GROUP]
+        group = self.groups.get(name)
+        if group is None:
+            raise ValueError(f"Unknown group {name!r} (configured: {', '.join(self.groups)})")
+        return group
+
+    def names(self):
+        return list(self.groups)
+
+    @classmethod
+    def load(cls, path=DEFAULT_GROUPS_PATH):
+        """Read groups from a JSON file; a missing file gives just "All" """
+        if not os.path.exists(path):
+            return cls()
+        try:
+            with open(path) as json_file:
+                config = json.load(json_file)
+            groups = [DeviceGroup(name, spec.get('members'), spec.get('offsets'))
+                      for name, spec in config.get('groups', {}).items()]
+        except (OSError, ValueError, AttributeError) as e:
+            logger.error(f"Error reading groups from {path}: {e}")
+            return cls()
+        return cls(groups)
+
+    def save(self, path=DEFAULT_GROUPS_PATH):
+        config = {'groups': {name: group.to_dict() for name, group in self.groups.items()
+                             if name != ALL_GROUP}}
+        with open(path, 'w') as json_file:
+            json.dump(config, json_file, indent=2)
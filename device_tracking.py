@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Incremental device tracking.
+
+The pyssc tracker reports the whole setup on every change. DeviceTable
+turns those snapshots into add/remove/update events keyed by device
+identity (the SSC service name), so only the devices that actually
+changed are connected or disconnected.
+"""
+
+import collections
+
+SSC_PORT = 45
+AUTO_INTERFACE = 'auto'  # Interface setting that searches every interface
+
+
+class DeviceRecord(collections.namedtuple('DeviceRecord', 'name ip port interface', defaults=('',))):
+    """Identity and address of one SSC device.
+
+    interface is the one the device was discovered on, when known; it is
+    also the scope of a link-local address.
+    """
+
+    @classmethod
+    def from_device(cls, device):
+        return cls(device.name, device.ip, getattr(device, 'port', None) or SSC_PORT,
+                   getattr(device, 'interface', None) or '')
+
+
+class DeviceDiff:
+    """Changes between two device snapshots"""
+
+    def __init__(self, added=(), removed=(), updated=()):
+        self.added = list(added)      # New devices
+        self.removed = list(removed)  # Devices that disappeared
+        self.updated = list(updated)  # Known devices whose address changed
+
+    def __bool__(self):
+        return bool(self.added or self.removed or self.updated)
+
+    def __repr__(self):
+        return (f"DeviceDiff(added={[d.name for d in self.added]}, "
+                f"removed={[d.name for d in self.removed]}, "
+                f"updated={[d.name for d in self.updated]})")
+
+    @property
+    def changed(self):
+        """Devices that need a (new) connection"""
+        return self.added + self.updated
+
+
+class DeviceTable:
+    """Current set of devices, updated from full tracker snapshots"""
+
+    def __init__(self):
+        self.devices = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices.values())
+
+    def names(self):
+        return list(self.devices)
+
+    def seed(self, records):
+        """Start from previously known devices, e.g. from the discovery cache"""
+        for record in records:
+            self.devices[record.name] = record
+
+    def update(self, devices, keep=()):
+        """Replace the table with a snapshot and return what changed.
+
+        Devices named in keep stay in the table even if the snapshot does
+        not contain them.
+        """
+        snapshot = collections.OrderedDict()
+        for device in devices or []:
+            record = DeviceRecord.from_device(device)
+            snapshot[record.name] = record
+        for name in keep:
+            if name in self.devices and name not in snapshot:
+                snapshot[name] = self.devices[name]
+        diff = DeviceDiff(
+            added=[r for name, r in snapshot.items() if name not in self.devices],
+            removed=[r for name, r in self.devices.items() if name not in snapshot],
+            updated=[r for name, r in snapshot.items()
+                     if name in self.devices and self.devices[name] != r])
+        self.devices = snapshot
+        return diff
+
+    def apply(self, diff):
+        """Apply a diff produced by another table.
+
+        Returns the part of the diff that actually changed this table, so
+        devices this table already knows at the same address are not
+        reported as added again.
+        """
+        effective = DeviceDiff()
+        for record in diff.removed:
+            if self.devices.pop(record.name, None) is not None:
+                effective.removed.append(record)
+        for record in diff.changed:
+            known = self.devices.get(record.name)
+            if known is None:
+                effective.added.append(record)
+            elif known != record:
+                effective.updated.append(record)
+            self.devices[record.name] = record
+        return effective
+
+    def clear(self):
+        """Forget every device and return the diff that removes them"""
+        diff = DeviceDiff(removed=list(self.devices.values()))
+        self.devices.clear()
+        return diff
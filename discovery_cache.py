@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Persistent cache of discovered speakers.
+
+Remembers the speakers seen on each network interface (identity,
+address, port and when each was last seen) so the next launch can
+connect to them directly while mDNS discovery runs in the background to
+confirm or correct the list. Storing merges into what is cached: a
+speaker that was slow or unreachable on one run stays cached, and is
+only dropped once it has not been seen for CACHE_MAX_AGE.
+
+The file is written on a background thread, so storing is cheap for the
+GUI and the transport loop.
+"""
+
+import concurrent.futures
+import json
+import logging
+import os
+import threading
+import time
+
+from device_tracking import DeviceRecord
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.expanduser('~/.speaker_control_devices.json')
+CACHE_GRACE_SECONDS = 10  # How long mDNS gets to find cached speakers before they are dropped
+CACHE_MAX_AGE = 30 * 86400  # Seconds a speaker stays cached without being seen
+SEEN_RESOLUTION = 3600  # Last-seen times are refreshed at most this often, to spare writes
+
+
+class DiscoveryCache:
+    """Known speakers per interface, stored as JSON"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_age=CACHE_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self.entries = None  # Loaded lazily
+        self.lock = threading.Lock()
+        self.executor = None  # Writes the file, created on the first store
+
+    def _load(self):
+        if self.entries is None:
+            self.entries = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path) as json_file:
+                        self.entries = json.load(json_file)
+                except (OSError, ValueError) as e:
+                    logger.error(f"Error reading discovery cache {self.path}: {e}")
+        return self.entries
+
+    def load(self, interface):
+        """Speakers last seen on an interface, as DeviceRecords"""
+        with self.lock:
+            entry = self._load().get(interface.lstrip('%'), {})
+        try:
+            return [DeviceRecord(d['name'], d['ip'], int(d['port']), d.get('interface', ''))
+                    for d in entry.get('devices', [])]
+        except (KeyError, TypeError, ValueError) as e:
+            logger.error(f"Ignoring malformed discovery cache entry: {e}")
+            return []
+
+    def store(self, interface, records, now=None):
+        """Merge speakers seen now into an interface's entry.
+
+        Returns a Future of the file write, or None if nothing changed.
+        """
+        if now is None:
+            now = time.time()
+        key = interface.lstrip('%')
+        with self.lock:
+            entries = self._load()
+            entry = entries.get(key, {})
+            old = entry.get('devices', [])
+            merged = {d.get('name'): d for d in old if isinstance(d, dict)}
+            for r in records:
+                device = dict({'name': r.name, 'ip': r.ip, 'port': r.port},
+                              **({'interface': r.interface} if r.interface else {}))
+                known = merged.get(r.name)
+                seen = known.get('seen', 0) if known else 0
+                if known and {k: v for k, v in known.items() if k != 'seen'} == device \
+                        and now - seen < SEEN_RESOLUTION:
+                    continue  # Same address, seen recently enough
+                device['seen'] = now
+                merged[r.name] = device
+            devices = [d for d in merged.values()
+                       if now - d.get('seen', entry.get('updated', now)) <= self.max_age]
+            if devices == old:
+                return None
+            entries[key] = {'devices': devices, 'updated': now}
+            text = json.dumps(entries, indent=2)
+            if self.executor is None:
+                self.executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix='discovery-cache')
+        return self.executor.submit(self._write, text)
+
+    def _write(self, text):
+        # One worker, so writes land in the order they were stored
+        try:
+            with open(self.path, 'w') as json_file:
+                json_file.write(text)
+        except OSError as e:
+            logger.error(f"Error writing discovery cache {self.path}: {e}")
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hot-path instrumentation.
+
+Metrics records latency histograms, error counts and reconnect counts
+per device for SSC requests and connections, plus histograms for group
+fan-outs, connect-all rounds and tracker callbacks. It can be exported
+as JSON or in the Prometheus text format.
+
+Instrumentation is off unless a Metrics object is passed in: the
+transport and the tracker only test ``metrics is not None`` on the hot
+path, so a disabled build pays for one comparison per request. Set
+SPEAKER_CONTROL_METRICS=1 (or pass --metrics) to enable it at startup.
+
+Observations happen on the transport and tracker threads and snapshots
+on the GUI thread. Every update is a single integer or float increment,
+so no lock is taken on the hot path; a snapshot may be a few events
+behind but is never corrupt.
+"""
+
+import bisect
+import json
+import os
+import time
+
+# Upper bounds in seconds; requests on a LAN land in the low milliseconds
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+ENV_VARIABLE = 'SPEAKER_CONTROL_METRICS'
+
+
+def enabled_by_environment():
+    return os.environ.get(ENV_VARIABLE, '').lower() in ('1', 'true', 'yes', 'on')
+
+
+class Histogram:
+    """Fixed-bucket latency histogram, cumulative like Prometheus' on export"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # The last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+
+    def quantile(self, fraction):
+        """Upper bound of the bucket holding the given quantile, or None"""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return float('inf')
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'sum_s': round(self.sum, 6),
+            'mean_ms': round(self.sum / self.count * 1000.0, 3) if self.count else None,
+            'p50_le_ms': to_ms(self.quantile(0.5)),
+            'p95_le_ms': to_ms(self.quantile(0.95)),
+            'p99_le_ms': to_ms(self.quantile(0.99)),
+            'buckets': {_bound_label(bound): count
+                        for bound, count in zip(self.buckets + (float('inf'),), self.counts)},
+        }
+
+    def prometheus(self, name, labels=''):
+        separator = ',' if labels else ''
+        suffix = f'{{{labels}}}' if labels else ''
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), self.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{{labels}{separator}le="{_bound_label(bound)}"}} {cumulative}')
+        lines.append(f'{name}_sum{suffix} {self.sum}')
+        lines.append(f'{name}_count{suffix} {self.count}')
+        return lines
+
+
+class DeviceMetrics:
+    """Request and connection statistics of one device"""
+
+    def __init__(self):
+        self.requests = Histogram()
+        self.connects = Histogram()
+        self.errors = {}  # kind -> count
+        self.reconnects = 0
+
+    def to_dict(self):
+        return {
+            'requests': self.requests.to_dict(),
+            'connects': self.connects.to_dict(),
+            'errors': dict(self.errors),
+            'reconnects': self.reconnects,
+        }
+
+
+class Metrics:
+    """Per-device and fleet-wide metrics for the SSC hot paths"""
+
+    def __init__(self):
+        self.started = time.time()
+        self.devices = {}
+        self.fanout = Histogram()         # arequest_all rounds (send_all)
+        self.connect_all = Histogram()    # aconnect_all / aapply_diff rounds
+        self.tracker_callbacks = Histogram()
+
+    def device(self, name):
+        entry = self.devices.get(name)
+        if entry is None:
+            entry = self.devices[name] = DeviceMetrics()
+        return entry
+
+    # Recording, called from the hot paths
+
+    def observe_request(self, name, seconds):
+        self.device(name).requests.observe(seconds)
+
+    def record_error(self, name, kind):
+        errors = self.device(name).errors
+        errors[kind] = errors.get(kind, 0) + 1
+
+    def record_connect(self, name, seconds, reconnect):
+        entry = self.device(name)
+        entry.connects.observe(seconds)
+        if reconnect:
+            entry.reconnects += 1
+
+    def observe_fanout(self, seconds):
+        self.fanout.observe(seconds)
+
+    def observe_connect_all(self, seconds):
+        self.connect_all.observe(seconds)
+
+    def observe_tracker_callback(self, seconds):
+        self.tracker_callbacks.observe(seconds)
+
+    # Export
+
+    def snapshot(self):
+        return {
+            'uptime_s': round(time.time() - self.started, 1),
+            'devices': {name: entry.to_dict() for name, entry in list(self.devices.items())},
+            'fanout': self.fanout.to_dict(),
+            'connect_all': self.connect_all.to_dict(),
+            'tracker_callbacks': self.tracker_callbacks.to_dict(),
+        }
+
+    def to_json(self, **extra):
+        snapshot = self.snapshot()
+        snapshot.update(extra)
+        return json.dumps(snapshot, indent=2)
+
+    def to_prometheus(self):
+        lines = []
+        devices = list(self.devices.items())
+
+        def header(name, kind, text):
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} {kind}')
+
+        header('ssc_request_seconds', 'histogram', 'SSC request round-trip time')
+        for name, entry in devices:
+            lines.extend(entry.requests.prometheus('ssc_request_seconds', _labels(device=name)))
+        header('ssc_connect_seconds', 'histogram', 'Time to open an SSC connection')
+        for name, entry in devices:
+            lines.extend(entry.connects.prometheus('ssc_connect_seconds', _labels(device=name)))
+        header('ssc_request_errors_total', 'counter', 'Failed SSC requests and connections')
+        for name, entry in devices:
+            for kind, count in sorted(entry.errors.items()):
+                lines.append(f'ssc_request_errors_total{{{_labels(device=name, kind=kind)}}} {count}')
+        header('ssc_reconnects_total', 'counter', 'Connections reopened after the first')
+        for name, entry in devices:
+            lines.append(f'ssc_reconnects_total{{{_labels(device=name)}}} {entry.reconnects}')
+        header('ssc_fanout_seconds', 'histogram', 'Time for a command to reach every device')
+        lines.extend(self.fanout.prometheus('ssc_fanout_seconds'))
+        header('ssc_connect_all_seconds', 'histogram', 'Time to connect a set of devices')
+        lines.extend(self.connect_all.prometheus('ssc_connect_all_seconds'))
+        header('tracker_callback_seconds', 'histogram', 'Time spent in discovery callbacks')
+        lines.extend(self.tracker_callbacks.prometheus('tracker_callback_seconds'))
+        return '\n'.join(lines) + '\n'
+
+    def to_text(self):
+        """Fixed-width table for the diagnostics pane"""
+        lines = [f"{'device':<20} {'reqs':>6} {'p50':>7} {'p95':>7} {'p99':>7} {'errs':>5} {'reconn':>6}"]
+        for name, entry in sorted(list(self.devices.items())):
+            requests = entry.requests
+            lines.append(f"{name[:20]:<20} {requests.count:>6} "
+                         f"{_fmt(requests.quantile(0.5))} {_fmt(requests.quantile(0.95))} "
+                         f"{_fmt(requests.quantile(0.99))} {sum(entry.errors.values()):>5} "
+                         f"{entry.reconnects:>6}")
+        lines.append('')
+        for label, histogram in (('fan-out', self.fanout), ('connect all', self.connect_all),
+                                 ('tracker callback', self.tracker_callbacks)):
+            lines.append(f"{label:<20} {histogram.count:>6} {_fmt(histogram.quantile(0.5))} "
+                         f"{_fmt(histogram.quantile(0.95))} {_fmt(histogram.quantile(0.99))}")
+        lines.append('')
+        lines.append('Latencies in ms are bucket upper bounds')
+        return '\n'.join(lines)
+
+
+def to_ms(seconds):
+    """Seconds as milliseconds rounded to the microsecond; None stays None"""
+    if seconds is None:
+        return None
+    return 'inf' if seconds == float('inf') else round(seconds * 1000.0, 3)
+
+
+def _fmt(seconds):
+    value = to_ms(seconds)
+    return f"{'--' if value is None else value:>7}"
+
+
+def _bound_label(bound):
+    return '+Inf' if bound == float('inf') else repr(bound)
+
+
+def _labels(**labels):
+    return ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items())
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Level changes for speakers that cannot be reached yet.
+
+A level change made while a speaker is offline cannot be written, but it
+should not be lost either. IntentQueue keeps the newest target level per
+device; a newer one replaces it, so however many clicks a dropout sees,
+one write per device is left. When devices reconnect, take() hands back
+their targets in one batch for a single fan-out through the command
+scheduler. Targets older than max_age are dropped rather than applied to
+a room that has since moved on.
+
+The queue also records how long the batch took to land, from the
+reconnect to the device acknowledging the queued level.
+
+Not thread-safe: the GUI uses it from the Qt thread, the engine from the
+SSC transport loop.
+"""
+
+import collections
+import time
+
+from command_scheduler import LatencyStats
+
+INTENT_MAX_AGE = 300.0  # Seconds a queued level stays worth applying
+
+Intent = collections.namedtuple('Intent', 'level queued_at')
+
+
+class IntentQueue:
+    """Newest wanted level per unreachable device"""
+
+    def __init__(self, max_age=INTENT_MAX_AGE):
+        self.max_age = max_age
+        self.intents = {}  # name -> Intent
+        self.applying = {}  # name -> (Intent, time.monotonic() of the reconnect)
+        self.latency = LatencyStats()  # Reconnect to acknowledged level
+        self.queued = 0
+        self.collapsed = 0
+        self.expired = 0
+
+    def __len__(self):
+        return len(self.intents)
+
+    def __contains__(self, name):
+        return name in self.intents
+
+    def set_levels(self, targets, now=None):
+        """Queue {name: level}, replacing anything queued for those devices"""
+        if now is None:
+            now = time.monotonic()
+        for name, level in targets.items():
+            if name in self.intents:
+                self.collapsed += 1
+            self.intents[name] = Intent(level, now)
+            self.queued += 1
+
+    def level(self, name):
+        intent = self.intents.get(name)
+        return intent.level if intent else None
+
+    def discard(self, names):
+        """Drop queued levels that a direct write has made obsolete"""
+        for name in names:
+            self.intents.pop(name, None)
+
+    def clear(self):
+        self.intents.clear()
+        self.applying.clear()
+
+    def take(self, names, now=None):
+        """Remove and return {name: level} queued for the given devices.
+
+        The result is remembered until acknowledged() or failed(), so the
+        time from the reconnect (now) to the level landing can be measured
+        and a write that fails again can be queued again.
+        """
+        if now is None:
+            now = time.monotonic()
+        targets = {}
+        for name in names:
+            intent = self.intents.pop(name, None)
+            if intent is None:
+                continue
+            if now - intent.queued_at > self.max_age:
+                self.expired += 1
+                continue
+            targets[name] = intent.level
+            self.applying[name] = (intent, now)
+        return targets
+
+    def acknowledged(self, name, level, now=None):
+        """Seconds from reconnect to a device confirming its queued level, else None"""
+        applying = self.applying.get(name)
+        if applying is None or applying[0].level != level:
+            return None
+        del self.applying[name]
+        elapsed = (time.monotonic() if now is None else now) - applying[1]
+        self.latency.add(elapsed)
+        return elapsed
+
+    def failed(self, name, level):
+        """Queue a level again whose write failed, unless a newer one is queued"""
+        applying = self.applying.get(name)
+        if applying is None or applying[0].level != level:
+            return
+        del self.applying[name]
+        self.intents.setdefault(name, applying[0])
+
+    def stats(self):
+        summary = self.latency.summary()
+        summary.update(pending=len(self.intents), queued=self.queued,
+                       collapsed=self.collapsed, expired=self.expired)
+        return summary
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local cache of speaker levels.
+
+Keeps the last level each device confirmed together with the target of any
+write still in flight, so +/- can be applied to the cached value instead of
+reading the level back from a speaker before every write.
+
+Invalidation rules:
+  * a write acknowledgement confirms the reported level, a write error
+    (or an unreadable reply) drops the device's entry (``end_write``);
+  * a device diff drops the entries of devices that were removed or
+    changed address;
+  * a device the connection supervisor reports offline is dropped, and
+    its level is read again once it reconnects; when every speaker is
+    lost, or the network is switched, the whole cache is dropped;
+  * poll and push results only overwrite an entry when no write to that
+    device is in flight, so a slow poll cannot undo a fresh click.
+"""
+
+import time
+
+
+class DeviceLevel:
+    """Cached level state for one device"""
+
+    def __init__(self):
+        self.confirmed = None     # Last level reported by the device
+        self.confirmed_at = None  # time.monotonic() of that report
+        self.target = None        # Newest level requested but not yet acknowledged
+
+    @property
+    def level(self):
+        """Best known level: the newest target, else the confirmed level"""
+        return self.target if self.target is not None else self.confirmed
+
+
+class LevelCache:
+    """Per-device level cache; not thread-safe, used from the Qt thread or the transport loop"""
+
+    def __init__(self):
+        self.devices = {}
+
+    def level(self, name):
+        entry = self.devices.get(name)
+        return entry.level if entry else None
+
+    def is_valid(self, name):
+        return self.level(name) is not None
+
+    def begin_write(self, names, level):
+        """Record that level is being written to the given devices"""
+        for name in names:
+            self.devices.setdefault(name, DeviceLevel()).target = level
+
+    def end_write(self, name, written, level=None):
+        """Record the outcome of writing written to a device.
+
+        level is the level the device reported back, or None if the write
+        failed. Writes may be coalesced, so the pending target is only
+        cleared once the newest one has been acknowledged.
+        """
+        entry = self.devices.get(name)
+        if entry is None:
+            return  # Invalidated while the write was in flight
+        if level is None:
+            self.invalidate(name)
+            return
+        if entry.target == written:
+            entry.target = None
+        self._confirm(entry, level)
+
+    def update_from_poll(self, name, level):
+        """Store a level read from the device unless a write is pending"""
+        entry = self.devices.setdefault(name, DeviceLevel())
+        if entry.target is not None:
+            return False
+        self._confirm(entry, level)
+        return True
+
+    def invalidate(self, name=None):
+        """Forget one device, or every device if name is None"""
+        if name is None:
+            self.devices.clear()
+        else:
+            self.devices.pop(name, None)
+
+    def _confirm(self, entry, level):
+        entry.confirmed = level
+        entry.confirmed_at = time.monotonic()
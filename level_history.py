@@ -0,0 +1,340 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Level history: who changed which speaker's level, and when.
+
+Every change is one 16-byte record (wall-clock time, level, device id,
+source) appended to a memory-mapped segment file of SEGMENT_RECORDS
+records. A full segment is sealed and a new one started; beyond
+MAX_SEGMENTS the oldest is deleted. Memory use stays fixed whatever the
+uptime: records live in the page cache, not in Python objects, and
+disk use is bounded as well. Only changes are recorded: a level equal
+to the device's previous record is skipped.
+
+When a segment is sealed, min/max summaries over buckets of
+SUMMARY_WIDTHS seconds are computed and stored beside it. A chart of a
+day or a week therefore reads a few thousand summary rows instead of
+every record. Only the segment still being written is reduced on the
+fly.
+
+Files live in one directory, locked so that a GUI and a daemon do not
+write the same history. The recorder is not thread-safe: the GUI uses
+it from the Qt thread, the engine from the SSC transport loop.
+"""
+
+import collections
+import glob
+import json
+import logging
+import math
+import os
+import re
+import time
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_HISTORY_DIR = os.path.expanduser('~/.speaker_control_history')
+SEGMENT_RECORDS = 1 << 16  # Records per segment file (1 MiB)
+MAX_SEGMENTS = 64  # Segments kept, 4M records in all
+SUMMARY_WIDTHS = (60, 600, 3600)  # Seconds per min/max bucket
+DEFAULT_POINTS = 1000
+
+# Who made a change
+CLICK = 'click'
+FADE = 'fade'
+SURFACE = 'surface'
+SNAPSHOT = 'snapshot'
+QUEUED = 'queued'  # Made while offline, applied on reconnect
+API = 'api'  # Daemon client
+REMOTE = 'remote'  # Seen on the speaker, made elsewhere (front panel, another app)
+SOURCES = (CLICK, FADE, SURFACE, SNAPSHOT, QUEUED, API, REMOTE)
+
+RECORD = np.dtype([('t', '<f8'), ('level', '<f4'), ('device', '<u2'), ('source', 'u1')],
+                  align=True)
+SUMMARY = np.dtype([('t', '<f8'), ('min', '<f4'), ('max', '<f4'), ('count', '<u4'),
+                    ('device', '<u2')], align=True)
+
+HistoryEntry = collections.namedtuple('HistoryEntry', 'time device level source')
+# Bucket start times with the lowest and highest level seen in each bucket
+LevelEnvelope = collections.namedtuple('LevelEnvelope', 'times mins maxs')
+
+_SEGMENT_NAME = re.compile(r'segment-(\d+)\.npy$')
+
+
+def summarize(records, width):
+    """Min/max SUMMARY rows per (bucket, device) of time-ordered records"""
+    if not len(records):
+        return np.zeros(0, dtype=SUMMARY)
+    buckets = np.floor(records['t'] / width).astype(np.int64)
+    keys = buckets * 65536 + records['device']
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+    levels = records['level'][order]
+    summary = np.zeros(len(starts), dtype=SUMMARY)
+    summary['t'] = (keys[starts] // 65536) * float(width)
+    summary['device'] = keys[starts] % 65536
+    summary['min'] = np.minimum.reduceat(levels, starts)
+    summary['max'] = np.maximum.reduceat(levels, starts)
+    summary['count'] = np.diff(np.r_[starts, len(keys)])
+    return summary
+
+
+def envelope(times, mins, maxs, start, width):
+    """Merge time-ordered rows into buckets of width seconds from start"""
+    if not len(times):
+        return LevelEnvelope(np.zeros(0), np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.float32))
+    buckets = np.floor((times - start) / width).astype(np.int64)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    return LevelEnvelope(start + buckets[starts] * width,
+                         np.minimum.reduceat(mins, starts), np.maximum.reduceat(maxs, starts))
+
+
+class _Segment:
+    """One segment file, sealed or being written"""
+
+    def __init__(self, path, index, records, count):
+        self.path = path
+        self.index = index
+        self.records = records  # Memory map of the file
+        self.count = count
+
+    @property
+    def first(self):
+        return float(self.records['t'][0]) if self.count else None
+
+    @property
+    def last(self):
+        return float(self.records['t'][self.count - 1]) if self.count else None
+
+    def summary_path(self, width):
+        return f"{self.path[:-4]}-{width}.npy"
+
+
+class LevelHistory:
+    """Append-only level change log in memory-mapped segments"""
+
+    def __init__(self, directory=DEFAULT_HISTORY_DIR, segment_records=SEGMENT_RECORDS,
+                 max_segments=MAX_SEGMENTS):
+        self.directory = directory
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self.lock_file = None
+        self.devices = []  # Device names, indexed by id
+        self.device_ids = {}
+        self.sealed = []  # _Segment, oldest first
+        self.active = None
+        self.last_levels = {}  # Device id -> last recorded level
+        self.last_time = 0.0
+        self.enabled = False
+
+    def open(self):
+        """Open (or create) the history; returns False if another process has it"""
+        os.makedirs(self.directory, exist_ok=True)
+        if not self._lock():
+            return False
+        self.sealed = []
+        self.active = None
+        self.last_levels = {}
+        devices_path = os.path.join(self.directory, 'devices.json')
+        if os.path.exists(devices_path):
+            try:
+                with open(devices_path) as json_file:
+                    self.devices = json.load(json_file)
+            except (OSError, ValueError) as e:
+                logger.error(f"Error reading {devices_path}: {e}")
+        self.device_ids = {name: index for index, name in enumerate(self.devices)}
+        next_index = 0
+        for path in sorted(glob.glob(os.path.join(self.directory, 'segment-*.npy'))):
+            match = _SEGMENT_NAME.search(path)
+            if match is None:
+                continue  # A summary file
+            segment = self._map(path, int(match.group(1)))
+            if segment is None:
+                continue
+            if self.active is not None:
+                self._seal()
+            self.active = segment
+            next_index = segment.index + 1
+        if self.active is not None and self.active.count == len(self.active.records):
+            self._seal()
+        if self.active is None:
+            self._start_segment(next_index)
+        self._restore_last_levels()
+        self.enabled = True
+        logger.info(f"Level history in {self.directory}: {len(self)} records")
+        return True
+
+    def close(self):
+        if self.active is not None:
+            self.active.records.flush()
+        if self.lock_file is not None:
+            self.lock_file.close()
+            self.lock_file = None
+        self.enabled = False
+
+    def __len__(self):
+        return sum(segment.count for segment in self.sealed) + (self.active.count if self.active else 0)
+
+    def record(self, name, level, source, when=None):
+        """Append a level change; returns False if it repeats the device's last level"""
+        if not self.enabled or level is None:
+            return False
+        device = self.device_ids.get(name)
+        if device is None:
+            device = self._add_device(name)
+        level = float(level)
+        if self.last_levels.get(device) == np.float32(level):
+            return False
+        # Records stay in time order even if the wall clock steps back
+        when = max(time.time() if when is None else when, self.last_time)
+        if self.active.count == len(self.active.records):
+            index = self.active.index + 1
+            self._seal()
+            self._start_segment(index)
+        self.active.records[self.active.count] = (when, level, device, SOURCES.index(source))
+        self.active.count += 1
+        self.last_levels[device] = np.float32(level)
+        self.last_time = when
+        return True
+
+    def changes(self, start, end=None, device=None, limit=None):
+        """HistoryEntry per recorded change between start and end, oldest first"""
+        records = np.concatenate([self._range(segment, start, end) for segment in self._segments()]
+                                 or [np.zeros(0, dtype=RECORD)])
+        if device is not None:
+            records = records[records['device'] == self.device_ids.get(device, -1)]
+        if limit is not None:
+            records = records[-limit:]
+        return [HistoryEntry(float(r['t']), self.devices[r['device']], round(float(r['level']), 2),
+                             SOURCES[r['source']]) for r in records]
+
+    def query(self, start, end, device=None, points=DEFAULT_POINTS):
+        """LevelEnvelope of one device (or all) between start and end, in about points buckets.
+
+        Uses the coarsest precomputed summary finer than the bucket width
+        and only reads raw records when the span is too short for any. With
+        a summary, buckets are whole summary buckets, so start is rounded
+        down to a multiple of the summary width.
+        """
+        width = max((end - start) / points, 1e-3)
+        summary_width = max((w for w in SUMMARY_WIDTHS if w <= width), default=None)
+        if summary_width is not None:
+            width = math.ceil(width / summary_width) * summary_width
+            start = math.floor(start / summary_width) * summary_width
+        device_id = None if device is None else self.device_ids.get(device, -1)
+        parts = []
+        for segment in self._segments():
+            if segment.count == 0 or segment.last < start or segment.first >= end:
+                continue
+            if summary_width is None:
+                rows = self._range(segment, start, end)
+                parts.append((rows['t'], rows['level'], rows['level'], rows['device']))
+                continue
+            summary = self._summary(segment, summary_width)
+            lo, hi = np.searchsorted(summary['t'], [start, end])
+            rows = summary[lo:hi]
+            parts.append((rows['t'], rows['min'], rows['max'], rows['device']))
+        if not parts:
+            return envelope(np.zeros(0), None, None, start, width)
+        times, mins, maxs, devices = (np.concatenate(column) for column in zip(*parts))
+        if device_id is not None:
+            keep = devices == device_id
+            times, mins, maxs = times[keep], mins[keep], maxs[keep]
+        return envelope(times, mins, maxs, start, width)
+
+    # Storage
+
+    def _lock(self):
+        try:
+            import fcntl
+        except ImportError:
+            return True  # No advisory locks on this platform
+        self.lock_file = open(os.path.join(self.directory, 'lock'), 'w')
+        try:
+            fcntl.flock(self.lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            logger.warning(f"Level history in {self.directory} is in use by another process; "
+                           "not recording")
+            self.lock_file.close()
+            self.lock_file = None
+            return False
+        return True
+
+    def _map(self, path, index):
+        try:
+            records = np.load(path, mmap_mode='r+')
+        except (OSError, ValueError) as e:
+            logger.error(f"Skipping unreadable history segment {path}: {e}")
+            return None
+        if records.dtype != RECORD:
+            logger.error(f"Skipping history segment {path} with unknown layout")
+            return None
+        # Unused records are zero; times are positive and ordered
+        count = int(np.searchsorted(records['t'] == 0, True))
+        return _Segment(path, index, records, count)
+
+    def _start_segment(self, index):
+        path = os.path.join(self.directory, f"segment-{index:06d}.npy")
+        records = np.lib.format.open_memmap(path, mode='w+', dtype=RECORD,
+                                            shape=(self.segment_records,))
+        self.active = _Segment(path, index, records, 0)
+
+    def _seal(self):
+        """Summarize the active segment and keep it read-only"""
+        segment = self.active
+        self.active = None
+        segment.records.flush()
+        for width in SUMMARY_WIDTHS:
+            if not os.path.exists(segment.summary_path(width)):
+                np.save(segment.summary_path(width),
+                        summarize(segment.records[:segment.count], width))
+        segment.records = np.load(segment.path, mmap_mode='r')
+        self.sealed.append(segment)
+        while len(self.sealed) >= self.max_segments:
+            oldest = self.sealed.pop(0)
+            for path in [oldest.path] + [oldest.summary_path(width) for width in SUMMARY_WIDTHS]:
+                try:
+                    os.remove(path)
+                except OSError as e:
+                    logger.error(f"Error removing old history segment {path}: {e}")
+
+    def _summary(self, segment, width):
+        if segment is self.active:
+            return summarize(segment.records[:segment.count], width)
+        return np.load(segment.summary_path(width), mmap_mode='r')
+
+    def _segments(self):
+        return self.sealed + ([self.active] if self.active is not None else [])
+
+    def _range(self, segment, start, end):
+        times = segment.records['t'][:segment.count]
+        lo = np.searchsorted(times, start)
+        hi = segment.count if end is None else np.searchsorted(times, end)
+        return segment.records[lo:hi]
+
+    def _add_device(self, name):
+        device = len(self.devices)
+        self.devices.append(name)
+        self.device_ids[name] = device
+        try:
+            with open(os.path.join(self.directory, 'devices.json'), 'w') as json_file:
+                json.dump(self.devices, json_file)
+        except OSError as e:
+            logger.error(f"Error writing history device list: {e}")
+        return device
+
+    def _restore_last_levels(self):
+        for segment in reversed(self._segments()):
+            if len(self.last_levels) == len(self.devices):
+                break
+            records = segment.records[:segment.count]
+            devices, last = np.unique(records['device'][::-1], return_index=True)
+            for device, position in zip(devices, last):
+                self.last_levels.setdefault(int(device), records['level'][::-1][position])
+        if self.active.count:
+            self.last_time = self.active.last
+        elif self.sealed:
+            self.last_time = self.sealed[-1].last or 0.0
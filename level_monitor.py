@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Push-based level monitoring.
+
+Each device gets a second connection that subscribes to /audio/out/level
+with /osc/state/subscribe, so changes made elsewhere (front panel, another
+controller) arrive as soon as they happen and an idle room generates no
+traffic. Devices that reject the subscription are polled instead, with an
+interval that doubles while the level is stable and resets when it moves.
+
+The monitor runs on the SSC transport loop; on_level(name, level) is
+called there for every change.
+"""
+
+import asyncio
+import logging
+
+from ssc_codec import (LEVEL_PATH, SscResponseError, encode_get, encode_subscribe,
+                       extract, extract_level, response_error)
+from ssc_transport import SscConnection, SscError
+
+logger = logging.getLogger(__name__)
+
+MIN_POLL_INTERVAL = 0.5
+MAX_POLL_INTERVAL = 8.0
+MAX_RETRY_DELAY = 10.0
+
+SUBSCRIBED = 'subscribed'
+POLLING = 'polling'
+
+
+class SubscriptionUnsupported(Exception):
+    """Raised when a device rejects /osc/state/subscribe"""
+
+
+class LevelMonitor:
+    """Streams level changes of every device to a callback"""
+
+    def __init__(self, transport, on_level, subscribe=True,
+                 min_interval=MIN_POLL_INTERVAL, max_interval=MAX_POLL_INTERVAL):
+        self.transport = transport
+        self.on_level = on_level
+        self.subscribe = subscribe
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.tasks = {}
+        self.modes = {}      # name -> SUBSCRIBED or POLLING
+        self.levels = {}     # name -> last level reported to on_level
+        self.intervals = {}  # name -> current poll interval
+
+    # Thread-safe API
+
+    def start(self, names):
+        """Monitor exactly the given devices"""
+        return self.transport.submit(self.astart(list(names)))
+
+    def add(self, names):
+        """Start (or restart) monitoring the given devices"""
+        return self.transport.submit(self.aadd(list(names)))
+
+    def remove(self, names):
+        return self.transport.submit(self.aremove(list(names)))
+
+    def stop(self):
+        return self.transport.submit(self.astop())
+
+    # Loop-side implementation
+
+    async def astart(self, names):
+        await self.astop()
+        await self.aadd(names)
+
+    async def aadd(self, names):
+        await self.aremove(names)
+        loop = asyncio.get_running_loop()
+        for name in names:
+            self.tasks[name] = loop.create_task(self._watch(name))
+
+    async def aremove(self, names):
+        tasks = [self.tasks.pop(name) for name in names if name in self.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for name in names:
+            self.modes.pop(name, None)
+            self.levels.pop(name, None)
+            self.intervals.pop(name, None)
+
+    async def astop(self):
+        await self.aremove(list(self.tasks))
+
+    def _report(self, name, level):
+        if self.levels.get(name) == level:
+            return False
+        self.levels[name] = level
+        self.on_level(name, level)
+        return True
+
+    async def _watch(self, name):
+        retry_delay = self.min_interval
+        while True:
+            if self.subscribe:
+                try:
+                    await self._run_subscription(name)
+                    retry_delay = self.min_interval
+                except SubscriptionUnsupported:
+                    logger.info(f"{name} does not support subscriptions, polling instead")
+                    await self._run_polling(name)
+                    return
+                except (SscError, SscResponseError) as e:
+                    logger.error(f"Level subscription to {name} failed: {e}")
+                await asyncio.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+            else:
+                await self._run_polling(name)
+                return
+
+    async def _run_subscription(self, name):
+        """Subscribe on a dedicated connection; returns when it is lost"""
+        source = self.transport.connections.get(name)
+        if source is None:
+            raise SscError(f"Unknown device: {name}")
+        conn = SscConnection(f"{name} (monitor)", source.host, source.port, source.interface,
+                             self.transport.timeout, on_message=lambda line: self._on_push(name, line),
+                             metrics=self.transport.metrics)
+        try:
+            response = await conn.request(encode_subscribe(LEVEL_PATH))
+            if response_error(response) is not None:
+                raise SubscriptionUnsupported(name)
+            self.modes[name] = SUBSCRIBED
+            # The subscription only reports changes, so read the current value once
+            self._report(name, extract_level(
+                await self.transport.arequest(name, encode_get(LEVEL_PATH))))
+            await conn.wait_closed()
+        finally:
+            await conn.close()
+
+    def _on_push(self, name, line):
+        try:
+            value = extract(line, LEVEL_PATH)
+        except SscResponseError:
+            return  # An update for some other address
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self._report(name, float(value))
+
+    async def _run_polling(self, name):
+        self.modes[name] = POLLING
+        self.intervals[name] = self.min_interval
+        while True:
+            try:
+                changed = self._report(name, extract_level(
+                    await self.transport.arequest(name, encode_get(LEVEL_PATH))))
+            except (SscError, SscResponseError) as e:
+                logger.error(f"Polling {name} failed: {e}")
+                changed = True  # Retry quickly once the device is back
+            if changed:
+                self.intervals[name] = self.min_interval
+            else:
+                self.intervals[name] = min(self.intervals[name] * 2, self.max_interval)
+            await asyncio.sleep(self.intervals[name])
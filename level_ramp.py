@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Level ramps (fades).
+
+A ramp moves each device from a start to an end level over a duration.
+The whole curve is computed up front, either linear in dB or an S-curve
+(raised cosine), and written on a fixed tick measured against the loop's
+monotonic clock, so late wake-ups do not accumulate into a longer fade.
+On each tick the writes for every device are issued in the same loop
+iteration and so leave together. A tick that is already a whole tick
+late is skipped rather than sent stale, a device still busy with the
+previous write skips that tick, and values that do not change at 0.1 dB
+resolution are not sent at all; the final level is always written.
+
+Each ramp returns a report of how closely it kept to its schedule. A new
+ramp on a device, or cancel(), stops the ramp running on it; on_write is
+not called for writes that complete after that.
+
+The engine runs on the SSC transport loop; ramp() and cancel() may be
+called from any thread.
+"""
+
+import asyncio
+import logging
+import math
+
+from command_scheduler import encode_level, percentile
+from instrumentation import to_ms
+from ssc_codec import extract_level
+
+logger = logging.getLogger(__name__)
+
+RAMP_TICK = 0.05  # Seconds between writes; matches the 20 writes/s level write rate
+LEVEL_RESOLUTION = 1  # Decimal places sent; the GUI shows 0.1 dB
+
+LINEAR = 'linear'
+S_CURVE = 's-curve'
+SHAPES = {
+    LINEAR: lambda x: x,
+    S_CURVE: lambda x: 0.5 - 0.5 * math.cos(math.pi * x),
+}
+
+
+def ramp_curve(duration, tick=RAMP_TICK, shape=LINEAR):
+    """[(seconds from the start, fraction of the way)] for every tick of a ramp"""
+    curve = SHAPES[shape]
+    steps = max(1, math.ceil(duration / tick - 1e-9))
+    return [(duration * i / steps, curve(i / steps)) for i in range(1, steps + 1)]
+
+
+class _Ramp:
+    def __init__(self, loop, names):
+        self.names = names
+        self.stopped = loop.create_future()
+
+    def stop(self):
+        if not self.stopped.done():
+            self.stopped.set_result(None)
+
+
+class RampEngine:
+    """Runs level ramps on the transport loop, one at a time per device"""
+
+    def __init__(self, transport, tick=RAMP_TICK, on_write=None):
+        self.transport = transport
+        self.tick = tick
+        self.on_write = on_write  # on_write(name, level, reported level or None)
+        self.ramps = {}  # name -> _Ramp currently driving that device
+
+    # Thread-safe API
+
+    def ramp(self, starts, ends, duration, shape=LINEAR):
+        """Ramp each device from starts[name] to ends[name]; the Future gives the report"""
+        return self.transport.submit(self.aramp(dict(starts), dict(ends), duration, shape))
+
+    def cancel(self, names=None):
+        """Stop the ramps driving the given devices, or every ramp"""
+        self.transport.loop.call_soon_threadsafe(
+            self.acancel, None if names is None else list(names))
+
+    # Loop-side implementation
+
+    def acancel(self, names=None):
+        for name in list(self.ramps) if names is None else names:
+            ramp = self.ramps.get(name)
+            if ramp is not None:
+                ramp.stop()
+
+    async def aramp(self, starts, ends, duration, shape=LINEAR):
+        loop = asyncio.get_running_loop()
+        names = [name for name in ends if name in starts]
+        self.acancel(names)
+        ramp = _Ramp(loop, names)
+        self.ramps.update(dict.fromkeys(names, ramp))
+        try:
+            return await self._run(ramp, starts, ends, duration, shape)
+        finally:
+            for name in names:
+                if self.ramps.get(name) is ramp:
+                    del self.ramps[name]
+
+    async def _run(self, ramp, starts, ends, duration, shape):
+        loop = asyncio.get_running_loop()
+        curve = ramp_curve(duration, self.tick, shape)
+        sent = {name: round(starts[name], LEVEL_RESOLUTION) for name in ramp.names}
+        busy = {}  # name -> task writing that device's previous value
+        batches = []
+        lateness = []
+        spreads = []
+        final = {}
+        counts = {'writes': 0, 'skipped': 0, 'errors': 0}
+        start = loop.time()
+        for index, (offset, fraction) in enumerate(curve):
+            last = index == len(curve) - 1
+            deadline = start + offset
+            delay = deadline - loop.time()
+            if delay > 0:
+                await asyncio.wait([ramp.stopped], timeout=delay)
+            if ramp.stopped.done():
+                break
+            late = loop.time() - deadline
+            if late >= self.tick and not last:
+                counts['skipped'] += 1
+                continue  # The next tick is already due
+            lateness.append(late)
+            batch = {}
+            for name in ramp.names:
+                level = round(starts[name] + (ends[name] - starts[name]) * fraction, LEVEL_RESOLUTION)
+                if level == sent[name] and not last:
+                    continue
+                previous = busy.get(name)
+                if previous is not None and not previous.done():
+                    if not last:
+                        counts['skipped'] += 1
+                        continue
+                    await asyncio.wait([previous])  # The final value must land last
+                batch[name] = sent[name] = level
+            if batch:
+                task = loop.create_task(self._write_batch(ramp, batch, counts, spreads, final))
+                busy.update(dict.fromkeys(batch, task))
+                batches.append(task)
+        if batches:
+            await asyncio.gather(*batches)
+        elapsed = loop.time() - start
+        report = {
+            'shape': shape,
+            'planned_ms': round(duration * 1000.0, 1),
+            'duration_ms': round(elapsed * 1000.0, 1),
+            'ticks': len(curve),
+            'writes': counts['writes'],
+            'skipped': counts['skipped'],
+            'errors': counts['errors'],
+            'cancelled': ramp.stopped.done(),
+            'late_p50_ms': to_ms(percentile(lateness, 0.5)),
+            'late_p95_ms': to_ms(percentile(lateness, 0.95)),
+            'late_max_ms': to_ms(max(lateness) if lateness else None),
+            'spread_p95_ms': to_ms(percentile(spreads, 0.95)),
+            'final': final,
+        }
+        logger.info(f"Ramp over {len(ramp.names)} devices: {report}")
+        return report
+
+    async def _write_batch(self, ramp, batch, counts, spreads, final):
+        """Write one tick to every device in it, recording the spread of the acks"""
+        loop = asyncio.get_running_loop()
+        acked = []
+
+        async def write(name, level):
+            reported = None
+            try:
+                reported = extract_level(await self.transport.arequest(name, encode_level(level)))
+                acked.append(loop.time())
+            except Exception as e:
+                counts['errors'] += 1
+                logger.error(f"Ramp write to {name} failed: {e}")
+            final[name] = reported
+            if self.on_write is not None and not ramp.stopped.done():
+                try:
+                    self.on_write(name, level, reported)
+                except Exception as e:
+                    logger.error(f"Ramp write handler failed: {e}")
+
+        counts['writes'] += len(batch)
+        await asyncio.gather(*(write(name, level) for name, level in batch.items()))
+        if len(acked) > 1:
+            spreads.append(max(acked) - min(acked))
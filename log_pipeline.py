@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Non-blocking logging.
+
+configure_logging() routes every record through a queue to a background
+writer thread, so a log call on the Qt thread or the transport loop only
+formats the message and appends it to a queue; the disk and console I/O
+happen on the writer. The log file is rotated by size, and repeats of
+the same warning or error (a reconnect storm, say) are rate limited per
+call site, with a count of what was suppressed added to the next one let
+through. With json_lines the file gets one JSON object per record, for
+analysing traces from long sessions.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+
+LOG_PATH = '~/speaker_control_debug.log'
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+MAX_LOG_BYTES = 5 * 1024 * 1024
+LOG_BACKUPS = 3
+RATE_LIMIT_BURST = 5        # Records per call site let through per interval
+RATE_LIMIT_INTERVAL = 10.0  # Seconds
+
+_listener = None
+
+
+class RateLimitFilter(logging.Filter):
+    """Lets at most burst warnings or errors per call site through per interval"""
+
+    def __init__(self, burst=RATE_LIMIT_BURST, interval=RATE_LIMIT_INTERVAL, level=logging.WARNING):
+        super().__init__()
+        self.burst = burst
+        self.interval = interval
+        self.level = level
+        self.windows = {}  # (pathname, lineno) -> [window start, passed, suppressed]
+        self.lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < self.level:
+            return True
+        key = (record.pathname, record.lineno)
+        now = time.monotonic()
+        with self.lock:
+            window = self.windows.get(key)
+            if window is None or now - window[0] >= self.interval:
+                suppressed = window[2] if window is not None else 0
+                self.windows[key] = [now, 1, 0]
+            elif window[1] < self.burst:
+                window[1] += 1
+                return True
+            else:
+                window[2] += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f"{record.msg} ({suppressed} similar messages suppressed)"
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 6),
+            'level': record.levelname,
+            'logger': record.name,
+            'thread': record.threadName,
+            'message': record.getMessage(),
+        }
+        if getattr(record, 'suppressed', None):
+            entry['suppressed'] = record.suppressed
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry)
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """Queues records with the message rendered but the traceback kept apart"""
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.msg, record.args, record.exc_info = record.message, None, None
+        return record
+
+
+def configure_logging(level=logging.ERROR, path=LOG_PATH, json_lines=False, console=True,
+                      max_bytes=MAX_LOG_BYTES, backups=LOG_BACKUPS,
+                      burst=RATE_LIMIT_BURST, interval=RATE_LIMIT_INTERVAL):
+    """Install the queue handler on the root logger and start the writer thread.
+
+    Only the first call has an effect. path=None logs to the console only.
+    """
+    global _listener
+    if _listener is not None:
+        return _listener
+    handlers = []
+    if path:
+        file_handler = logging.handlers.RotatingFileHandler(
+            os.path.expanduser(path), maxBytes=max_bytes, backupCount=backups, encoding='utf-8')
+        file_handler.setFormatter(JsonFormatter() if json_lines else logging.Formatter(LOG_FORMAT))
+        handlers.append(file_handler)
+    if console:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        handlers.append(console_handler)
+
+    records = queue.SimpleQueue()
+    queue_handler = _QueueHandler(records)
+    queue_handler.addFilter(RateLimitFilter(burst, interval))
+    root = logging.getLogger()
+    for handler in root.handlers[:]:
+        root.removeHandler(handler)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+    return _listener
+
+
+def stop_logging():
+    """Write out queued records and stop the writer thread"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
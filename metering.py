@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Live output metering.
+
+Each device gets a connection subscribed to its output meter
+(/m/audio/out/level, in dBFS), which streams far more samples than a
+window should repaint. Incoming samples are only queued; once per frame
+MeterBank writes the queued samples into a fixed-size NumPy ring buffer
+per device and computes every device's level, RMS and held peak in one
+vectorized pass, and MeterMonitor hands the result to on_frame. Frames
+are capped at FRAME_RATE, so the cost of a frame depends on the number
+of devices but not on how fast they meter. When samples stop, frames go
+on until every held peak has fallen to the floor, then stop until
+samples arrive again, so an idle room costs nothing.
+
+RMS is the power average over the ring (RING_SIZE samples); the peak is
+held for PEAK_HOLD seconds, then falls at PEAK_FALL dB per second.
+
+MeterMonitor runs on the SSC transport loop; add(), remove() and stop()
+may be called from any thread.
+"""
+
+import asyncio
+import collections
+import logging
+
+import numpy as np
+
+from ssc_codec import SscResponseError, encode_subscribe, extract, response_error
+from ssc_transport import SscConnection, SscError
+
+logger = logging.getLogger(__name__)
+
+METER_PATH = '/m/audio/out/level'
+FRAME_RATE = 30  # Meter frames per second, at most
+RING_SIZE = 32  # Samples per device the RMS is computed over
+PEAK_HOLD = 1.5  # Seconds a peak is held
+PEAK_FALL = 20.0  # dB per second a peak falls after the hold
+FLOOR_DB = -120.0  # Reading of a device without samples
+MAX_RETRY_DELAY = 10.0
+
+MeterReading = collections.namedtuple('MeterReading', 'level rms peak')
+
+
+class MeterBank:
+    """Fixed-size ring buffers of meter samples, reduced for all devices at once"""
+
+    def __init__(self, capacity=RING_SIZE, peak_hold=PEAK_HOLD, peak_fall=PEAK_FALL):
+        self.capacity = capacity
+        self.peak_hold = peak_hold
+        self.peak_fall = peak_fall
+        self.rows = {}  # name -> row in the arrays
+        self.free = []  # Rows of removed devices, reused first
+        self.samples = np.full((0, capacity), FLOOR_DB, dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int64)  # Samples ever written per row
+        self.peaks = np.full(0, FLOOR_DB)
+        self.peak_times = np.zeros(0)
+        self.pending_rows = []  # Samples queued since the last frame
+        self.pending_values = []
+
+    def add(self, name):
+        if name in self.rows:
+            return
+        if not self.free:
+            self._grow(max(8, 2 * len(self.counts)))
+        row = self.free.pop()
+        self._reset(row)
+        self.rows[name] = row
+
+    def remove(self, name):
+        row = self.rows.pop(name, None)
+        if row is not None:
+            self.free.append(row)
+
+    def push(self, name, value):
+        """Queue one sample; cheap, as it runs for every sample received"""
+        row = self.rows.get(name)
+        if row is not None:
+            self.pending_rows.append(row)
+            self.pending_values.append(value)
+
+    def frame(self, now):
+        """Apply the queued samples and return {name: MeterReading}"""
+        self._flush(now)
+        if not self.rows:
+            return {}
+        rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))
+        samples = self.samples[rows]
+        counts = self.counts[rows]
+        filled = np.minimum(counts, self.capacity)
+        latest = samples[np.arange(len(rows)), (counts - 1) % self.capacity]
+        # Empty slots hold the floor, whose power is negligible
+        power = np.power(10.0, samples / 10.0).sum(axis=1) / np.maximum(filled, 1)
+        rms = 10.0 * np.log10(np.maximum(power, 10.0 ** (FLOOR_DB / 10.0)))
+        latest = np.where(filled > 0, latest, FLOOR_DB)
+        rms = np.where(filled > 0, rms, FLOOR_DB)
+        peaks = self.peaks[rows]
+        return {name: MeterReading(float(latest[i]), float(rms[i]), float(peaks[i]))
+                for i, name in enumerate(self.rows)}
+
+    def decaying(self):
+        """Whether any device's held peak is still above the floor"""
+        if not self.rows:
+            return False
+        rows = np.fromiter(self.rows.values(), dtype=np.int64, count=len(self.rows))
+        return bool((self.peaks[rows] > FLOOR_DB).any())
+
+    def _flush(self, now):
+        if self.pending_rows:
+            rows = np.array(self.pending_rows, dtype=np.int64)
+            values = np.array(self.pending_values, dtype=np.float32)
+            self.pending_rows = []
+            self.pending_values = []
+            order = np.argsort(rows, kind='stable')  # Group by row, keeping arrival order
+            rows = rows[order]
+            values = values[order]
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            lengths = np.diff(np.r_[starts, len(rows)])
+            offsets = np.arange(len(rows)) - np.repeat(starts, lengths)
+            batch_peaks = np.maximum.reduceat(values, starts)
+            batch_rows = rows[starts]
+            # Only the last capacity samples of a row survive in its ring
+            keep = offsets >= np.repeat(lengths, lengths) - self.capacity
+            slots = (self.counts[rows[keep]] + offsets[keep]) % self.capacity
+            self.samples[rows[keep], slots] = values[keep]
+            self.counts[batch_rows] += lengths
+        else:
+            batch_rows = np.zeros(0, dtype=np.int64)
+            batch_peaks = np.zeros(0, dtype=np.float32)
+        # Held peaks fall after the hold time; a new sample above one replaces it
+        age = now - self.peak_times
+        falling = age > self.peak_hold
+        self.peaks = np.where(
+            falling, np.maximum(FLOOR_DB, self.peaks - self.peak_fall * (age - self.peak_hold)),
+            self.peaks)
+        self.peak_times = np.where(falling, now - self.peak_hold, self.peak_times)
+        higher = batch_peaks >= self.peaks[batch_rows]
+        self.peaks[batch_rows[higher]] = batch_peaks[higher]
+        self.peak_times[batch_rows[higher]] = now
+
+    def _grow(self, size):
+        old = len(self.counts)
+        self.samples = np.vstack([self.samples, np.full((size - old, self.capacity), FLOOR_DB,
+                                                        dtype=np.float32)])
+        self.counts = np.concatenate([self.counts, np.zeros(size - old, dtype=np.int64)])
+        self.peaks = np.concatenate([self.peaks, np.full(size - old, FLOOR_DB)])
+        self.peak_times = np.concatenate([self.peak_times, np.zeros(size - old)])
+        self.free.extend(range(size - 1, old - 1, -1))
+
+    def _reset(self, row):
+        self.samples[row] = FLOOR_DB
+        self.counts[row] = 0
+        self.peaks[row] = FLOOR_DB
+        self.peak_times[row] = 0.0
+
+
+class MeterMonitor:
+    """Streams meter frames for every device to a callback at a capped rate"""
+
+    def __init__(self, transport, on_frame, frame_rate=FRAME_RATE, path=METER_PATH,
+                 bank=None):
+        self.transport = transport
+        self.on_frame = on_frame  # on_frame({name: MeterReading})
+        self.frame_interval = 1.0 / frame_rate
+        self.path = path
+        self.bank = bank if bank is not None else MeterBank()
+        self.tasks = {}
+        self.unsupported = set()  # Devices without the meter address
+        self.frame_task = None
+        self.fresh = None  # Set when samples arrived since the last frame
+        self.frames = 0
+        self.samples = 0
+
+    # Thread-safe API
+
+    def add(self, names):
+        return self.transport.submit(self.aadd(list(names)))
+
+    def remove(self, names):
+        return self.transport.submit(self.aremove(list(names)))
+
+    def stop(self):
+        return self.transport.submit(self.astop())
+
+    # Loop-side implementation
+
+    async def aadd(self, names):
+        await self.aremove(names)
+        loop = asyncio.get_running_loop()
+        for name in names:
+            self.bank.add(name)
+            self.tasks[name] = loop.create_task(self._watch(name))
+        if self.tasks and self.frame_task is None:
+            self.fresh = asyncio.Event()
+            self.frame_task = loop.create_task(self._run_frames())
+
+    async def aremove(self, names):
+        tasks = [self.tasks.pop(name) for name in names if name in self.tasks]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for name in names:
+            self.bank.remove(name)
+            self.unsupported.discard(name)
+        if not self.tasks and self.frame_task is not None:
+            self.frame_task.cancel()
+            await asyncio.gather(self.frame_task, return_exceptions=True)
+            self.frame_task = None
+
+    async def astop(self):
+        await self.aremove(list(self.tasks))
+
+    async def _run_frames(self):
+        loop = asyncio.get_running_loop()
+        decaying = False
+        while True:
+            if not decaying:
+                await self.fresh.wait()  # Idle until samples arrive
+            self.fresh.clear()
+            started = loop.time()
+            frame = self.bank.frame(started)
+            self.frames += 1
+            try:
+                self.on_frame(frame)
+            except Exception as e:
+                logger.error(f"Meter frame handler failed: {e}")
+            decaying = self.bank.decaying()  # Keep drawing the peaks as they fall
+            await asyncio.sleep(max(0.0, started + self.frame_interval - loop.time()))
+
+    async def _watch(self, name):
+        retry_delay = self.frame_interval
+        while True:
+            try:
+                await self._run_subscription(name)
+                retry_delay = self.frame_interval
+            except SscResponseError as e:
+                logger.info(f"{name} has no meter at {self.path}: {e}")
+                self.unsupported.add(name)
+                return
+            except SscError as e:
+                logger.error(f"Meter subscription to {name} failed: {e}")
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, MAX_RETRY_DELAY)
+
+    async def _run_subscription(self, name):
+        """Subscribe on a dedicated connection; returns when it is lost"""
+        source = self.transport.connections.get(name)
+        if source is None:
+            raise SscError(f"Unknown device: {name}")
+        conn = SscConnection(f"{name} (meter)", source.host, source.port, source.interface,
+                             self.transport.timeout, on_message=lambda line: self._on_push(name, line),
+                             metrics=self.transport.metrics)
+        try:
+            error = response_error(await conn.request(encode_subscribe(self.path)))
+            if error is not None:
+                raise SscResponseError(error)
+            await conn.wait_closed()
+        finally:
+            await conn.close()
+
+    def _on_push(self, name, line):
+        try:
+            value = extract(line, self.path)
+        except SscResponseError:
+            return  # An update for some other address
+        if isinstance(value, list):
+            value = max(value, default=None)  # One reading per channel
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            self.bank.push(name, value)
+            self.samples += 1
+            self.fresh.set()
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Speaker discovery on every network interface at once.
+
+The pyssc tracker does not say which interface a speaker answered on, so
+the interface has to be chosen up front and switching it means starting
+discovery again. Here one zeroconf instance is bound to each candidate
+interface and all of them browse concurrently on a single asyncio loop.
+Every speaker found is tagged with the interface it was found on
+(DeviceRecord.interface, which is also the scope of its link-local
+address), and pick_interface() chooses the interface holding the
+speakers.
+
+MultiInterfaceTracker offers the pyssc tracker's register_callback(),
+start() and stop(), so it can stand in for it. It runs on a given loop
+(such as the SSC transport's) or starts its own.
+"""
+
+import asyncio
+import collections
+import ipaddress
+import logging
+import socket
+import threading
+
+from device_tracking import AUTO_INTERFACE, SSC_PORT, DeviceRecord
+
+logger = logging.getLogger(__name__)
+
+SERVICE_TYPE = '_ssc._tcp.local.'
+RESOLVE_TIMEOUT_MS = 3000
+STOP_TIMEOUT = 2.0
+
+# What tracker callbacks receive, shaped like pyssc's Ssc_device_setup
+DiscoverySetup = collections.namedtuple('DiscoverySetup', 'ssc_devices')
+
+
+def pick_interface(devices, current=None):
+    """Interface holding the most devices.
+
+    devices are in the order they were found; on a tie the current
+    interface is kept, otherwise the one whose device was found first wins.
+    """
+    counts = collections.Counter(device.interface for device in devices if device.interface)
+    if not counts:
+        return current
+    most = max(counts.values())
+    if counts.get(current) == most:
+        return current
+    return next(device.interface for device in devices if counts.get(device.interface) == most)
+
+
+def interface_binding(interface):
+    """zeroconf interface list for one interface: its IPv4 addresses and IPv6 index"""
+    import ifaddr
+    binding = []
+    for adapter in ifaddr.get_adapters():
+        if adapter.name == interface:
+            binding.extend(ip.ip for ip in adapter.ips if isinstance(ip.ip, str))
+    try:
+        binding.append(socket.if_nametoindex(interface))
+    except OSError:
+        pass  # No such interface, or no IPv6 on it
+    return binding
+
+
+def _service_name(name):
+    return name[:-len(SERVICE_TYPE) - 1] if name.endswith('.' + SERVICE_TYPE) else name
+
+
+async def zeroconf_browse(interface, found, lost, binding=None):
+    """Browse for SSC services on one interface until cancelled.
+
+    Calls found(interface, DeviceRecord) for every speaker resolved and
+    lost(interface, name) when one goes away. binding overrides the
+    addresses zeroconf listens on.
+    """
+    from zeroconf import IPVersion, ServiceStateChange
+    from zeroconf.asyncio import AsyncServiceBrowser, AsyncServiceInfo, AsyncZeroconf
+
+    if binding is None:
+        binding = interface_binding(interface)
+    if not binding:
+        raise OSError(f"No addresses on {interface}")
+    has_ipv4 = any(isinstance(entry, str) for entry in binding)
+    has_ipv6 = any(isinstance(entry, int) for entry in binding)
+    ip_version = (IPVersion.All if has_ipv4 and has_ipv6
+                  else IPVersion.V4Only if has_ipv4 else IPVersion.V6Only)
+    zeroconf = AsyncZeroconf(interfaces=binding, ip_version=ip_version)
+    resolving = set()
+
+    async def resolve(name):
+        info = AsyncServiceInfo(SERVICE_TYPE, name)
+        if not await info.async_request(zeroconf.zeroconf, RESOLVE_TIMEOUT_MS):
+            logger.info(f"Could not resolve {name} on {interface}")
+            return
+        # Speakers answer on IPv6 link-local; prefer it like pyssc does
+        addresses = sorted(info.parsed_addresses(),
+                           key=lambda address: ipaddress.ip_address(address).version != 6)
+        if addresses:
+            found(interface, DeviceRecord(_service_name(name), addresses[0],
+                                          info.port or SSC_PORT, interface))
+
+    def on_service_state_change(zeroconf, service_type, name, state_change):
+        if state_change is ServiceStateChange.Removed:
+            lost(interface, _service_name(name))
+            return
+        task = asyncio.get_running_loop().create_task(resolve(name))
+        resolving.add(task)
+        task.add_done_callback(resolving.discard)
+
+    browser = AsyncServiceBrowser(zeroconf.zeroconf, SERVICE_TYPE,
+                                  handlers=[on_service_state_change])
+    try:
+        await asyncio.get_running_loop().create_future()  # Browse until cancelled
+    finally:
+        for task in list(resolving):
+            task.cancel()
+        await browser.async_cancel()
+        await zeroconf.async_close()
+
+
+class MultiInterfaceTracker:
+    """Browses several interfaces concurrently on one event loop"""
+
+    def __init__(self, interfaces=None, loop=None, browse=zeroconf_browse):
+        self.interfaces = interfaces  # None: every candidate interface from net_interfaces
+        self.loop = loop
+        self.own_loop = loop is None
+        self.browse = browse  # browse(interface, found, lost) coroutine, run per interface
+        self.callbacks = []
+        self.seen = collections.OrderedDict()  # (interface, name) -> DeviceRecord, in order found
+        self.tasks = {}  # interface -> browse task
+
+    # Thread-safe API
+
+    def register_callback(self, callback):
+        """callback(DiscoverySetup) after every change, called on the discovery loop"""
+        self.callbacks.append(callback)
+
+    def start(self):
+        if self.loop is None:
+            self.loop = asyncio.new_event_loop()
+            threading.Thread(target=self.loop.run_forever, name='discovery', daemon=True).start()
+        return asyncio.run_coroutine_threadsafe(self.astart(), self.loop)
+
+    def set_interfaces(self, interfaces):
+        """Browse these interfaces from now on, e.g. after a link change"""
+        return asyncio.run_coroutine_threadsafe(self.aset_interfaces(list(interfaces)), self.loop)
+
+    def stop(self):
+        if self.loop is None:
+            return
+        future = asyncio.run_coroutine_threadsafe(self.astop(), self.loop)
+        if self.own_loop:
+            try:
+                future.result(STOP_TIMEOUT)
+            except Exception as e:
+                logger.error(f"Error stopping discovery: {e}")
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.loop = None
+
+    def devices(self):
+        """Every device found, each on the interface it was found on first"""
+        devices = collections.OrderedDict()
+        for record in self.seen.values():
+            devices.setdefault(record.name, record)
+        return list(devices.values())
+
+    # Loop-side implementation
+
+    async def astart(self):
+        interfaces = self.interfaces
+        if interfaces is None:
+            from net_interfaces import enumerate_interfaces
+            _, interface_names = await asyncio.get_running_loop().run_in_executor(
+                None, enumerate_interfaces)
+            interfaces = list(interface_names.values())
+        await self.aset_interfaces(interfaces)
+
+    async def aset_interfaces(self, interfaces):
+        loop = asyncio.get_running_loop()
+        interfaces = [interface for interface in interfaces if interface != AUTO_INTERFACE]
+        dropped = [interface for interface in self.tasks if interface not in interfaces]
+        for interface in dropped:
+            self.tasks.pop(interface).cancel()
+        for interface in interfaces:
+            if interface not in self.tasks:
+                self.tasks[interface] = loop.create_task(self._browse(interface))
+        logger.info(f"Discovering speakers on {', '.join(self.tasks) or 'no interfaces'}")
+        if any(key[0] in dropped for key in self.seen):
+            self.seen = collections.OrderedDict(
+                (key, record) for key, record in self.seen.items() if key[0] not in dropped)
+            self._emit()
+
+    async def astop(self):
+        tasks = list(self.tasks.values())
+        self.tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _browse(self, interface):
+        try:
+            await self.browse(interface, self._found, self._lost)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Discovery on {interface} failed: {e}")
+
+    def _found(self, interface, record):
+        if self.seen.get((interface, record.name)) != record:
+            self.seen[(interface, record.name)] = record
+            self._emit()
+
+    def _lost(self, interface, name):
+        if self.seen.pop((interface, name), None) is not None:
+            self._emit()
+
+    def _emit(self):
+        setup = DiscoverySetup(self.devices())
+        for callback in self.callbacks:
+            try:
+                callback(setup)
+            except Exception as e:
+                logger.error(f"Discovery callback failed: {e}")
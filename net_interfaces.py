@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Network interface inventory.
+
+Lists the interfaces that could reach SSC speakers (those with an IPv6
+link-local address) together with a friendly name for each. The list is
+built once, off the GUI thread, and cached; it is only rebuilt after the
+operating system reports a link or address change.
+
+Linux reads /proc and /sys and listens on a netlink socket, so it needs
+neither netifaces nor networksetup. macOS runs networksetup once per
+refresh for the friendly names and listens on a PF_ROUTE socket.
+"""
+
+import concurrent.futures
+import logging
+import os
+import select
+import socket
+import subprocess
+import sys
+import threading
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_INTERFACES = (['Ethernet'], {'Ethernet': 'en0'})
+SKIPPED_PREFIXES = ('utun', 'llw', 'awdl', 'bridge')
+LOOPBACK = ('lo', 'lo0')
+
+# Netlink multicast groups for link and IPv6 address changes
+RTMGRP_LINK = 0x1
+RTMGRP_IPV6_IFADDR = 0x100
+
+CHANGE_DEBOUNCE_SECONDS = 0.5
+
+
+def _skipped(iface):
+    return iface in LOOPBACK or iface.startswith(SKIPPED_PREFIXES)
+
+
+def _linux_link_local_interfaces():
+    """Interfaces with an fe80:: address, from /proc/net/if_inet6"""
+    interfaces = []
+    with open('/proc/net/if_inet6') as if_inet6:
+        for line in if_inet6:
+            fields = line.split()
+            if len(fields) >= 6 and fields[0].startswith('fe80') and fields[5] not in interfaces:
+                interfaces.append(fields[5])
+    return interfaces
+
+
+def _linux_friendly_name(iface):
+    base = f'/sys/class/net/{iface}'
+    if os.path.exists(os.path.join(base, 'wireless')):
+        kind = 'Wi-Fi'
+    elif not os.path.exists(os.path.join(base, 'device')):
+        kind = 'Virtual'
+    else:
+        kind = 'Ethernet'
+    return f"{kind} ({iface})"
+
+
+def _netifaces_link_local_interfaces():
+    import netifaces
+    interfaces = []
+    for iface in netifaces.interfaces():
+        addrs = netifaces.ifaddresses(iface)
+        # Look for self-assigned IPv6 addresses
+        if any(addr['addr'].startswith('fe80::') for addr in addrs.get(netifaces.AF_INET6, [])):
+            interfaces.append(iface)
+    return interfaces
+
+
+def _macos_friendly_names():
+    """Map of device to hardware port name from a single networksetup call"""
+    names = {}
+    try:
+        result = subprocess.run(['networksetup', '-listallhardwareports'],
+                                capture_output=True, text=True)
+        if result.returncode == 0:
+            current_name = None
+            for line in result.stdout.split('\n'):
+                if line.startswith('Hardware Port:'):
+                    current_name = line.split(': ', 1)[1].strip()
+                elif line.startswith('Device:') and current_name:
+                    names[line.split(': ', 1)[1].strip()] = current_name
+    except Exception as e:
+        logger.error(f"Error getting friendly names: {e}")
+    return names
+
+
+def enumerate_interfaces():
+    """Return (friendly names, {friendly name: interface}) of candidate interfaces"""
+    if sys.platform.startswith('linux') and os.path.exists('/proc/net/if_inet6'):
+        devices = _linux_link_local_interfaces()
+        friendly = {iface: _linux_friendly_name(iface) for iface in devices}
+    else:
+        devices = _netifaces_link_local_interfaces()
+        hardware_ports = _macos_friendly_names() if sys.platform == 'darwin' else {}
+        friendly = {iface: hardware_ports.get(iface, iface) for iface in devices}
+    interfaces = []
+    interface_names = {}
+    for iface in devices:
+        if _skipped(iface):
+            continue
+        interface_names[friendly[iface]] = iface
+        interfaces.append(friendly[iface])
+    return interfaces or DEFAULT_INTERFACES[0], interface_names or dict(DEFAULT_INTERFACES[1])
+
+
+def _open_change_socket():
+    """Socket that becomes readable when links or addresses change, or None"""
+    try:
+        if hasattr(socket, 'AF_NETLINK'):
+            sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+            sock.bind((0, RTMGRP_LINK | RTMGRP_IPV6_IFADDR))
+            return sock
+        if hasattr(socket, 'AF_ROUTE'):
+            return socket.socket(socket.AF_ROUTE, socket.SOCK_RAW, socket.AF_UNSPEC)
+    except OSError as e:
+        logger.error(f"Cannot watch for network changes: {e}")
+    return None
+
+
+class InterfaceInventory:
+    """Cached interface list, refreshed in the background on link changes"""
+
+    def __init__(self, on_change=None):
+        self.on_change = on_change
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1,
+                                                              thread_name_prefix='interfaces')
+        self.cached = None
+        self.stale = True
+        self.lock = threading.Lock()
+        self.watcher = None
+        # stop() writes to this pair to wake the watcher thread
+        self.wakeup_read, self.wakeup_write = socket.socketpair()
+
+    def load(self):
+        """Future for (interfaces, interface_names); cheap when the cache is fresh"""
+        with self.lock:
+            if not self.stale and self.cached is not None:
+                future = concurrent.futures.Future()
+                future.set_result(self.cached)
+                return future
+        return self.executor.submit(self._refresh)
+
+    def _refresh(self):
+        with self.lock:
+            self.stale = False
+        result = enumerate_interfaces()
+        with self.lock:
+            self.cached = result
+        return result
+
+    def mark_stale(self):
+        with self.lock:
+            self.stale = True
+
+    def watch(self):
+        """Start listening for link changes; on_change is called from a background thread"""
+        sock = _open_change_socket()
+        if sock is None:
+            return False
+        self.watcher = threading.Thread(target=self._watch, args=(sock,), name='link-watcher',
+                                        daemon=True)
+        self.watcher.start()
+        return True
+
+    def stop(self):
+        self.wakeup_write.send(b'x')
+        self.executor.shutdown(wait=False)
+
+    def _watch(self, sock):
+        with sock:
+            while True:
+                readable, _, _ = select.select([sock, self.wakeup_read], [], [])
+                if self.wakeup_read in readable:
+                    return
+                # Changes come in bursts; collect the whole burst first
+                while sock in readable:
+                    sock.recv(65536)
+                    readable, _, _ = select.select([sock], [], [], CHANGE_DEBOUNCE_SECONDS)
+                self.mark_stale()
+                if self.on_change is not None:
+                    self.on_change()
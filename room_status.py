@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Room-wide status reads.
+
+Reads level and mute from every device with one combined SSC request per
+device, all devices at once, so refreshing the whole room costs one
+parallel round trip however many devices there are. A device that does
+not answer is reported offline. find_drift() then names the devices
+whose group level or mute state disagrees with the rest of the group.
+
+aread_status() runs on the SSC transport loop; read_status() may be
+called from any thread.
+"""
+
+import asyncio
+import collections
+import logging
+
+from snapshots import MUTE_PATH
+from ssc_codec import (LEVEL_PATH, SscResponseError, decode, encode_get, encode_many,
+                       extract_level, lookup)
+
+logger = logging.getLogger(__name__)
+
+STATUS_PATHS = (LEVEL_PATH, MUTE_PATH)
+DRIFT_TOLERANCE = 0.05  # dB; levels are written in 0.1 dB steps
+
+# online is False when the device could not be reached; level and mute are
+# None when unknown, error holds the reason
+DeviceStatus = collections.namedtuple('DeviceStatus', 'name online level mute error')
+
+
+def read_status(transport, names):
+    return transport.submit(aread_status(transport, list(names)))
+
+
+async def aread_status(transport, names):
+    """{name: DeviceStatus} for every device, read concurrently"""
+    results = await transport.arequest_all(encode_many(dict.fromkeys(STATUS_PATHS)), names)
+    statuses = {}
+    level_only = []
+    for name, raw in results.items():
+        if isinstance(raw, Exception):
+            statuses[name] = DeviceStatus(name, False, None, None, str(raw))
+            continue
+        try:
+            message = decode(raw)
+            statuses[name] = DeviceStatus(name, True, float(lookup(message, LEVEL_PATH)),
+                                          bool(lookup(message, MUTE_PATH)), None)
+        except (SscResponseError, TypeError, ValueError):
+            level_only.append(name)  # Answered, but not for every address
+    if level_only:
+        # Devices without a mute address still report their level
+        responses = await asyncio.gather(
+            *(transport.arequest(name, encode_get(LEVEL_PATH)) for name in level_only),
+            return_exceptions=True)
+        for name, raw in zip(level_only, responses):
+            try:
+                if isinstance(raw, Exception):
+                    raise raw
+                statuses[name] = DeviceStatus(name, True, extract_level(raw), None, None)
+            except Exception as e:
+                statuses[name] = DeviceStatus(name, True, None, None, str(e))
+    return statuses
+
+
+def find_drift(statuses, group, tolerance=DRIFT_TOLERANCE):
+    """(reference group level, names of devices out of sync with it).
+
+    The reference is the group level most devices agree on; a device has
+    drifted when its level, less its group offset, is further than
+    tolerance from it or when its mute state differs from most devices'.
+    """
+    known = [status for status in statuses.values() if status.online and status.level is not None]
+    if not known:
+        return None, []
+    levels = {status.name: group.group_level(status.name, status.level) for status in known}
+    reference = collections.Counter(round(level, 1) for level in levels.values()).most_common(1)[0][0]
+    mutes = collections.Counter(status.mute for status in known if status.mute is not None)
+    usual_mute = mutes.most_common(1)[0][0] if mutes else None
+    drifted = [status.name for status in known
+               if abs(levels[status.name] - reference) > tolerance
+               or (status.mute is not None and status.mute != usual_mute)]
+    return reference, drifted
@@ -27,6 +27,11 @@ DATA_FILES = [
 
 OPTIONS = {
     'argv_emulation': False,
+    # Only packages that load submodules dynamically, or are imported where
+    # the scan may miss them (netifaces in net_interfaces, async_timeout in
+    # pyssc), are copied whole; the rest, including the modules
+    # speaker_control imports lazily, are found by py2app's import scan and
+    # stay in the zipped library
     'packages': [
         'PyQt6',
         'zeroconf',
@@ -34,42 +39,6 @@ OPTIONS = {
         'ifaddr',
         'async_timeout',
         'pyssc',
-        'asyncio',
-        'logging',
-        'typing',
-        'importlib'
-    ],
-    'includes': [
-        'PyQt6.QtCore',
-        'PyQt6.QtGui',
-        'PyQt6.QtWidgets',
-        'zeroconf._exceptions',
-        'json',
-        'time',
-        'argparse',
-        'subprocess',
-        'os',
-        'sys',
-        'logging',
-        'traceback',
-        'asyncio.base_events',
-        'asyncio.coroutines',
-        'asyncio.events',
-        'asyncio.exceptions',
-        'asyncio.futures',
-        'asyncio.locks',
-        'asyncio.protocols',
-        'asyncio.queues',
-        'asyncio.runners',
-        'asyncio.streams',
-        'asyncio.subprocess',
-        'asyncio.tasks',
-        'asyncio.transports',
-        'asyncio.unix_events',
-        'importlib._bootstrap',
-        'importlib._bootstrap_external',
-        'importlib.machinery',
-        'importlib.util'
     ],
     'excludes': ['tkinter'],
     'iconfile': 'Speaker.icns',
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Named snapshots of speaker settings.
+
+A snapshot holds, per device, the values of a set of SSC addresses
+(level, mute, delay and EQ bypass by default). Capturing reads all of a
+device's addresses with one combined request; recalling writes them
+back with one combined request per device. Both go to every device
+concurrently, so a room-wide recall takes about one round trip however
+many devices and parameters it covers.
+
+Snapshots are stored as JSON:
+
+    {
+        "snapshots": {
+            "Evening": {
+                "created": 1760000000.0,
+                "devices": {"KH 150 L": {"/audio/out/level": 72.0, "/audio/out/mute": false}}
+            }
+        }
+    }
+
+acapture() and arecall() run on the SSC transport loop; capture() and
+recall() may be called from any thread.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+
+from ssc_codec import (LEVEL_PATH, SscResponseError, decode, encode_get, encode_many, lookup,
+                       response_error)
+from ssc_transport import SscError
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOTS_PATH = os.path.expanduser('~/.speaker_control_snapshots.json')
+MUTE_PATH = '/audio/out/mute'
+DELAY_PATH = '/audio/out/delay'
+EQ_BYPASS_PATH = '/audio/out/eq2/bypass'
+SNAPSHOT_PATHS = (LEVEL_PATH, MUTE_PATH, DELAY_PATH, EQ_BYPASS_PATH)
+
+
+class SnapshotStore:
+    """Named snapshots, stored as JSON"""
+
+    def __init__(self, path=DEFAULT_SNAPSHOTS_PATH):
+        self.path = path
+        self.snapshots = None  # Loaded lazily
+
+    def _load(self):
+        if self.snapshots is None:
+            self.snapshots = {}
+            if os.path.exists(self.path):
+                try:
+                    with open(self.path) as json_file:
+                        self.snapshots = json.load(json_file).get('snapshots', {})
+                except (OSError, ValueError, AttributeError) as e:
+                    logger.error(f"Error reading snapshots from {self.path}: {e}")
+        return self.snapshots
+
+    def names(self):
+        return sorted(self._load())
+
+    def get(self, name):
+        """{device: {address: value}} of a snapshot, or None"""
+        entry = self._load().get(name)
+        return entry.get('devices') if entry else None
+
+    def save(self, name, devices):
+        self._load()[name] = {'created': time.time(), 'devices': devices}
+        self._write()
+
+    def delete(self, name):
+        if self._load().pop(name, None) is not None:
+            self._write()
+
+    def _write(self):
+        try:
+            with open(self.path, 'w') as json_file:
+                json.dump({'snapshots': self.snapshots}, json_file, indent=2)
+        except OSError as e:
+            logger.error(f"Error writing snapshots to {self.path}: {e}")
+
+
+# Thread-safe API
+
+def capture(transport, names, paths=SNAPSHOT_PATHS):
+    return transport.submit(acapture(transport, list(names), paths))
+
+
+def recall(transport, devices):
+    return transport.submit(arecall(transport, devices))
+
+
+# Loop-side implementation
+
+async def acapture(transport, names, paths=SNAPSHOT_PATHS):
+    """Read the given addresses from every device; returns {device: {address: value}}.
+
+    Devices that cannot be read are left out. A device that rejects the
+    combined read is asked address by address, and only the addresses it
+    knows are kept.
+    """
+    results = await transport.arequest_all(encode_many(dict.fromkeys(paths)), names)
+    snapshot = {}
+    for name, raw in results.items():
+        if isinstance(raw, Exception):
+            logger.error(f"Snapshot of {name} failed: {raw}")
+            continue
+        try:
+            snapshot[name] = {path: lookup(decode(raw), path) for path in paths}
+        except SscResponseError:
+            snapshot[name] = await _acapture_each(transport, name, paths)
+    return snapshot
+
+
+async def _acapture_each(transport, name, paths):
+    responses = await asyncio.gather(*(transport.arequest(name, encode_get(path)) for path in paths),
+                                     return_exceptions=True)
+    values = {}
+    for path, raw in zip(paths, responses):
+        try:
+            if isinstance(raw, Exception):
+                raise raw
+            values[path] = lookup(decode(raw), path)
+        except (SscError, SscResponseError) as e:
+            logger.info(f"{name}: leaving {path} out of the snapshot: {e}")
+    return values
+
+
+async def arecall(transport, devices):
+    """Write a snapshot, one combined request per device, all devices at once.
+
+    Devices of the snapshot that are not connected are skipped. Returns
+    {device: raw response, or the exception raised for it}.
+    """
+    names = [name for name in devices if name in transport.connections and devices[name]]
+
+    async def write(name):
+        raw = await transport.arequest(name, encode_many(devices[name]))
+        error = response_error(raw)
+        if error is not None:
+            raise SscError(f"{name}: SSC error during recall: {error}")
+        return raw
+
+    results = await asyncio.gather(*(write(name) for name in names), return_exceptions=True)
+    return dict(zip(names, results))
@@ -6,144 +6,360 @@ import os
 import logging
 import traceback
 
-# Set up logging
-logging.basicConfig(
-    level=logging.ERROR,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(os.path.expanduser('~/speaker_control_debug.log')),
-        logging.StreamHandler()
-    ]
-)
+# Logging is configured once, in __main__ (see log_pipeline)
 logger = logging.getLogger(__name__)
 
+# Only what the window needs to paint is imported here. Discovery and
+# networking (pyssc, zeroconf, asyncio, netifaces) and the SSC codec (with
+# orjson) are imported once the window is on screen, see
+# SpeakerControlWindow.start_backend.
 try:
     import time
     import argparse
-    import netifaces
-    import subprocess
-    import json
-    from PyQt6 import QtWidgets, QtCore, QtGui
     from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
-                                QLabel, QPushButton, QHBoxLayout, QComboBox)
-    from PyQt6.QtCore import QTimer, Qt, QThread, pyqtSignal
-    from PyQt6.QtGui import QIcon, QFont
-    from pyssc import tracker, ssc_device, ssc_device_setup
-    from pyssc.tracker import Tracker
-    from pyssc.ssc_device import Ssc_device
-    from pyssc.ssc_device_setup import Ssc_device_setup
-    import zeroconf._exceptions
+                                QLabel, QPushButton, QHBoxLayout, QComboBox,
+                                QDialog, QPlainTextEdit, QMenu, QInputDialog)
+    from PyQt6.QtCore import Qt, QThread, QObject, QTimer, pyqtSignal
+    from PyQt6.QtGui import QIcon, QFont, QKeySequence, QShortcut, QPainter, QColor
+    from level_cache import LevelCache
+    from device_groups import ALL_GROUP, MAX_LEVEL, MIN_LEVEL, GroupManager
+    from device_tracking import AUTO_INTERFACE, DeviceDiff, DeviceTable
+    from discovery_cache import CACHE_GRACE_SECONDS, DiscoveryCache
+    from instrumentation import Metrics, enabled_by_environment
+    from log_pipeline import configure_logging
 except Exception as e:
     logger.error(f"Import error: {str(e)}")
     logger.error(traceback.format_exc())
     sys.exit(1)
 
+DIAGNOSTICS_REFRESH_MS = 1000
+TRACKER_SHUTDOWN_MS = 2000  # How long closing the window waits for tracker threads
+FADE_STEP = 10  # dB faded by Shift-clicking + or -
+FADE_SECONDS = 2.0
+STATUS_MESSAGE_MS = 2000  # How long snapshot messages stay in the status line
+STATUS_REFRESH_MS = 10000  # Room-wide level and mute read, to catch drift
+AUTO_LABEL = "Auto"  # Network selector entry that searches every interface
+METER_HEIGHT = 6
+METER_RANGE_DB = 60.0  # The meter bar spans -60 to 0 dBFS
+METER_CLIP_DB = -1.0  # Peaks above this are shown in red
+HISTORY_SPANS = (("Hour", 3600), ("Day", 86400), ("Week", 7 * 86400))
+HISTORY_CHANGES = 200  # Latest changes listed in the history dialog
+
 class TrackerThread(QThread):
-    finished = pyqtSignal(object)
+    devices_changed = pyqtSignal(object)  # DeviceDiff of added/removed/updated speakers
     status_update = pyqtSignal(str)
     speakers_lost = pyqtSignal()  # New signal for when speakers are disconnected
+    interface_picked = pyqtSignal(str)  # Interface holding the speakers, in auto mode
     
-    def __init__(self, interface):
+    def __init__(self, interface, known=(), metrics=None, loop=None):
         super().__init__()
         self.interface = interface
+        self.auto = interface.lstrip('%') == AUTO_INTERFACE
+        self.loop = loop  # Event loop the all-interface tracker browses on
+        self.picked = None
+        self.metrics = metrics
         self.running = True
         self.logger = logging.getLogger(__name__)
-        self.tracker = tracker.Tracker()
+        self.tracker = None  # Created on the thread, so pyssc is imported off the GUI thread
+        self.table = DeviceTable()
+        # Speakers from the discovery cache are assumed present until mDNS
+        # has had time to find them
+        self.table.seed(known)
+        self.unconfirmed = {record.name for record in known}
+        self.grace_until = time.monotonic() + CACHE_GRACE_SECONDS
         
     def run(self):
         def on_devices_changed(setup):
             if not self.running:
                 return
-                
-            if not setup or not setup.ssc_devices:
+            if self.metrics is None:
+                handle_devices(setup)
+                return
+            start = time.perf_counter()
+            handle_devices(setup)
+            self.metrics.observe_tracker_callback(time.perf_counter() - start)
+        
+        def handle_devices(setup):
+            # Reduce the tracker's full snapshot to what actually changed
+            devices = setup.ssc_devices if setup else []
+            if self.auto:
+                # Follow the interface holding the speakers, ignoring the others
+                picked = pick_interface(devices, self.picked)
+                if picked != self.picked:
+                    self.picked = picked
+                    self.logger.info(f"Speakers found on {picked}")
+                    self.interface_picked.emit(picked)
+                devices = [device for device in devices if device.interface == self.picked]
+            self.unconfirmed.difference_update(device.name for device in devices)
+            keep = self.unconfirmed if time.monotonic() < self.grace_until else ()
+            diff = self.table.update(devices, keep=keep)
+            if not len(self.table):
                 self.logger.info("No devices found")
                 self.status_update.emit("Searching...")
                 self.speakers_lost.emit()
                 return
-                
-            num_devices = len(setup.ssc_devices)
-            if num_devices == 2:
-                try:
-                    self.logger.info("Attempting to connect to all devices...")
-                    # Connect all devices with the correct interface
-                    setup.connect_all(interface=self.interface)
-                    self.logger.info("Successfully connected to all devices")
-                    self.finished.emit(setup)
-                except Exception as e:
-                    self.logger.error(f"Connection error: {str(e)}")
-                    self.logger.error(traceback.format_exc())
-                    self.status_update.emit(f"Connection failed, retrying...")
-                    self.speakers_lost.emit()
-            else:
-                self.logger.info(f"Found {num_devices} speaker{'s' if num_devices != 1 else ''}")
-                self.status_update.emit(f"Found {num_devices} speaker{'s' if num_devices != 1 else ''}...")
-                self.speakers_lost.emit()
+            
+            if diff:
+                self.logger.info(f"Devices changed: {diff}")
+                # Connections are opened by the window's SSC transport
+                self.devices_changed.emit(diff)
         
         try:
             self.logger.info(f"Starting tracker with interface: {self.interface}")
+            if self.auto:
+                from multi_discovery import MultiInterfaceTracker, pick_interface
+                self.picked = pick_interface(self.table)
+                self.tracker = MultiInterfaceTracker(loop=self.loop)
+            else:
+                from pyssc.tracker import Tracker
+                self.tracker = Tracker()
             self.tracker.register_callback(on_devices_changed)
             self.tracker.start()
             
-            # Keep thread running until stopped
-            while self.running:
-                time.sleep(0.1)
+            # Block in the thread's event loop until stop() calls quit()
+            self.exec()
                 
         except Exception as e:
             self.logger.error(f"Tracker error: {str(e)}")
             self.logger.error(traceback.format_exc())
             self.status_update.emit("Error occurred")
+        finally:
+            # Shut the tracker down on this thread so stop() never blocks
+            try:
+                if self.tracker is not None:
+                    self.tracker.stop()
+            except Exception as e:
+                self.logger.error(f"Error stopping tracker: {str(e)}")
             
+    def set_interfaces(self, interfaces):
+        """Browse a new set of interfaces, in auto mode"""
+        if self.auto and self.tracker is not None and self.running:
+            self.tracker.set_interfaces(interfaces)
+    
     def stop(self):
+        """Ask the thread to finish; returns immediately"""
         self.running = False
-        if hasattr(self, 'tracker'):
-            self.tracker.stop()
-    
-def get_interface_friendly_name(interface):
-    """Get friendly name for network interface on macOS"""
-    try:
-        # Get all network services
-        result = subprocess.run(['networksetup', '-listallhardwareports'], 
-                              capture_output=True, text=True)
-        if result.returncode == 0:
-            lines = result.stdout.split('\n')
-            current_name = None
-            for line in lines:
-                if line.startswith('Hardware Port:'):
-                    current_name = line.split(': ')[1].strip()
-                elif line.startswith('Device:') and line.split(': ')[1].strip() == interface:
-                    return current_name
-    except Exception as e:
-        logger.error(f"Error getting friendly name: {e}")
-    return interface
+        # Safe before exec() has started: QThread then returns from exec() at once
+        self.quit()
+
+class FutureWatcher(QObject):
+    """Delivers results of transport futures back onto the Qt thread"""
+    done = pyqtSignal(object, object)
+
+    def __init__(self):
+        super().__init__()
+        self.done.connect(self._dispatch)
 
-def get_network_interfaces():
-    """Get list of network interfaces that might have SSC speakers"""
-    interfaces = []
-    interface_names = {}  # Map of interface to friendly name
-    
-    for iface in netifaces.interfaces():
-        # Skip loopback and non-physical interfaces
-        if iface == 'lo0' or iface.startswith(('utun', 'llw', 'awdl', 'bridge')):
-            continue
+    def watch(self, future, callback):
+        # The done callback runs on the transport thread; emitting the
+        # signal queues the call onto the thread that owns this object
+        future.add_done_callback(lambda f: self.done.emit(callback, f))
+
+    def deliver(self, callback, value):
+        """Call callback(value) on the Qt thread; safe from any thread"""
+        self.done.emit(callback, value)
+
+    def _dispatch(self, callback, future):
+        callback(future)
+
+class DiagnosticsDialog(QDialog):
+    """Hidden pane (Ctrl+Shift+D) showing live request metrics"""
+    
+    def __init__(self, window):
+        super().__init__(window)
+        self.main_window = window
+        self.setWindowTitle("Diagnostics")
+        self.resize(560, 360)
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        fixed_font = QFont("Menlo")
+        fixed_font.setStyleHint(QFont.StyleHint.Monospace)
+        self.text.setFont(fixed_font)
+        layout.addWidget(self.text)
         
-        addrs = netifaces.ifaddresses(iface)
-        # Check if interface has IPv6 address and is active
-        if netifaces.AF_INET6 in addrs:
-            for addr in addrs[netifaces.AF_INET6]:
-                # Look for self-assigned IPv6 addresses
-                if addr['addr'].startswith('fe80::'):
-                    friendly_name = get_interface_friendly_name(iface)
-                    interface_names[friendly_name] = iface
-                    interfaces.append(friendly_name)
-                    break
-    
-    return interfaces or ['Ethernet'], interface_names or {'Ethernet': 'en0'}
+        button_layout = QHBoxLayout()
+        self.enable_button = QPushButton("Enable")
+        self.enable_button.clicked.connect(self.enable)
+        button_layout.addWidget(self.enable_button)
+        json_button = QPushButton("Copy JSON")
+        json_button.clicked.connect(lambda: self.copy(self.to_json()))
+        button_layout.addWidget(json_button)
+        prometheus_button = QPushButton("Copy Prometheus")
+        prometheus_button.clicked.connect(
+            lambda: self.copy(self.main_window.metrics.to_prometheus() if self.main_window.metrics else ''))
+        button_layout.addWidget(prometheus_button)
+        layout.addLayout(button_layout)
+        
+        # Only refreshed while visible, so a closed pane costs nothing
+        self.timer = QTimer(self)
+        self.timer.setInterval(DIAGNOSTICS_REFRESH_MS)
+        self.timer.timeout.connect(self.refresh)
+    
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.refresh()
+        self.timer.start()
+    
+    def hideEvent(self, event):
+        self.timer.stop()
+        super().hideEvent(event)
+    
+    def scheduler_stats(self):
+        return self.main_window.scheduler.stats() if self.main_window.scheduler is not None else {}
+    
+    def intent_stats(self):
+        return self.main_window.intents.stats() if self.main_window.intents is not None else {}
+    
+    def to_json(self):
+        if self.main_window.metrics is None:
+            return ''
+        return self.main_window.metrics.to_json(level_writes=self.scheduler_stats(),
+                                                offline_changes=self.intent_stats())
+    
+    def copy(self, text):
+        QApplication.clipboard().setText(text)
+    
+    def enable(self):
+        self.main_window.enable_metrics()
+        self.refresh()
+    
+    def refresh(self):
+        metrics = self.main_window.metrics
+        self.enable_button.setEnabled(metrics is None)
+        stats = self.scheduler_stats()
+        intents = self.intent_stats()
+        lines = [f"Click to acknowledgement: p50 {stats.get('p50_ms')} ms, "
+                 f"p95 {stats.get('p95_ms')} ms, max {stats.get('max_ms')} ms",
+                 f"Level writes sent {stats.get('sent', 0)}, coalesced {stats.get('dropped', 0)}",
+                 f"Offline changes pending {intents.get('pending', 0)}, "
+                 f"applied {intents.get('count', 0)}, reconnect to level p95 {intents.get('p95_ms')} ms",
+                 ""]
+        surface = self.main_window.surface
+        if surface is not None:
+            surface_stats = surface.stats()
+            lines.insert(-1, f"Control surface events {surface_stats['received']}, "
+                             f"coalesced into {surface_stats['changes']} changes")
+        if metrics is None:
+            lines.append("Instrumentation is off. Click Enable, or start with --metrics.")
+        else:
+            lines.append(metrics.to_text())
+        self.text.setPlainText('\n'.join(lines))
+    
+class MeterBar(QWidget):
+    """Thin output meter: RMS as a bar, the held peak as a tick"""
+    
+    def __init__(self):
+        super().__init__()
+        self.setFixedHeight(METER_HEIGHT)
+        self.rms = None
+        self.peak = None
+    
+    def set_levels(self, rms, peak):
+        if (rms, peak) != (self.rms, self.peak):
+            self.rms, self.peak = rms, peak
+            self.update()  # Qt merges repaints, so this never paints faster than the screen
+    
+    def fraction(self, level):
+        return min(1.0, max(0.0, 1.0 + level / METER_RANGE_DB))
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        width, height = self.width(), self.height()
+        painter.fillRect(0, 0, width, height, QColor('#f0f0f0'))
+        if self.rms is None:
+            return
+        painter.fillRect(0, 0, round(width * self.fraction(self.rms)), height, QColor('#7bc47f'))
+        peak_x = min(width - 2, round(width * self.fraction(self.peak)))
+        painter.fillRect(peak_x, 0, 2, height,
+                         QColor('#d9534f' if self.peak > METER_CLIP_DB else '#333333'))
 
+class HistoryChart(QWidget):
+    """Min/max level envelope, one vertical line per bucket"""
+    
+    def __init__(self):
+        super().__init__()
+        self.setMinimumHeight(160)
+        self.envelope = None
+        self.start = self.end = 0.0
+    
+    def set_envelope(self, envelope, start, end):
+        self.envelope, self.start, self.end = envelope, start, end
+        self.update()
+    
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        width, height = self.width(), self.height()
+        painter.fillRect(0, 0, width, height, QColor('#f8f8f8'))
+        if self.envelope is None or not len(self.envelope.times):
+            painter.drawText(self.rect(), Qt.AlignmentFlag.AlignCenter, "No level changes")
+            return
+        low = float(self.envelope.mins.min()) - 1.0
+        high = float(self.envelope.maxs.max()) + 1.0
+        painter.setPen(QColor('#999999'))
+        painter.drawText(4, 12, f"{high:.0f}dB")
+        painter.drawText(4, height - 4, f"{low:.0f}dB")
+        painter.setPen(QColor('#2a7ab0'))
+        span = max(self.end - self.start, 1e-9)
+        for t, level_min, level_max in zip(self.envelope.times.tolist(), self.envelope.mins.tolist(),
+                                           self.envelope.maxs.tolist()):
+            x = round((t - self.start) / span * (width - 1))
+            top = round((high - level_max) / (high - low) * (height - 1))
+            bottom = round((high - level_min) / (high - low) * (height - 1))
+            painter.drawLine(x, top, x, max(top, bottom))
+
+class HistoryDialog(QDialog):
+    """Level history of the room: a chart of the last hour, day or week and the latest changes"""
+    
+    def __init__(self, window):
+        super().__init__(window)
+        self.main_window = window
+        self.setWindowTitle("Level history")
+        self.resize(560, 420)
+        layout = QVBoxLayout()
+        self.setLayout(layout)
+        span_layout = QHBoxLayout()
+        for label, seconds in HISTORY_SPANS:
+            button = QPushButton(label)
+            button.clicked.connect(lambda checked, seconds=seconds: self.show_span(seconds))
+            span_layout.addWidget(button)
+        layout.addLayout(span_layout)
+        self.chart = HistoryChart()
+        layout.addWidget(self.chart)
+        self.summary = QLabel()
+        layout.addWidget(self.summary)
+        self.text = QPlainTextEdit()
+        self.text.setReadOnly(True)
+        layout.addWidget(self.text)
+        self.show_span(HISTORY_SPANS[1][1])
+    
+    def show_span(self, seconds):
+        history = self.main_window.history
+        end = time.time()
+        started = time.perf_counter()
+        envelope = history.query(end - seconds, end, points=self.chart.width() or 500)
+        elapsed = time.perf_counter() - started
+        self.chart.set_envelope(envelope, end - seconds, end)
+        self.summary.setText(f"{len(envelope.times)} points from {len(history)} changes "
+                             f"in {elapsed * 1000:.1f} ms")
+        self.text.setPlainText('\n'.join(
+            f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(entry.time))}  "
+            f"{entry.device:<20} {entry.level:6.1f}dB  {entry.source}"
+            for entry in reversed(history.changes(end - seconds, limit=HISTORY_CHANGES))))
+    
 class SpeakerControlWindow(QMainWindow):
-    def __init__(self, interface='%en0'):
+    def __init__(self, interface='%en0', group=None, min_speakers=2, metrics=False,
+                 osc_port=None, midi_port=None, osc_host=None):
         super().__init__()
         self.interface = interface
+        self.osc_port = osc_port  # Control surface inputs, off when None
+        self.osc_host = osc_host  # Address OSC listens on, loopback when None
+        self.midi_port = midi_port
+        self.min_speakers = min_speakers
+        self.group = GroupManager.load().get(group)
         self.interface_names = {}  # Will store mapping of friendly names to interfaces
+        self.picked_interface = None  # Where auto mode found the speakers
         self.setWindowTitle("Speaker Control")
         self.setFixedSize(240, 180)
         
@@ -160,8 +376,100 @@ class SpeakerControlWindow(QMainWindow):
         else:
             logger.warning(f"Icon not found at {icon_path}")
         
-        self.setup = None
+        self.devices = DeviceTable()
+        self.connected = set()  # Speakers with a working connection
+        self.offline = set()  # Speakers that dropped out and are being reconnected
+        self.generation = 0  # Bumped whenever all speakers are dropped
+        self.retired_threads = set()  # Tracker threads still shutting down
+        self.level_request = None
+        self.pending_delta = 0  # Steps clicked before the level was known
+        self.drifted = []  # Group members whose level or mute disagrees with the rest
+        self.dropout_members = []  # Group members not back since all speakers were lost
+        self.dropout_level = None  # Group level to apply to them, while none are connected
+        self.level_cache = LevelCache()
+        self.discovery_cache = DiscoveryCache()
+        self.watcher = FutureWatcher()
+        self.metrics = Metrics() if metrics else None
+        self.diagnostics = None
+        QShortcut(QKeySequence("Ctrl+Shift+D"), self, self.toggle_diagnostics)
+        # Created by start_backend once the window has painted
+        self.inventory = None
+        self.transport = None
+        self.scheduler = None
+        self.intents = None  # Level changes waiting for speakers to reconnect
+        self.monitor = None
+        self.meters = None
+        self.supervisor = None
+        self.ramps = None
+        self.fade_shape = None
+        self.fade = None  # Future of the running fade
+        self.snapshot_store = None
+        self.surface = None
+        self.history = None  # Level change log
+        self.write_sources = {}  # Speaker -> what its pending level write came from
+        self.backend_scheduled = False
         self.init_ui()
+        self.status_label.setText("Starting...")
+    
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        if not self.backend_scheduled:
+            # Load networking only after the first frame is on screen
+            self.backend_scheduled = True
+            QTimer.singleShot(0, self.start_backend)
+    
+    def start_backend(self):
+        """Import and start discovery, the SSC transport and interface monitoring"""
+        try:
+            from ssc_transport import SscTransport
+            from command_scheduler import CommandScheduler
+            from intent_queue import IntentQueue
+            from level_monitor import LevelMonitor
+            from metering import MeterMonitor
+            from connection_supervisor import ONLINE, ConnectionSupervisor
+            from level_ramp import S_CURVE, RampEngine
+            from snapshots import SnapshotStore
+            from level_history import LevelHistory
+            from net_interfaces import InterfaceInventory
+            from speaker_engine import LEVEL_WRITE_RATE
+        except Exception as e:
+            logger.error(f"Import error: {str(e)}")
+            logger.error(traceback.format_exc())
+            self.show_error_and_exit(f"Missing dependency: {e}")
+            return
+        self.transport = SscTransport(metrics=self.metrics).start()
+        self.scheduler = CommandScheduler(
+            self.transport,
+            on_ack=lambda ack: self.watcher.deliver(self.on_level_ack, ack),
+            max_rate=LEVEL_WRITE_RATE)
+        self.intents = IntentQueue()
+        self.monitor = LevelMonitor(
+            self.transport,
+            on_level=lambda name, level: self.watcher.deliver(self.on_level_changed, (name, level)))
+        self.meters = MeterMonitor(
+            self.transport,
+            on_frame=lambda frame: self.watcher.deliver(self.on_meter_frame, frame))
+        self.supervisor = ConnectionSupervisor(
+            self.transport,
+            on_state=lambda name, state: self.watcher.deliver(
+                self.on_connection_state, (name, state == ONLINE)))
+        self.ramps = RampEngine(
+            self.transport,
+            on_write=lambda name, level, reported: self.watcher.deliver(
+                self.on_fade_step, (name, level, reported)))
+        self.fade_shape = S_CURVE
+        self.snapshot_store = SnapshotStore()
+        self.history = LevelHistory()
+        self.history.open()  # Stays off if another instance is recording
+        self.status_timer = QTimer(self)
+        self.status_timer.timeout.connect(self.update_level)
+        self.status_timer.start(STATUS_REFRESH_MS)
+        if self.osc_port is not None or self.midi_port is not None:
+            self.start_surface()
+        self.inventory = InterfaceInventory(
+            on_change=lambda: self.watcher.deliver(self.on_link_changed, None))
+        self.watcher.watch(self.inventory.load(), self.on_interfaces_loaded)
+        self.inventory.watch()
         self.start_scanning()
     
     def init_ui(self):
@@ -238,8 +546,11 @@ class SpeakerControlWindow(QMainWindow):
         button_layout.addWidget(self.plus_button)
         layout.addLayout(button_layout)
         
-        # Add spacing between buttons and network selector
-        layout.addSpacing(25)  # Increased to 25px
+        # Output meter between the buttons and the network selector
+        layout.addSpacing(10)
+        self.meter_bar = MeterBar()
+        layout.addWidget(self.meter_bar)
+        layout.addSpacing(25 - 10 - METER_HEIGHT)
         
         # Create network interface selector
         network_layout = QHBoxLayout()
@@ -270,20 +581,12 @@ class SpeakerControlWindow(QMainWindow):
                 border: 1px solid #cccccc;
             }
         """)
-        interfaces, self.interface_names = get_network_interfaces()
-        self.network_selector.addItems(interfaces)
-        # Set current interface (strip % if present)
+        # Show the current interface until the inventory has loaded in the background
         current_interface = self.interface.lstrip('%')
-        # Find friendly name for current interface
-        current_friendly_name = None
-        for friendly_name, iface in self.interface_names.items():
-            if iface == current_interface:
-                current_friendly_name = friendly_name
-                break
-        if current_friendly_name:
-            index = self.network_selector.findText(current_friendly_name)
-            if index >= 0:
-                self.network_selector.setCurrentIndex(index)
+        if self.auto_interface():
+            self.set_interfaces([], {})
+        else:
+            self.set_interfaces([current_interface], {current_interface: current_interface})
         self.network_selector.currentTextChanged.connect(self.on_network_changed)
         network_layout.addWidget(self.network_selector)
         layout.addLayout(network_layout)
@@ -300,73 +603,291 @@ class SpeakerControlWindow(QMainWindow):
             margin: 5px;
         """)
         layout.addWidget(self.status_label)
-        
-        # Create timer for updates
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_level)
+    
+    def set_interfaces(self, interfaces, interface_names):
+        """Fill the network selector, keeping the current interface selected"""
+        self.interface_names = dict(interface_names, **{AUTO_LABEL: AUTO_INTERFACE})
+        self.network_selector.blockSignals(True)
+        self.network_selector.clear()
+        self.network_selector.addItems([AUTO_LABEL] + [name for name in interfaces if name != AUTO_LABEL])
+        # Set current interface (strip % if present)
+        current_interface = self.interface.lstrip('%')
+        # Find friendly name for current interface
+        for friendly_name, iface in self.interface_names.items():
+            if iface == current_interface:
+                index = self.network_selector.findText(friendly_name)
+                if index >= 0:
+                    self.network_selector.setCurrentIndex(index)
+                break
+        self.network_selector.blockSignals(False)
+    
+    def on_interfaces_loaded(self, future):
+        try:
+            interfaces, interface_names = future.result()
+        except Exception as e:
+            logger.error(f"Error listing network interfaces: {e}")
+            return
+        self.set_interfaces(interfaces, interface_names)
+        if hasattr(self, 'scan_thread'):
+            self.scan_thread.set_interfaces(interface_names.values())
+    
+    def on_link_changed(self, _):
+        """Re-read the interfaces after the OS reported a link change"""
+        self.watcher.watch(self.inventory.load(), self.on_interfaces_loaded)
     
     def start_scanning(self):
         logger.info("\nStarting speaker scan...")
         self.status_label.setText("Scanning for speakers...")
-        self.scan_thread = TrackerThread(self.interface)
-        self.scan_thread.finished.connect(self.on_scan_complete)
-        self.scan_thread.status_update.connect(self.status_label.setText)
+        cached = self.discovery_cache.load(self.interface)
+        self.scan_thread = TrackerThread(self.interface, cached, self.metrics, self.transport.loop)
+        self.scan_thread.devices_changed.connect(self.on_devices_changed)
+        self.scan_thread.interface_picked.connect(self.on_interface_picked)
+        self.scan_thread.status_update.connect(self.on_tracker_status)
         self.scan_thread.speakers_lost.connect(self.on_speakers_lost)  # Connect new signal
+        self.scan_thread.finished.connect(self.on_tracker_finished)
         self.scan_thread.start()
+        if cached:
+            # Connect to the speakers seen last time while mDNS confirms them
+            logger.info(f"Trying {len(cached)} cached speakers")
+            self.on_devices_changed(DeviceDiff(added=cached))
+    
+    def from_retired_tracker(self):
+        """True if the signal being handled came from a replaced tracker thread"""
+        sender = self.sender()
+        return isinstance(sender, TrackerThread) and sender is not self.scan_thread
+    
+    def retire_scan_thread(self):
+        """Stop the current tracker thread without waiting for it"""
+        self.scan_thread.stop()
+        if self.scan_thread.isRunning():
+            # Keep a reference until it has finished so it is not destroyed while running
+            self.retired_threads.add(self.scan_thread)
     
-    def on_scan_complete(self, setup):
-        logger.info(f"\nScan complete. Setup: {setup}")
-        self.setup = setup
-        if not self.setup or not self.setup.ssc_devices:
-            logger.info("No speakers found in final result")
-            self.status_label.setText("No speakers found")
+    def on_tracker_finished(self):
+        self.retired_threads.discard(self.sender())
+    
+    def on_interface_picked(self, interface):
+        """Auto mode found the interface holding the speakers"""
+        if self.from_retired_tracker():
             return
+        self.picked_interface = interface
+        friendly = next((name for name, iface in self.interface_names.items() if iface == interface),
+                        interface)
+        self.network_selector.setToolTip(f"Speakers found on {friendly}")
+        self.update_controls()
+    
+    def start_surface(self):
+        """Take level changes from a hardware fader or encoder over OSC and MIDI"""
+        from control_surface import OSC_HOST, ControlSurface
+        self.surface = ControlSurface(
+            self.transport.loop,
+            on_change=lambda change: self.watcher.deliver(self.on_surface_change, change),
+            host=self.osc_host or OSC_HOST, port=self.osc_port, midi_port=self.midi_port)
+        self.watcher.watch(self.surface.start(), self.on_surface_started)
+    
+    def on_surface_started(self, future):
+        try:
+            future.result()
+        except Exception as e:
+            logger.error(f"Control surface failed to start: {e}")
+            self.surface = None
+            self.show_status_briefly("Control surface unavailable")
+    
+    def on_tracker_status(self, text):
+        if not self.from_retired_tracker():
+            self.status_label.setText(text)
+    
+    def on_devices_changed(self, diff):
+        """Connect new speakers and drop vanished ones, leaving the rest alone"""
+        if self.from_retired_tracker():
+            return
+        diff = self.devices.apply(diff)
+        if not diff:
+            return
+        logger.info(f"\nSpeakers changed: {diff}")
+        gone = [record.name for record in diff.removed + diff.updated]
+        for name in gone:
+            self.level_cache.invalidate(name)
+            self.connected.discard(name)
+            self.offline.discard(name)
+        self.scheduler.forget(record.name for record in diff.removed)
+        self.monitor.remove(gone)
+        self.meters.remove(gone)
+        self.supervisor.remove(gone)
         
-        # Ensure interface is set for each device
-        for device in self.setup.ssc_devices:
-            device.interface = self.interface
-            
-        logger.info(f"Successfully connected to {len(self.setup.ssc_devices)} speakers")
-        self.status_label.setText("Connected")
-        self.minus_button.setEnabled(True)
-        self.plus_button.setEnabled(True)
-        self.update_level()
-        self.timer.start(2000)  
+        generation = self.generation
+        # Speakers found in auto mode carry their own interface
+        future = self.transport.apply_diff(diff, '' if self.auto_interface() else self.interface)
+        self.watcher.watch(future, lambda f: self.on_devices_connected(generation, f))
+        self.update_controls()
+    
+    def on_devices_connected(self, generation, future):
+        """Handle the transport connecting the speakers of a diff"""
+        if generation != self.generation:
+            return  # All speakers were dropped since
+        try:
+            results = future.result()
+        except Exception as e:
+            logger.error(f"Connection error: {str(e)}")
+            results = {}
+        for name, error in results.items():
+            if name not in self.devices.devices:
+                continue  # Removed while connecting
+            if error is None:
+                self.connected.add(name)
+            else:
+                logger.error(f"Connection error: {str(error)}")
+                self.offline.add(name)
+        # The supervisor keeps retrying speakers that failed to connect
+        names = [name for name in results if name in self.devices.devices]
+        self.monitor.add(names)
+        self.meters.add(names)
+        self.supervisor.add(names)
+        self.apply_intents(names)
+        self.update_controls()
+    
+    def update_controls(self):
+        """Enable the controls once enough speakers of the group are connected.
+
+        Speakers that dropped out later still count towards min_speakers,
+        so the remaining ones stay controllable while they reconnect.
+        """
+        members = self.group_members()
+        ready = bool(members) and len(self.connected) + len(self.offline) >= self.min_speakers
+        # While every speaker is gone, clicks are queued for the reconnect
+        queueing = self.dropout_level is not None
+        self.minus_button.setEnabled(ready or queueing)
+        self.plus_button.setEnabled(ready or queueing)
+        if ready:
+            logger.info(f"Successfully connected to {len(self.connected)} speakers")
+            # Merged into the cached speakers; the file is written on a background thread
+            self.discovery_cache.store(
+                self.interface, [record for record in self.devices if record.name in self.connected])
+            self.status_label.setToolTip(", ".join(self.drifted))
+            if self.offline:
+                self.status_label.setText(f"Degraded: {len(self.offline)} offline, retrying...")
+            elif self.drifted:
+                self.status_label.setText(
+                    f"Out of sync: {len(self.drifted)} speaker{'s' if len(self.drifted) != 1 else ''}")
+            elif self.group.name != ALL_GROUP:
+                self.status_label.setText(f"Connected: {self.group.name} ({len(members)})")
+            elif self.auto_interface() and self.picked_interface:
+                self.status_label.setText(f"Connected via {self.picked_interface}")
+            else:
+                self.status_label.setText("Connected")
+        else:
+            if not members:
+                self.level_label.setText("--")
+            num_devices = len(self.devices)
+            if queueing and len(self.intents):
+                self.status_label.setText(f"Offline: {self.dropout_level:.1f}dB on reconnect")
+            elif self.offline:
+                self.status_label.setText("Connection failed, retrying...")
+            elif num_devices:
+                self.status_label.setText(f"Found {num_devices} speaker{'s' if num_devices != 1 else ''}...")
+    
+    def on_connection_state(self, update):
+        """Show a speaker dropping out or coming back as soon as the supervisor sees it"""
+        name, online = update
+        if name not in self.devices.devices:
+            return
+        if online:
+            self.offline.discard(name)
+            self.connected.add(name)
+            self.apply_intents([name])
+        else:
+            level = self.group_level()
+            self.connected.discard(name)
+            self.offline.add(name)
+            self.level_cache.invalidate(name)
+            if not self.group_members() and self.dropout_level is None:
+                self.dropout_level = level  # The last one gone; queue clicks from here
+        self.update_controls()
+        self.show_level()
     
     def on_speakers_lost(self):
         """Handle when speakers are disconnected or not fully available"""
-        self.setup = None  # Clear the setup
-        self.minus_button.setEnabled(False)
-        self.plus_button.setEnabled(False)
-        self.level_label.setText("--")
-        if hasattr(self, 'timer'):
-            self.timer.stop()  # Stop the level update timer
+        if self.from_retired_tracker():
+            return
+        members = self.group.resolve(name for name in self.devices.names()
+                                     if name in self.connected or name in self.offline)
+        level = self.group_level()
+        if members:
+            # Keep accepting clicks; they are written once the speakers are back
+            self.dropout_members = members
+            if level is not None:
+                self.dropout_level = level
+        self.generation += 1
+        self.devices.clear()
+        self.connected.clear()
+        self.offline.clear()
+        self.level_request = None
+        self.pending_delta = 0
+        self.drifted = []
+        self.level_cache.invalidate()
+        self.scheduler.clear()
+        self.transport.set_devices([], connect=False)
+        queueing = self.dropout_level is not None
+        self.minus_button.setEnabled(queueing)
+        self.plus_button.setEnabled(queueing)
+        self.level_label.setText(f"{self.dropout_level:.1f}dB" if queueing else "--")
+        self.monitor.stop()  # Stop level monitoring
+        self.meters.stop()
+        self.meter_bar.set_levels(None, None)
+        self.supervisor.stop()
+        self.ramps.cancel()
+        self.fade = None
     
     def on_network_changed(self, new_friendly_name):
         """Handle network interface change"""
         new_interface = self.interface_names.get(new_friendly_name, 'en0')
         logger.info(f"\nSwitching to network interface: {new_friendly_name} ({new_interface})")
         self.interface = f"%{new_interface}"
-        # Stop current scan if running
+        self.picked_interface = None
+        self.network_selector.setToolTip("")
+        if self.transport is None:
+            return  # start_backend will scan the new interface
+        # Stop current scan if running; it finishes in the background
         if hasattr(self, 'scan_thread'):
-            self.scan_thread.stop()
-            self.scan_thread.wait()
-        # Reset UI state
-        self.minus_button.setEnabled(False)
-        self.plus_button.setEnabled(False)
-        self.level_label.setText("--")
+            self.retire_scan_thread()
+        # Drop the speakers of the old interface and reset UI state; changes
+        # queued for them are not carried over to another network
+        self.on_speakers_lost()
+        self.forget_dropout()
         # Start new scan
         self.start_scanning()
     
+    def stop_tracker_threads(self):
+        """Stop every tracker thread, waiting a bounded time for them to finish"""
+        if hasattr(self, 'scan_thread'):
+            self.retire_scan_thread()
+        for thread in list(self.retired_threads):
+            thread.wait(TRACKER_SHUTDOWN_MS)
+    
     def __del__(self):
         """Cleanup when window is closed"""
+        try:
+            if hasattr(self, 'retired_threads'):
+                self.stop_tracker_threads()
+        except RuntimeError:
+            pass  # Qt objects already destroyed at interpreter exit
+        if getattr(self, 'transport', None) is not None:
+            self.transport.stop()
+    
+    def toggle_diagnostics(self):
+        if self.diagnostics is None:
+            self.diagnostics = DiagnosticsDialog(self)
+        self.diagnostics.setVisible(not self.diagnostics.isVisible())
+    
+    def enable_metrics(self):
+        """Start recording metrics without restarting"""
+        if self.metrics is not None:
+            return
+        self.metrics = Metrics()
+        if self.transport is not None:
+            self.transport.set_metrics(self.metrics)
         if hasattr(self, 'scan_thread'):
-            self.scan_thread.stop()
-            self.scan_thread.wait()
-        if hasattr(self, 'timer'):
-            self.timer.stop()
-        if hasattr(self, 'setup'):
-            self.setup.disconnect_all()
+            self.scan_thread.metrics = self.metrics
     
     def show_error_and_exit(self, message):
         """Show error message and exit application"""
@@ -379,106 +900,408 @@ class SpeakerControlWindow(QMainWindow):
         self.setCentralWidget(error_widget)
         self.show()
     
+    def auto_interface(self):
+        """True when discovery searches every interface"""
+        return self.interface.lstrip('%') == AUTO_INTERFACE
+    
+    def group_members(self):
+        """Names of the connected speakers in the active group"""
+        return self.group.resolve(name for name in self.devices.names() if name in self.connected)
+    
+    def group_level(self):
+        """Level of the active group, derived from its first member's cached level"""
+        members = self.group_members()
+        if not members or not self.level_cache.is_valid(members[0]):
+            return None
+        return self.group.group_level(members[0], self.level_cache.level(members[0]))
+    
+    def show_level(self):
+        level = self.group_level()
+        if level is not None:
+            self.level_label.setText(f"{level:.1f}dB")
+    
     def update_level(self):
+        """Read level and mute from every speaker of the group in one parallel round trip"""
+        members = self.group_members()
+        if not members or self.level_request is not None or self.fade is not None:
+            return  # Not connected, the previous read is still in flight, or fading
+        from room_status import read_status
+        self.level_request = read_status(self.transport, members)
+        self.watcher.watch(self.level_request, self.on_status_response)
+    
+    def on_status_response(self, future):
+        if future is not self.level_request:
+            return  # Stale response from before a reconnect
+        self.level_request = None
+        from room_status import find_drift
         try:
-            # Get level from first speaker (assuming all are synced)
-            response = self.setup.ssc_devices[0].send_ssc(
-                '{"audio": {"out": {"level": null}}}',
-                interface=self.interface
-            )
-            level = float(eval(response.RX)['audio']['out']['level'])
-            self.level_label.setText(f"{level:.1f}dB")
+            statuses = future.result()
         except Exception as e:
-            self.level_label.setText("Error")
+            statuses = {}
             logger.error(f"Error updating level: {e}")
-            # If there's an error, try to reconnect
-            try:
-                self.setup.connect_all(interface=self.interface)
-            except Exception as reconnect_error:
-                self.speakers_lost()
+        for status in statuses.values():
+            if status.level is not None and status.name in self.devices.devices:
+                if self.level_cache.update_from_poll(status.name, status.level):
+                    self.record_remote(status.name, status.level)
+        if self.group_level() is None:
+            self.level_label.setText("Error")
+            return  # The supervisor reconnects the speaker if it is gone
+        self.show_level()
+        reference, drifted = find_drift(statuses, self.group)
+        if drifted != self.drifted:
+            if drifted:
+                logger.warning(f"Out of sync with {reference:.1f}dB: " + ", ".join(
+                    f"{name} at {statuses[name].level:.1f}dB{' (muted)' if statuses[name].mute else ''}"
+                    for name in drifted))
+            self.drifted = drifted
+            self.update_controls()
+        if self.pending_delta:
+            delta, self.pending_delta = self.pending_delta, 0
+            self.step_level(delta)
+    
+    def on_level_changed(self, update):
+        """Handle a level change pushed (or polled) by the monitor"""
+        name, level = update
+        if name not in self.devices.devices:
+            return
+        if name not in self.connected:
+            # A speaker that failed to connect earlier has come back. The push
+            # came over the subscription connection, so queued levels wait for
+            # the supervisor to report the write connection online
+            # (on_connection_state)
+            self.offline.discard(name)
+            self.connected.add(name)
+            self.update_controls()
+        if self.level_cache.update_from_poll(name, level) and self.fade is None:
+            self.record_remote(name, level)
+        members = self.group_members()
+        if members and name == members[0] and self.fade is None:
+            self.show_level()
+    
+    def record_remote(self, name, level):
+        """Log a level read from a speaker; it only counts as a change if it differs from the last"""
+        from level_history import REMOTE
+        self.history.record(name, level, REMOTE)
+    
+    def on_meter_frame(self, frame):
+        """Show the loudest speaker of the group; frames arrive at most FRAME_RATE times a second"""
+        readings = [frame[name] for name in self.group_members() if name in frame]
+        if readings:
+            self.meter_bar.set_levels(max(reading.rms for reading in readings),
+                                      max(reading.peak for reading in readings))
+        else:
+            self.meter_bar.set_levels(None, None)
     
     def increase_level(self):
+        if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier:
+            self.fade_level(FADE_STEP)
+        else:
+            self.step_level(1)
+    
+    def decrease_level(self):
+        if QApplication.keyboardModifiers() & Qt.KeyboardModifier.ShiftModifier:
+            self.fade_level(-FADE_STEP)
+        else:
+            self.step_level(-1)
+    
+    def step_level(self, delta, clicked_at=None, source=None):
+        """Change the level of the active group by delta dB, based on the cached level"""
+        members = self.group_members()
+        if not members:
+            if self.dropout_level is not None:
+                self.queue_level(min(MAX_LEVEL, max(MIN_LEVEL, self.dropout_level + delta)))
+            return
+        current_level = self.group_level()
+        if current_level is None:
+            # Level unknown (startup or after an error): apply once the poll answers
+            self.pending_delta += delta
+            self.update_level()
+            return
+        self.set_group_level(current_level + delta, clicked_at, source)
+    
+    def set_group_level(self, level, clicked_at=None, source=None):
+        """Write a group level to every member; clicked_at is the time.monotonic() of the input"""
+        from level_history import CLICK
+        # Keep the level between 0 and 90
+        new_level = min(MAX_LEVEL, max(MIN_LEVEL, level))
+        self.queue_level(new_level)  # For members that are offline right now
+        members = self.group_members()
+        if not members:
+            return
+        
+        # Queue the new level (plus each speaker's offset) for the whole
+        # group at once; rapid clicks are coalesced
+        targets = self.group.targets(new_level, members, MIN_LEVEL, MAX_LEVEL)
+        for name, target in targets.items():
+            self.level_cache.begin_write([name], target)
+            self.write_sources[name] = source or CLICK
+        self.ramps.cancel(members)  # A click takes over from a running fade
+        self.fade = None
+        self.intents.discard(members)  # Written now; a stale queued level must not follow
+        self.scheduler.set_levels(targets, clicked_at=clicked_at or time.monotonic())
+        
+        # Update display immediately
+        self.level_label.setText(f"{new_level:.1f}dB")
+    
+    def on_surface_change(self, change):
+        """Apply a coalesced fader or encoder change from the control surface"""
+        from level_history import SURFACE
+        if change.level is not None:
+            self.set_group_level(change.level + change.delta, change.received_at, SURFACE)
+        elif change.delta:
+            self.step_level(change.delta, change.received_at, SURFACE)
+    
+    def fade_level(self, delta):
+        """Fade the active group by delta dB over FADE_SECONDS"""
+        members = self.group_members()
+        current_level = self.group_level()
+        if not members or current_level is None:
+            return
+        new_level = min(MAX_LEVEL, max(MIN_LEVEL, current_level + delta))
+        starts = self.group.targets(current_level, members, MIN_LEVEL, MAX_LEVEL)
+        targets = self.group.targets(new_level, members, MIN_LEVEL, MAX_LEVEL)
+        self.scheduler.forget(members)  # Drop queued clicks the fade replaces
+        self.intents.discard(members)
+        self.queue_level(new_level)  # Offline members go straight to where the fade ends
+        self.fade = self.ramps.ramp(starts, targets, FADE_SECONDS, self.fade_shape)
+        self.watcher.watch(self.fade, self.on_fade_done)
+    
+    def unreachable_members(self):
+        """Group members that cannot be written now: offline, or not back after a dropout"""
+        names = set(self.offline)
+        names.update(name for name in self.dropout_members if name not in self.connected)
+        return self.group.resolve(names)
+    
+    def queue_level(self, level):
+        """Remember a group level for the members that cannot be reached yet"""
+        unreachable = self.unreachable_members()
+        if not unreachable:
+            return
+        self.intents.set_levels(self.group.targets(level, unreachable, MIN_LEVEL, MAX_LEVEL))
+        if not self.group_members():
+            self.dropout_level = level
+            self.level_label.setText(f"{level:.1f}dB")
+            self.status_label.setText(f"Offline: {level:.1f}dB on reconnect")
+    
+    def apply_intents(self, names):
+        """Write the levels queued for speakers that have just reconnected, in one batch"""
+        targets = self.intents.take(name for name in names if name in self.connected)
+        self.dropout_members = [name for name in self.dropout_members if name not in self.connected]
+        if self.group_members():
+            self.dropout_level = None  # Clicks go to the connected members again
+        if not targets:
+            return
+        logger.info(f"Applying levels queued while offline: {targets}")
+        from level_history import QUEUED
+        for name, target in targets.items():
+            self.level_cache.begin_write([name], target)
+            self.write_sources[name] = QUEUED
+        self.scheduler.set_levels(targets, clicked_at=time.monotonic())
+        self.show_level()
+    
+    def forget_dropout(self):
+        self.dropout_members = []
+        self.dropout_level = None
+        self.intents.clear()
+        self.minus_button.setEnabled(False)
+        self.plus_button.setEnabled(False)
+        self.level_label.setText("--")
+    
+    def on_fade_step(self, update):
+        """Follow a running fade in the level cache and on the display"""
+        name, level, reported = update
+        if self.fade is None:
+            return  # Cancelled by a click; its own write owns the cache now
+        # Recorded as a completed write, so a click mid-fade starts from here
+        self.level_cache.begin_write([name], level)
+        self.level_cache.end_write(name, level, reported)
+        from level_history import FADE
+        self.history.record(name, reported, FADE)
+        members = self.group_members()
+        if members and name == members[0]:
+            self.level_label.setText(f"{self.group.group_level(name, level):.1f}dB")
+    
+    def on_fade_done(self, future):
+        if future is self.fade:
+            self.fade = None
         try:
-            # Get current level
-            response = self.setup.ssc_devices[0].send_ssc(
-                '{"audio": {"out": {"level": null}}}',
-                interface=self.interface
-            )
-            current_level = float(eval(response.RX)['audio']['out']['level'])
-            
-            # Increase by 1dB, but don't exceed 90
-            new_level = min(90, current_level + 1)
-            
-            # Set new level
-            command = {"audio": {"out": {"level": new_level}}}
-            self.setup.send_all(json.dumps(command), interface=self.interface)
-            
-            # Update display immediately
-            self.level_label.setText(f"{new_level:.1f}dB")
+            report = future.result()
         except Exception as e:
-            logger.error(f"Error increasing level: {e}")
-            # If there's an error, try to reconnect
-            try:
-                self.setup.connect_all(interface=self.interface)
-            except Exception as reconnect_error:
-                self.speakers_lost()
+            logger.error(f"Fade failed: {e}")
+            return
+        logger.info(f"Fade took {report['duration_ms']} ms of {report['planned_ms']} ms, "
+                    f"ticks late p95 {report['late_p95_ms']} ms, "
+                    f"ack spread p95 {report['spread_p95_ms']} ms")
     
-    def decrease_level(self):
+    def contextMenuEvent(self, event):
+        """Right-click menu for snapshots and the level history"""
+        if self.snapshot_store is None:
+            return
+        menu = QMenu(self)
+        save_action = menu.addAction("Save snapshot...", self.save_snapshot)
+        save_action.setEnabled(bool(self.connected))
+        names = self.snapshot_store.names()
+        recall_menu = menu.addMenu("Recall snapshot")
+        delete_menu = menu.addMenu("Delete snapshot")
+        recall_menu.setEnabled(bool(names and self.connected))
+        delete_menu.setEnabled(bool(names))
+        for name in names:
+            recall_menu.addAction(name, lambda name=name: self.recall_snapshot(name))
+            delete_menu.addAction(name, lambda name=name: self.snapshot_store.delete(name))
+        if self.history is not None:
+            menu.addSeparator()
+            menu.addAction("Level history...", lambda: HistoryDialog(self).show())
+        menu.exec(event.globalPos())
+    
+    def save_snapshot(self, name=None):
+        """Capture level, mute, delay and EQ bypass of every connected speaker"""
+        if name is None:
+            name, ok = QInputDialog.getText(self, "Save snapshot", "Snapshot name:")
+            if not ok or not name:
+                return
+        from snapshots import capture
+        names = [device for device in self.devices.names() if device in self.connected]
+        self.watcher.watch(capture(self.transport, names),
+                           lambda f: self.on_snapshot_captured(name, f))
+    
+    def on_snapshot_captured(self, name, future):
         try:
-            # Get current level
-            response = self.setup.ssc_devices[0].send_ssc(
-                '{"audio": {"out": {"level": null}}}',
-                interface=self.interface
-            )
-            current_level = float(eval(response.RX)['audio']['out']['level'])
-            
-            # Decrease by 1dB, but don't go below 0
-            new_level = max(0, current_level - 1)
-            
-            # Set new level
-            command = {"audio": {"out": {"level": new_level}}}
-            self.setup.send_all(json.dumps(command), interface=self.interface)
-            
-            # Update display immediately
-            self.level_label.setText(f"{new_level:.1f}dB")
+            devices = future.result()
         except Exception as e:
-            logger.error(f"Error decreasing level: {e}")
-            # If there's an error, try to reconnect
-            try:
-                self.setup.connect_all(interface=self.interface)
-            except Exception as reconnect_error:
-                self.speakers_lost()
+            logger.error(f"Snapshot failed: {e}")
+            devices = None
+        if not devices:
+            self.show_status_briefly("Snapshot failed")
+            return
+        self.snapshot_store.save(name, devices)
+        self.show_status_briefly(f"Saved {name}")
+    
+    def recall_snapshot(self, name):
+        """Write a stored snapshot back, one combined request per speaker"""
+        devices = self.snapshot_store.get(name)
+        if devices is None:
+            return
+        from snapshots import recall
+        from ssc_codec import LEVEL_PATH
+        names = [device for device in devices if device in self.connected]
+        self.ramps.cancel(names)
+        self.fade = None
+        self.scheduler.forget(names)  # The snapshot replaces any queued click
+        self.intents.discard(names)  # ... and any level queued while it was offline
+        for device in names:
+            if LEVEL_PATH in devices[device]:
+                self.level_cache.begin_write([device], float(devices[device][LEVEL_PATH]))
+        future = recall(self.transport, {device: devices[device] for device in names})
+        self.watcher.watch(future, lambda f: self.on_snapshot_recalled(name, devices, f))
+    
+    def on_snapshot_recalled(self, name, devices, future):
+        from ssc_codec import LEVEL_PATH, SscResponseError, extract_level
+        try:
+            results = future.result()
+        except Exception as e:
+            logger.error(f"Recalling {name} failed: {e}")
+            results = {}
+        failed = 0
+        for device, raw in results.items():
+            level = devices[device].get(LEVEL_PATH)
+            if isinstance(raw, Exception):
+                logger.error(f"Recalling {name} on {device} failed: {raw}")
+                failed += 1
+                self.level_cache.invalidate(device)
+            elif level is not None:
+                try:
+                    reported = extract_level(raw)
+                except SscResponseError as e:
+                    logger.error(f"Recalling {name} on {device}: {e}")
+                    failed += 1
+                    self.level_cache.invalidate(device)
+                    continue
+                self.level_cache.end_write(device, float(level), reported)
+                from level_history import SNAPSHOT
+                self.history.record(device, reported, SNAPSHOT)
+        self.show_level()
+        if failed:
+            self.show_status_briefly(f"Recalled {name}, {failed} failed")
+        else:
+            self.show_status_briefly(f"Recalled {name}")
+    
+    def show_status_briefly(self, text):
+        self.status_label.setText(text)
+        QTimer.singleShot(STATUS_MESSAGE_MS, self.update_controls)
+    
+    def on_level_ack(self, ack):
+        """Handle a speaker acknowledging (or failing) a level write"""
+        from ssc_codec import extract_level
+        try:
+            if ack.error is not None:
+                raise ack.error
+            level = extract_level(ack.response)
+        except Exception as e:
+            logger.error(f"Error changing level on {ack.name}: {e}")
+            self.level_cache.end_write(ack.name, ack.value, None)
+            self.intents.failed(ack.name, ack.value)  # Tried again on the next reconnect
+            return
+        self.level_cache.end_write(ack.name, ack.value, level)
+        from level_history import CLICK
+        self.history.record(ack.name, level, self.write_sources.get(ack.name, CLICK))
+        logger.debug(f"Level {ack.value} acknowledged by {ack.name} after {ack.latency * 1000:.1f} ms")
+        elapsed = self.intents.acknowledged(ack.name, ack.value)
+        if elapsed is not None:
+            logger.info(f"{ack.name} reached its queued level {ack.value} "
+                        f"{elapsed * 1000:.1f} ms after reconnecting")
     
     def closeEvent(self, event):
         """Handle window close event"""
-        if hasattr(self, 'scan_thread'):
-            self.scan_thread.stop()
-            self.scan_thread.wait()
+        self.stop_tracker_threads()
+        if self.inventory is not None:
+            self.inventory.stop()
+        if self.surface is not None:
+            self.surface.stop()
+        if self.history is not None:
+            self.history.close()
+        if self.transport is not None:
+            self.transport.stop()
         event.accept()
 
 if __name__ == "__main__":
-    # Set up logging
-    logging.basicConfig(
-        level=logging.ERROR,
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.StreamHandler(),
-            logging.FileHandler(os.path.expanduser('~/speaker_control_debug.log'))
-        ]
-    )
-    logger = logging.getLogger(__name__)
-    logger.info("Starting Speaker Control application")
-    
     try:
         parser = argparse.ArgumentParser(description='SSC Speaker Control GUI')
-        parser.add_argument('--interface', '-i', default='en0',
-                          help='Network interface to use (default: en0)')
+        parser.add_argument('--interface', '-i', default=AUTO_INTERFACE,
+                          help=f"Network interface to use, or '{AUTO_INTERFACE}' to search them all "
+                               f"(default: {AUTO_INTERFACE})")
+        parser.add_argument('--group', '-g', default=None,
+                          help='Speaker group to control (default: all speakers)')
+        parser.add_argument('--speakers', '-n', type=int, default=2,
+                          help='Number of speakers to wait for before connecting (default: 2)')
+        parser.add_argument('--metrics', action='store_true',
+                          help='Record request metrics for the diagnostics pane (Ctrl+Shift+D)')
+        parser.add_argument('--log-json', action='store_true',
+                          help='Write the debug log as JSON lines')
+        parser.add_argument('--osc-port', type=int, default=None,
+                          help='Take level changes from a control surface as OSC on this UDP port')
+        parser.add_argument('--osc-host', default=None,
+                          help='Address to listen for OSC on (default: 127.0.0.1, this machine only); '
+                               '0.0.0.0 lets anyone on the network change levels')
+        parser.add_argument('--midi', nargs='?', const='', default=None, metavar='PORT',
+                          help='Take level changes from MIDI CC on this input (default input if no name)')
         args = parser.parse_args()
+        try:
+            GroupManager.load().get(args.group)
+        except ValueError as e:
+            parser.error(str(e))
+        
+        # Set up logging; records are written out on a background thread
+        configure_logging(json_lines=args.log_json)
+        logger.info("Starting Speaker Control application")
         
         logger.info("Creating QApplication")
         app = QApplication(sys.argv)
         logger.info("Creating main window")
-        window = SpeakerControlWindow(interface=f"%{args.interface}")
+        window = SpeakerControlWindow(interface=f"%{args.interface}", group=args.group,
+                                      min_speakers=args.speakers,
+                                      metrics=args.metrics or enabled_by_environment(),
+                                      osc_port=args.osc_port, midi_port=args.midi,
+                                      osc_host=args.osc_host)
         logger.info("Showing main window")
         window.show()
         logger.info("Entering main event loop")
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless speaker daemon.
+
+Runs a SpeakerEngine without a GUI, keeping the speaker connections
+open, and serves a local control API on a Unix socket (see speakerctl.py
+for the protocol and a client):
+
+    python speaker_daemon.py --interface en0
+    python speaker_daemon.py --interface auto
+    python speaker_daemon.py --device "KH 150 L=192.168.1.20" --device "KH 150 R=192.168.1.21"
+
+With --device the given speakers are used instead of mDNS discovery.
+With --osc-port and/or --midi a hardware fader or encoder drives the
+group level (see control_surface.py). Level changes are recorded in
+~/.speaker_control_history and served by the "history" command.
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import signal
+import socket
+import threading
+import time
+
+from control_surface import OSC_HOST, ControlSurface
+from device_groups import GroupManager
+from instrumentation import Metrics, enabled_by_environment
+from level_history import DEFAULT_HISTORY_DIR, LevelHistory
+from level_ramp import LINEAR
+from log_pipeline import configure_logging
+from speaker_engine import SpeakerEngine, parse_device
+from speakerctl import default_socket_path
+
+logger = logging.getLogger(__name__)
+
+
+class ControlServer:
+    """Unix-socket JSON-lines API in front of a SpeakerEngine"""
+
+    def __init__(self, engine, path):
+        self.engine = engine
+        self.path = path
+        self.server = None
+
+    async def start(self):
+        self._remove_stale_socket()
+        self.server = await asyncio.start_unix_server(self._handle_client, self.path)
+        os.chmod(self.path, 0o600)
+        logger.info(f"Listening on {self.path}")
+        return self
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.path):
+            return
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(self.path)
+            except OSError:
+                os.unlink(self.path)  # Left behind by a daemon that died
+                return
+        raise RuntimeError(f"Another daemon is already listening on {self.path}")
+
+    async def handle(self, request):
+        cmd = request.get('cmd')
+        if cmd == 'list':
+            return {'devices': await self.engine.alist_devices()}
+        if cmd == 'get':
+            return {'level': await self.engine.aget_level(bool(request.get('refresh')))}
+        if cmd == 'set':
+            acks = await self.engine.aset_level(float(request['level']))
+            return {'level': await self.engine.alevel(), 'devices': acks}
+        if cmd == 'step':
+            acks = await self.engine.astep_level(float(request['delta']))
+            return {'level': await self.engine.alevel(), 'devices': acks}
+        if cmd == 'fade':
+            report = await self.engine.afade(float(request['level']), float(request['duration']),
+                                             request.get('shape', LINEAR))
+            return {'level': await self.engine.aget_level(), 'ramp': report}
+        if cmd == 'status':
+            start = time.perf_counter()
+            status = await self.engine.astatus()
+            status['elapsed_ms'] = round((time.perf_counter() - start) * 1000.0, 1)
+            return status
+        if cmd == 'snapshot':
+            return await self.handle_snapshot(request.get('action'), request.get('name'))
+        if cmd == 'history':
+            return self.handle_history(float(request.get('span', 86400)), request.get('device'),
+                                       int(request.get('points', 100)), int(request.get('changes', 20)))
+        if cmd == 'metrics':
+            metrics = self.engine.metrics
+            if metrics is None:
+                raise ValueError("Metrics are off; start the daemon with --metrics")
+            if request.get('prometheus'):
+                return {'text': metrics.to_prometheus()}
+            snapshot = metrics.snapshot()
+            snapshot['level_writes'] = self.engine.scheduler.stats()
+            snapshot['offline_changes'] = self.engine.intents.stats()
+            return {'metrics': snapshot}
+        raise ValueError(f"Unknown command: {cmd}")
+
+    def handle_history(self, span, device, points, changes):
+        history = self.engine.history
+        if history is None or not history.enabled:
+            raise ValueError("Level history is off")
+        start = time.perf_counter()
+        end = time.time()
+        envelope = history.query(end - span, end, device=device, points=points)
+        recent = history.changes(end - span, device=device, limit=changes) if changes else []
+        return {'times': envelope.times.tolist(), 'mins': envelope.mins.tolist(),
+                'maxs': envelope.maxs.tolist(), 'records': len(history),
+                'changes': [entry._asdict() for entry in recent],
+                'elapsed_ms': round((time.perf_counter() - start) * 1000.0, 1)}
+
+    async def handle_snapshot(self, action, name):
+        store = self.engine.snapshots
+        if action == 'list':
+            return {'snapshots': store.names()}
+        if not name:
+            raise ValueError(f"snapshot {action} needs a name")
+        if action == 'save':
+            return {'devices': sorted(await self.engine.asave_snapshot(name))}
+        if action == 'recall':
+            start = time.perf_counter()
+            outcome = await self.engine.arecall_snapshot(name)
+            return {'devices': outcome, 'elapsed_ms': round((time.perf_counter() - start) * 1000.0, 1)}
+        if action == 'delete':
+            store.delete(name)
+            return {}
+        raise ValueError(f"Unknown snapshot action: {action}")
+
+    async def _handle_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = dict(ok=True, **await self.handle(json.loads(line)))
+                except Exception as e:
+                    response = {'ok': False, 'error': str(e)}
+                writer.write(json.dumps(response).encode('utf-8') + b'\n')
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Headless SSC speaker daemon')
+    parser.add_argument('--interface', '-i', default='en0',
+                        help="Network interface to use, or 'auto' to search them all (default: en0)")
+    parser.add_argument('--group', '-g', default=None,
+                        help='Speaker group to control (default: all speakers)')
+    parser.add_argument('--device', '-d', action='append', type=parse_device, metavar='NAME=HOST[:PORT]',
+                        help='Use this speaker instead of discovery; may be repeated')
+    parser.add_argument('--socket', '-s', default=default_socket_path(),
+                        help=f'Control socket path (default: {default_socket_path()})')
+    parser.add_argument('--metrics', action='store_true',
+                        help='Record request metrics, served by the "metrics" command')
+    parser.add_argument('--osc-port', type=int, default=None,
+                        help='Take level changes from a control surface as OSC on this UDP port')
+    parser.add_argument('--osc-host', default=OSC_HOST,
+                        help=f'Address to listen for OSC on (default: {OSC_HOST}, this machine only); '
+                             f'0.0.0.0 lets anyone on the network change levels')
+    parser.add_argument('--midi', nargs='?', const='', default=None, metavar='PORT',
+                        help='Take level changes from MIDI CC on this input (default input if no name)')
+    parser.add_argument('--history-dir', default=DEFAULT_HISTORY_DIR,
+                        help=f'Where level changes are recorded (default: {DEFAULT_HISTORY_DIR})')
+    parser.add_argument('--log-file', help='Also log to this file, rotated by size')
+    parser.add_argument('--log-json', action='store_true', help='Write the log file as JSON lines')
+    args = parser.parse_args()
+    try:
+        GroupManager.load().get(args.group)
+    except ValueError as e:
+        parser.error(str(e))
+    configure_logging(logging.INFO, path=args.log_file, json_lines=args.log_json)
+
+    metrics = Metrics() if args.metrics or enabled_by_environment() else None
+    history = LevelHistory(args.history_dir)
+    if not history.open():
+        logger.warning(f"{args.history_dir} is in use by another process; not recording level history")
+    engine = SpeakerEngine(interface=f"%{args.interface}", group=args.group, devices=args.device,
+                           metrics=metrics, history=history)
+    stopping = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *_: stopping.set())
+    engine.start()
+    server = engine.transport.submit(ControlServer(engine, args.socket).start())
+    surface = None
+    try:
+        server = server.result()
+        if args.osc_port is not None or args.midi is not None:
+            surface = ControlSurface(engine.transport.loop, engine.handle_control,
+                                     host=args.osc_host, port=args.osc_port,
+                                     midi_port=args.midi).start().result()
+        stopping.wait()
+    except (RuntimeError, OSError) as e:
+        logger.error(str(e))
+        server = None
+    finally:
+        if surface is not None:
+            surface.stop()
+        if server is not None:
+            engine.transport.submit(server.stop()).result()
+        engine.stop()
+        history.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Headless speaker control engine.
+
+Owns everything needed to control a set of speakers without a GUI:
+discovery (or a fixed device list), the SSC transport, the level cache,
+the coalescing command scheduler and the level monitor. All state lives
+on the transport loop; the public methods are thread-safe and return
+concurrent.futures.Future objects, the coroutine methods (prefixed with
+``a``) must be awaited on the transport loop.
+"""
+
+import asyncio
+import logging
+import time
+
+from command_scheduler import CommandScheduler
+from connection_supervisor import ONLINE, ConnectionSupervisor
+from device_groups import MAX_LEVEL, MIN_LEVEL, GroupManager
+from device_tracking import AUTO_INTERFACE, DeviceDiff, DeviceRecord, DeviceTable, SSC_PORT
+from discovery_cache import CACHE_GRACE_SECONDS, DiscoveryCache
+from intent_queue import IntentQueue
+from level_cache import LevelCache
+from level_history import API, FADE, QUEUED, REMOTE, SNAPSHOT, SURFACE
+from level_ramp import LINEAR, RampEngine
+from level_monitor import LevelMonitor
+from room_status import aread_status, find_drift
+from snapshots import SnapshotStore, acapture, arecall
+from ssc_codec import LEVEL_PATH, SscResponseError, encode_get, extract_level
+from ssc_transport import SscError, SscTransport
+
+logger = logging.getLogger(__name__)
+
+LEVEL_WRITE_RATE = 20  # Maximum level writes per second per speaker
+ACK_TIMEOUT = 5.0
+
+
+def parse_device(spec):
+    """Parse NAME=HOST[:PORT] (IPv6 as NAME=[HOST]:PORT) into a DeviceRecord"""
+    name, sep, address = spec.partition('=')
+    if not sep or not name or not address:
+        raise ValueError(f"Expected NAME=HOST[:PORT], got {spec!r}")
+    port = SSC_PORT
+    if address.startswith('['):
+        host, _, rest = address[1:].partition(']')
+        if rest.startswith(':'):
+            port = int(rest[1:])
+    elif address.count(':') == 1:
+        host, port = address.split(':')
+        port = int(port)
+    else:
+        host = address
+    return DeviceRecord(name, host, port)
+
+
+class SpeakerEngine:
+    """Discovers, connects and controls speakers on one interface"""
+
+    def __init__(self, interface='%en0', group=None, devices=None, use_cache=True, metrics=None,
+                 history=None):
+        self.interface = interface
+        self.auto = interface.lstrip('%') == AUTO_INTERFACE
+        self.picked_interface = None  # Where auto mode found the speakers
+        self.metrics = metrics  # instrumentation.Metrics, or None when disabled
+        self.group = GroupManager.load().get(group)
+        self.static_devices = list(devices) if devices else None
+        self.discovery_cache = DiscoveryCache() if use_cache and devices is None else None
+        self.transport = SscTransport(metrics=metrics)
+        self.devices = DeviceTable()
+        self.connected = set()
+        self.level_cache = LevelCache()
+        self.scheduler = CommandScheduler(self.transport, on_ack=self._on_ack,
+                                          max_rate=LEVEL_WRITE_RATE)
+        self.intents = IntentQueue()  # Levels for speakers that are offline, applied on reconnect
+        self.monitor = LevelMonitor(self.transport, on_level=self._on_level)
+        self.supervisor = ConnectionSupervisor(self.transport, on_state=self._on_state)
+        self.ramps = RampEngine(self.transport, on_write=self._on_ramp_write)
+        self.snapshots = SnapshotStore()
+        self.history = history  # level_history.LevelHistory to record changes in, or None
+        self.write_sources = {}  # name -> what its pending level write came from
+        self.ack_waiters = {}  # name -> list of (value, future) in submission order
+        self.unconfirmed = set()
+        self.grace_until = 0.0
+        self.tracker = None
+
+    # Thread-safe API
+
+    def start(self):
+        """Start the transport loop, connect known speakers and start discovery"""
+        self.transport.start()
+        self.transport.submit(self.astart()).result()
+        if self.static_devices is None:
+            self._start_tracker()
+        return self
+
+    def stop(self):
+        if self.tracker is not None:
+            try:
+                self.tracker.stop()
+            except Exception as e:
+                logger.error(f"Error stopping tracker: {e}")
+            self.tracker = None
+        self.transport.stop()
+
+    def list_devices(self):
+        return self.transport.submit(self.alist_devices())
+
+    def get_level(self, refresh=False):
+        return self.transport.submit(self.aget_level(refresh))
+
+    def set_level(self, level):
+        return self.transport.submit(self.aset_level(level))
+
+    def step_level(self, delta):
+        return self.transport.submit(self.astep_level(delta))
+
+    def fade(self, level, duration, shape=LINEAR):
+        return self.transport.submit(self.afade(level, duration, shape))
+
+    def status(self):
+        return self.transport.submit(self.astatus())
+
+    def save_snapshot(self, name):
+        return self.transport.submit(self.asave_snapshot(name))
+
+    def recall_snapshot(self, name):
+        return self.transport.submit(self.arecall_snapshot(name))
+
+    # Discovery
+
+    def _start_tracker(self):
+        loop = self.transport.loop
+
+        def on_devices_changed(setup):
+            # Called on a zeroconf thread
+            devices = [DeviceRecord.from_device(d) for d in (setup.ssc_devices if setup else [])]
+            loop.call_soon_threadsafe(self._on_snapshot, devices)
+
+        if self.auto:
+            # Browses every interface on the transport loop
+            from multi_discovery import MultiInterfaceTracker
+            self.tracker = MultiInterfaceTracker(loop=loop)
+        else:
+            from pyssc.tracker import Tracker
+            self.tracker = Tracker()
+        self.tracker.register_callback(on_devices_changed)
+        self.tracker.start()
+        logger.info(f"Started discovery on {self.interface}")
+
+    def _on_snapshot(self, devices):
+        start = time.perf_counter()
+        if self.auto:
+            from multi_discovery import pick_interface
+            picked = pick_interface(devices, self.picked_interface)
+            if picked != self.picked_interface:
+                logger.info(f"Speakers found on {picked}")
+                self.picked_interface = picked
+            devices = [device for device in devices if device.interface == picked]
+        self.unconfirmed.difference_update(device.name for device in devices)
+        keep = self.unconfirmed if time.monotonic() < self.grace_until else ()
+        diff = self.devices.update(devices, keep=keep)
+        if diff:
+            logger.info(f"Devices changed: {diff}")
+            self.transport.loop.create_task(self._aconnect(diff))
+        if self.metrics is not None:
+            self.metrics.observe_tracker_callback(time.perf_counter() - start)
+
+    # Coroutine API
+
+    async def astart(self):
+        if self.static_devices is not None:
+            known = self.static_devices
+        else:
+            known = self.discovery_cache.load(self.interface) if self.discovery_cache else []
+            if self.auto:
+                from multi_discovery import pick_interface
+                self.picked_interface = pick_interface(known)
+            # Cached speakers are assumed present until mDNS has had time to find them
+            self.unconfirmed = {record.name for record in known}
+            self.grace_until = time.monotonic() + CACHE_GRACE_SECONDS
+        self.devices.seed(known)
+        if known:
+            await self._aconnect(DeviceDiff(added=known))
+
+    async def _aconnect(self, diff):
+        """Connect new speakers and drop vanished ones, leaving the rest alone"""
+        gone = [record.name for record in diff.removed + diff.updated]
+        for name in gone:
+            self.level_cache.invalidate(name)
+            self.connected.discard(name)
+        self._forget([record.name for record in diff.removed], "speaker went away")
+        await self.monitor.aremove(gone)
+        await self.supervisor.aremove(gone)
+        # Speakers found in auto mode carry their own interface
+        results = await self.transport.aapply_diff(diff, '' if self.auto else self.interface)
+        for name, error in results.items():
+            if name not in self.devices.devices:
+                continue  # Removed while connecting
+            if error is None:
+                self.connected.add(name)
+            else:
+                logger.error(f"Connection error: {error}")
+        # The supervisor keeps retrying speakers that failed to connect
+        names = [name for name in results if name in self.devices.devices]
+        await self.monitor.aadd(names)
+        await self.supervisor.aadd(names)
+        self._apply_intents(names)
+        if self.discovery_cache is not None and self.connected:
+            self.discovery_cache.store(
+                self.interface, [record for record in self.devices if record.name in self.connected])
+
+    def group_members(self):
+        """Names of the connected speakers in the active group"""
+        return self.group.resolve(name for name in self.devices.names() if name in self.connected)
+
+    def unreachable_members(self):
+        """Group members that are known but not connected"""
+        return self.group.resolve(name for name in self.devices.names() if name not in self.connected)
+
+    async def alist_devices(self):
+        return [{'name': record.name, 'ip': record.ip, 'port': record.port,
+                 'interface': record.interface or self.interface.lstrip('%'),
+                 'connected': record.name in self.connected,
+                 'state': self.supervisor.states.get(record.name),
+                 'level': self.level_cache.level(record.name),
+                 'queued': self.intents.level(record.name),
+                 'mode': self.monitor.modes.get(record.name)}
+                for record in self.devices]
+
+    async def aget_level(self, refresh=False):
+        """Level of the active group, read from its first member unless cached"""
+        members = self.group_members()
+        if not members:
+            raise SscError("No speakers connected")
+        name = members[0]
+        if refresh or not self.level_cache.is_valid(name):
+            level = extract_level(await self.transport.arequest(name, encode_get(LEVEL_PATH)))
+            self.level_cache.update_from_poll(name, level)
+        return self.group.group_level(name, self.level_cache.level(name))
+
+    async def aset_level(self, level):
+        """Set the group level and wait for every connected member to acknowledge it.
+
+        Returns {name: level reported by the device}, with None for members
+        that are offline: their level is queued and written when they
+        reconnect. Raises SscError if any connected member failed, had
+        the write dropped, or did not acknowledge within ACK_TIMEOUT.
+        """
+        queued = dict.fromkeys(self.unreachable_members())
+        if not self.group_members() and not queued:
+            raise SscError("No speakers connected")
+        targets = self._write_level(level)
+        if not targets:
+            return queued
+        # The scheduler acknowledges on a later loop iteration, after these are registered
+        loop = asyncio.get_running_loop()
+        waiters = []
+        for name, target in targets.items():
+            future = loop.create_future()
+            self.ack_waiters.setdefault(name, []).append((target, future))
+            waiters.append(future)
+        try:
+            results = await asyncio.wait_for(asyncio.gather(*waiters, return_exceptions=True),
+                                             ACK_TIMEOUT)
+        except asyncio.TimeoutError:
+            # Waiters still pending were cancelled with the gather
+            late = [name for name, future in zip(targets, waiters) if future.cancelled()]
+            raise SscError(f"No acknowledgement within {ACK_TIMEOUT:g} s from {', '.join(late)}")
+        finally:
+            for name, future in zip(targets, waiters):
+                remaining = [waiter for waiter in self.ack_waiters.get(name, []) if waiter[1] is not future]
+                if remaining:
+                    self.ack_waiters[name] = remaining
+                else:
+                    self.ack_waiters.pop(name, None)
+        errors = [f"{name}: {result}" for name, result in zip(targets, results)
+                  if isinstance(result, Exception)]
+        if errors:
+            raise SscError('; '.join(errors))
+        return dict(zip(targets, results), **queued)
+
+    def _write_level(self, level, clicked_at=None, source=API):
+        """Queue a group level for the connected members and keep it for offline ones.
+
+        Returns {name: target} of the members it is written to.
+        """
+        level = min(MAX_LEVEL, max(MIN_LEVEL, level))
+        self.intents.set_levels(self.group.targets(level, self.unreachable_members(),
+                                                   MIN_LEVEL, MAX_LEVEL))
+        members = self.group_members()
+        if not members:
+            return {}
+        targets = self.group.targets(level, members, MIN_LEVEL, MAX_LEVEL)
+        self.ramps.acancel(members)
+        self.intents.discard(members)  # Written now; a stale queued level must not follow
+        for name, target in targets.items():
+            self.level_cache.begin_write([name], target)
+            self.write_sources[name] = source
+        self.scheduler.set_levels(targets, clicked_at=clicked_at or time.monotonic())
+        return targets
+
+    def handle_control(self, change):
+        """Apply a coalesced control surface change (control_surface.ControlChange).
+
+        Called on the transport loop. Writes are not waited for; the
+        scheduler records their latency from change.received_at.
+        """
+        if change.level is not None:
+            self._write_level(change.level + change.delta, change.received_at, SURFACE)
+            return
+        members = self.group_members()
+        if members and self.level_cache.is_valid(members[0]):
+            level = self.group.group_level(members[0], self.level_cache.level(members[0]))
+            self._write_level(level + change.delta, change.received_at, SURFACE)
+        elif change.delta:
+            # The level has to be read first
+            self.transport.loop.create_task(self._astep_control(change))
+
+    async def _astep_control(self, change):
+        try:
+            level = await self.alevel()
+        except SscError as e:
+            logger.error(f"Cannot apply control change: {e}")
+            return
+        if level is not None:
+            self._write_level(level + change.delta, change.received_at, SURFACE)
+
+    async def alevel(self):
+        """Group level, or the level queued for the group while no member is connected"""
+        if self.group_members():
+            return await self.aget_level()
+        for name in self.unreachable_members():
+            if name in self.intents:
+                return self.group.group_level(name, self.intents.level(name))
+        return None
+
+    async def astep_level(self, delta):
+        """Change the group level by delta dB from the cached (or queued) level"""
+        level = await self.alevel()
+        if level is None:
+            raise SscError("No speakers connected")
+        return await self.aset_level(level + delta)
+
+    async def afade(self, level, duration, shape=LINEAR):
+        """Ramp the group level to level over duration seconds; returns the ramp report"""
+        current = await self.aget_level()
+        members = self.group_members()
+        level = min(MAX_LEVEL, max(MIN_LEVEL, level))
+        starts = self.group.targets(current, members, MIN_LEVEL, MAX_LEVEL)
+        ends = self.group.targets(level, members, MIN_LEVEL, MAX_LEVEL)
+        self._forget(members, "replaced by a fade")  # Drop queued steps the fade replaces
+        self.intents.discard(members)
+        # Offline members go straight to where the fade ends once they are back
+        self.intents.set_levels(self.group.targets(level, self.unreachable_members(),
+                                                   MIN_LEVEL, MAX_LEVEL))
+        return await self.ramps.aramp(starts, ends, duration, shape)
+
+    async def astatus(self):
+        """Level and mute of every group member, read in one parallel round trip.
+
+        Returns {'level': group level most members agree on, 'drifted':
+        members out of sync with it, 'devices': [per-device status]}.
+        """
+        members = self.group.resolve(self.devices.names())
+        if not members:
+            raise SscError("No speakers found")
+        statuses = await aread_status(self.transport, members)
+        for status in statuses.values():
+            if status.level is not None:
+                if self.level_cache.update_from_poll(status.name, status.level):
+                    self._record(status.name, status.level, REMOTE)
+        reference, drifted = find_drift(statuses, self.group)
+        return {'level': reference, 'drifted': drifted,
+                'devices': [dict(statuses[name]._asdict(), group_level=None if statuses[name].level is None
+                                 else self.group.group_level(name, statuses[name].level))
+                            for name in members]}
+
+    async def asave_snapshot(self, name):
+        """Capture the settings of every connected speaker under a name"""
+        names = [record.name for record in self.devices if record.name in self.connected]
+        devices = await acapture(self.transport, names)
+        if not devices:
+            raise SscError("No speakers connected")
+        self.snapshots.save(name, devices)
+        return devices
+
+    async def arecall_snapshot(self, name):
+        """Write a stored snapshot back; returns {device: 'ok' or the error}"""
+        devices = self.snapshots.get(name)
+        if devices is None:
+            raise ValueError(f"Unknown snapshot: {name}")
+        names = [device for device in devices if device in self.connected]
+        self.ramps.acancel(names)
+        self._forget(names, f"replaced by snapshot {name}")  # The snapshot replaces any queued change
+        self.intents.discard(names)  # ... and any level queued while it was offline
+        results = await arecall(self.transport, {device: devices[device] for device in names})
+        outcome = {}
+        for device, raw in results.items():
+            if isinstance(raw, Exception):
+                self.level_cache.invalidate(device)
+                outcome[device] = str(raw)
+                continue
+            if LEVEL_PATH in devices[device]:
+                try:
+                    reported = extract_level(raw)
+                except SscResponseError as e:
+                    self.level_cache.invalidate(device)
+                    outcome[device] = str(e)
+                    continue
+                level = float(devices[device][LEVEL_PATH])
+                self.level_cache.begin_write([device], level)
+                self.level_cache.end_write(device, level, reported)
+                self._record(device, reported, SNAPSHOT)
+            outcome[device] = 'ok'
+        for device in devices:
+            outcome.setdefault(device, 'not connected')
+        return outcome
+
+    # Callbacks from the scheduler and monitor, on the transport loop
+
+    def _on_ack(self, ack):
+        try:
+            if ack.error is not None:
+                raise ack.error
+            level = extract_level(ack.response)
+        except Exception as e:
+            logger.error(f"Error changing level on {ack.name}: {e}")
+            self.level_cache.end_write(ack.name, ack.value, None)
+            self.intents.failed(ack.name, ack.value)  # Tried again on the next reconnect
+            self._resolve_waiters(ack.name, ack.value, error=SscError(str(e)))
+            return
+        self.level_cache.end_write(ack.name, ack.value, level)
+        self._record(ack.name, level, self.write_sources.get(ack.name, API))
+        self._resolve_waiters(ack.name, ack.value, level=level)
+        elapsed = self.intents.acknowledged(ack.name, ack.value)
+        if elapsed is not None:
+            logger.info(f"{ack.name} reached its queued level {ack.value} "
+                        f"{elapsed * 1000:.1f} ms after reconnecting")
+
+    def _apply_intents(self, names):
+        """Write the levels queued for speakers that have just reconnected, in one batch"""
+        targets = self.intents.take(name for name in names if name in self.connected)
+        if not targets:
+            return
+        logger.info(f"Applying levels queued while offline: {targets}")
+        for name, target in targets.items():
+            self.level_cache.begin_write([name], target)
+            self.write_sources[name] = QUEUED
+        self.scheduler.set_levels(targets, clicked_at=time.monotonic())
+
+    def _forget(self, names, reason):
+        """Drop unsent writes to names and fail whoever waits for them"""
+        self.scheduler.forget(names)
+        for name in names:
+            for _, future in self.ack_waiters.pop(name, []):
+                if not future.done():
+                    future.set_exception(SscError(f"Level write dropped: {reason}"))
+
+    def _resolve_waiters(self, name, value, level=None, error=None):
+        """Resolve waiters for value and the older ones it superseded"""
+        waiters = self.ack_waiters.get(name, [])
+        last = max((i for i, (target, _) in enumerate(waiters) if target == value), default=-1)
+        done, rest = waiters[:last + 1], waiters[last + 1:]
+        if rest:
+            self.ack_waiters[name] = rest
+        else:
+            self.ack_waiters.pop(name, None)
+        for _, future in done:
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(level)
+
+    def _on_ramp_write(self, name, level, reported):
+        # The cache follows a fade step by step, so a step taken mid-fade
+        # starts from where the fade has got to
+        self.level_cache.begin_write([name], level)
+        self.level_cache.end_write(name, level, reported)
+        self._record(name, reported, FADE)
+
+    def _record(self, name, level, source):
+        if self.history is not None:
+            self.history.record(name, level, source)
+
+    def _on_state(self, name, state):
+        if name not in self.devices.devices:
+            return
+        if state == ONLINE:
+            self.connected.add(name)
+            self._apply_intents([name])
+        else:
+            self.connected.discard(name)
+            self.level_cache.invalidate(name)
+
+    def _on_level(self, name, level):
+        if name not in self.devices.devices:
+            return
+        # A speaker that failed to connect earlier has come back
+        if name not in self.connected:
+            self.connected.add(name)
+            # The push came over the subscription connection; queued levels
+            # wait until the supervisor has the write connection up
+            if self.supervisor.states.get(name) == ONLINE:
+                self._apply_intents([name])
+        if self.level_cache.update_from_poll(name, level) and name not in self.ramps.ramps:
+            self._record(name, level, REMOTE)
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Command line client for the speaker daemon.
+
+Talks to speaker_daemon.py over its Unix socket, so a level change only
+costs a socket round trip instead of a GUI startup and discovery:
+
+    python speakerctl.py list
+    python speakerctl.py get
+    python speakerctl.py status
+    python speakerctl.py set 72
+    python speakerctl.py step -- -2
+    python speakerctl.py fade 60 --duration 2 --shape s-curve
+    python speakerctl.py snapshot save Evening
+    python speakerctl.py snapshot recall Evening
+    python speakerctl.py history week --device "KH 150 L"
+    python speakerctl.py metrics --prometheus
+
+Only the standard library is imported, to keep startup fast. The
+protocol is one JSON object per line in each direction:
+{"cmd": "set", "level": 72} is answered with {"ok": true, ...} or
+{"ok": false, "error": "..."}.
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import time
+
+HISTORY_SPANS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+SPARK = '▁▂▃▄▅▆▇█'
+
+
+def default_socket_path():
+    runtime_dir = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime_dir:
+        return os.path.join(runtime_dir, 'speaker_control.sock')
+    return os.path.expanduser('~/.speaker_control.sock')
+
+
+def call(request, path=None, timeout=10.0):
+    """Send one request to the daemon and return its decoded response"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(path or default_socket_path())
+        sock.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        response = b''
+        while not response.endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            response += chunk
+    return json.loads(response)
+
+
+def sparkline(values):
+    """One block character per value, scaled between the lowest and highest"""
+    if not values:
+        return ''
+    low, high = min(values), max(values)
+    scale = (len(SPARK) - 1) / (high - low) if high > low else 0
+    return ''.join(SPARK[round((value - low) * scale)] for value in values)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Control speakers through the speaker daemon')
+    parser.add_argument('--socket', '-s', help=f'Daemon socket (default: {default_socket_path()})')
+    parser.add_argument('--json', action='store_true', help='Print the raw JSON response')
+    commands = parser.add_subparsers(dest='cmd', required=True)
+    commands.add_parser('list', help='List speakers and their state')
+    get = commands.add_parser('get', help='Print the group level')
+    get.add_argument('--refresh', action='store_true', help='Read the level from the speaker')
+    commands.add_parser('status', help='Read level and mute from every speaker and flag drift')
+    set_parser = commands.add_parser('set', help='Set the group level in dB')
+    set_parser.add_argument('level', type=float)
+    step = commands.add_parser('step', help='Change the group level by a number of dB')
+    step.add_argument('delta', type=float)
+    fade = commands.add_parser('fade', help='Ramp the group level to a level in dB')
+    fade.add_argument('level', type=float)
+    fade.add_argument('--duration', '-d', type=float, default=2.0,
+                      help='Fade time in seconds (default: 2)')
+    fade.add_argument('--shape', choices=['linear', 's-curve'], default='linear',
+                      help='Linear in dB, or an S-curve (default: linear)')
+    snapshot = commands.add_parser('snapshot', help='Save, recall, list or delete snapshots')
+    snapshot.add_argument('action', choices=['save', 'recall', 'list', 'delete'])
+    snapshot.add_argument('name', nargs='?')
+    history = commands.add_parser('history', help='Show how the level changed over the last hour, day or week')
+    history.add_argument('span', nargs='?', choices=list(HISTORY_SPANS), default='day')
+    history.add_argument('--device', help='One speaker instead of the whole room')
+    history.add_argument('--points', type=int, default=60, help='Width of the chart (default: 60)')
+    history.add_argument('--changes', type=int, default=20, help='Latest changes to list (default: 20)')
+    metrics = commands.add_parser('metrics', help='Print request metrics as JSON')
+    metrics.add_argument('--prometheus', action='store_true', help='Use the Prometheus text format')
+    args = parser.parse_args(argv)
+
+    request = {key: value for key, value in vars(args).items()
+               if key not in ('socket', 'json') and value is not None and value is not False}
+    if args.cmd == 'history':
+        request['span'] = HISTORY_SPANS[args.span]
+    try:
+        response = call(request, args.socket)
+    except (OSError, ValueError) as e:
+        print(f"Cannot reach speaker daemon: {e}", file=sys.stderr)
+        return 2
+    if args.json:
+        print(json.dumps(response))
+    elif not response.get('ok'):
+        print(f"Error: {response.get('error')}", file=sys.stderr)
+    elif args.cmd == 'metrics':
+        print(response['text'] if 'text' in response else json.dumps(response['metrics'], indent=2))
+    elif args.cmd == 'list':
+        for device in response['devices']:
+            level = '--' if device['level'] is None else f"{device['level']:.1f}dB"
+            state = 'connected' if device['connected'] else 'offline'
+            if device.get('queued') is not None:
+                state += f", {device['queued']:.1f}dB on reconnect"
+            print(f"{device['name']:<24} {device['ip']:<28} {level:>8}  {state}")
+    elif args.cmd == 'status':
+        for device in response['devices']:
+            level = '--' if device['level'] is None else f"{device['level']:.1f}dB"
+            if not device['online']:
+                state = 'offline'
+            else:
+                state = 'muted' if device['mute'] else 'on'
+                if device['name'] in response['drifted']:
+                    state += ', out of sync'
+            print(f"{device['name']:<24} {level:>8}  {state}")
+        level = '--' if response['level'] is None else f"{response['level']:.1f}dB"
+        print(f"Group {level}, {len(response['drifted'])} out of sync, "
+              f"read in {response['elapsed_ms']:.1f} ms")
+    elif args.cmd == 'snapshot':
+        if args.action == 'list':
+            print('\n'.join(response['snapshots']))
+        elif args.action == 'save':
+            print(f"Saved {args.name}: {', '.join(response['devices'])}")
+        elif args.action == 'recall':
+            for name, outcome in sorted(response['devices'].items()):
+                print(f"{name:<24} {outcome}")
+            print(f"Recalled {args.name} in {response['elapsed_ms']:.1f} ms")
+    elif args.cmd == 'history':
+        for change in response['changes']:
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(change['time']))}  "
+                  f"{change['device']:<24} {change['level']:6.1f}dB  {change['source']}")
+        if response['maxs']:
+            print(f"{sparkline(response['maxs'])}  {min(response['mins']):.1f}"
+                  f"..{max(response['maxs']):.1f}dB over the last {args.span}")
+        else:
+            print(f"No level changes in the last {args.span}")
+        print(f"{response['records']} changes recorded, queried in {response['elapsed_ms']:.1f} ms")
+    elif args.cmd == 'fade':
+        ramp = response['ramp']
+        print(f"{response['level']:.1f}dB after {ramp['duration_ms']:.0f} ms "
+              f"(planned {ramp['planned_ms']:.0f} ms, {ramp['writes']} writes, "
+              f"late p95 {ramp['late_p95_ms']} ms, ack spread p95 {ramp['spread_p95_ms']} ms)")
+    else:
+        queued = sum(1 for level in response.get('devices', {}).values() if level is None)
+        note = f" ({queued} offline, applied on reconnect)" if queued else ""
+        print(f"{response['level']:.1f}dB{note}")
+    return 0 if response.get('ok') else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
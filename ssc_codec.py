@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SSC message codec.
+
+SSC messages are JSON objects whose nesting mirrors an address such as
+/audio/out/level. Requests are built from templates serialised once per
+address, responses are parsed with a real JSON parser (orjson when it is
+installed) and single values can be pulled out of a response by address
+without decoding the whole message.
+"""
+
+import functools
+import json
+import re
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+LEVEL_PATH = '/audio/out/level'
+
+
+class SscResponseError(ValueError):
+    """Raised when a response is malformed or reports an SSC error"""
+
+
+def split_path(path):
+    """'/audio/out/level' -> ('audio', 'out', 'level')"""
+    return tuple(part for part in path.split('/') if part)
+
+
+def encode_value(value):
+    """Serialise a single leaf value"""
+    if value is None:
+        return 'null'
+    if value is True:
+        return 'true'
+    if value is False:
+        return 'false'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    return json.dumps(value)
+
+
+@functools.lru_cache(maxsize=None)
+def _template(path):
+    """Return the text before and after the leaf value for an address"""
+    keys = split_path(path)
+    prefix = ''.join('{' + json.dumps(key) + ':' for key in keys)
+    return prefix, '}' * len(keys)
+
+
+@functools.lru_cache(maxsize=None)
+def encode_get(path):
+    """Request that reads a single address"""
+    prefix, suffix = _template(path)
+    return prefix + 'null' + suffix
+
+
+def encode_set(path, value):
+    """Request that writes value to a single address"""
+    prefix, suffix = _template(path)
+    return prefix + encode_value(value) + suffix
+
+
+def build_tree(values):
+    """Merge {address: value} into one nested message tree"""
+    tree = {}
+    for path, value in values.items():
+        keys = split_path(path)
+        node = tree
+        for key in keys[:-1]:
+            node = node.setdefault(key, {})
+        node[keys[-1]] = value
+    return tree
+
+
+def encode_many(values):
+    """One request touching several addresses; None values are reads"""
+    return json.dumps(build_tree(values), separators=(',', ':'))
+
+
+def encode_subscribe(path):
+    """Request subscribing the connection to changes of an address"""
+    return '{"osc":{"state":{"subscribe":[' + encode_get(path) + ']}}}'
+
+
+def response_error(raw):
+    """The SSC error carried by a response, or None if it succeeded"""
+    message = decode(raw)
+    osc = message.get('osc')
+    if isinstance(osc, dict):
+        return osc.get('error')
+    return None
+
+
+def decode(raw):
+    """Parse a complete SSC message"""
+    try:
+        if orjson is not None:
+            message = orjson.loads(raw)
+        else:
+            message = json.loads(raw)
+    except ValueError as e:
+        raise SscResponseError(f"Malformed SSC message: {raw!r}") from e
+    if not isinstance(message, dict):
+        raise SscResponseError(f"SSC message is not an object: {raw!r}")
+    return message
+
+
+def lookup(message, path):
+    """Value at an address in a decoded message"""
+    node = message
+    for key in split_path(path):
+        if not isinstance(node, dict) or key not in node:
+            osc = message.get('osc') if isinstance(message, dict) else None
+            error = osc.get('error') if isinstance(osc, dict) else None
+            if error is not None:
+                raise SscResponseError(f"SSC error for {path}: {error}")
+            raise SscResponseError(f"{path} not in SSC message")
+        node = node[key]
+    return node
+
+
+_SCALAR = r'(-?\d+(?:\.\d+)?(?:[eE][+-]?\d+)?|true|false|null|"(?:[^"\\]|\\.)*")'
+
+
+@functools.lru_cache(maxsize=None)
+def _extractor(path):
+    # Matches the address when each key is the first member of its object,
+    # which is how devices answer a single-address request
+    keys = split_path(path)
+    pattern = r'\s*' + r'\s*'.join(r'\{\s*' + re.escape(json.dumps(key)) + r'\s*:' for key in keys)
+    return re.compile(pattern + r'\s*' + _SCALAR + r'\s*[,}]')
+
+
+_LITERALS = {'true': True, 'false': False, 'null': None}
+
+
+def extract(raw, path):
+    """Value at an address in a raw response, decoding only what is needed"""
+    match = _extractor(path).match(raw)
+    if match is None:
+        return lookup(decode(raw), path)
+    text = match.group(1)
+    if text in _LITERALS:
+        return _LITERALS[text]
+    if text[0] == '"':
+        return json.loads(text)
+    return float(text) if ('.' in text or 'e' in text or 'E' in text) else int(text)
+
+
+def extract_level(raw):
+    """The /audio/out/level value of a response, as a float"""
+    value = extract(raw, LEVEL_PATH)
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise SscResponseError(f"Level is not a number: {value!r}")
+    return float(value)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Fake SSC device for development without speakers.
+
+Speaks the SSC JSON-over-TCP protocol on loopback: every request is a JSON
+object terminated by CRLF, null leaves are read back and other leaves are
+written. Only the addresses in the device state are known; anything else
+is answered with an SSC 404 error. Clients can subscribe to addresses with
+/osc/state/subscribe and are sent the new value whenever it changes.
+
+For load and latency testing a device can add a fixed latency plus random
+jitter to every reply, lose packets and drop connections. SSC runs over
+TCP, so a lost packet does not lose the reply; it arrives after a
+retransmission timeout instead, and later replies on the connection wait
+behind it. With a meter rate, the output meter (/m/audio/out/level)
+follows a synthetic programme level and is pushed to subscribers that
+many times per second. A fleet of hundreds of devices runs on one event
+loop, and FleetAdvertiser announces it over mDNS on loopback so the real
+discovery path can find it.
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import math
+import random
+import socket
+
+logger = logging.getLogger(__name__)
+
+SERVICE_TYPE = '_ssc._tcp.local.'
+RETRANSMIT_DELAY = 0.2  # Linux minimum TCP retransmission timeout
+METER_KEYS = ('m', 'audio', 'out', 'level')
+
+DEFAULT_STATE = {
+    'device': {
+        'identity': {
+            'product': 'KH 150',
+            'version': '1.0.0',
+        },
+    },
+    'audio': {
+        'out': {
+            'level': 80.0,
+            'mute': False,
+            'delay': 0.0,
+            'eq2': {
+                'bypass': False,
+            },
+        }
+    },
+    'm': {
+        'audio': {
+            'out': {
+                'level': -90.0,  # Output meter, dBFS
+            },
+        },
+    },
+}
+
+
+def _resolve(query, state, errors, changed, path):
+    """Fill in a query tree from the state, applying writes as we go"""
+    result = {}
+    for key, value in query.items():
+        here = path + [key]
+        if not isinstance(state, dict) or key not in state:
+            errors.append(here)
+            continue
+        if isinstance(value, dict):
+            result[key] = _resolve(value, state[key], errors, changed, here)
+        else:
+            if value is not None and value != state[key]:
+                state[key] = value
+                changed.append(here)
+            result[key] = state[key]
+    return result
+
+
+def _leaf_paths(tree, path=()):
+    for key, value in tree.items():
+        if isinstance(value, dict):
+            yield from _leaf_paths(value, path + (key,))
+        else:
+            yield path + (key,)
+
+
+def _value_tree(path, value):
+    tree = value
+    for key in reversed(path):
+        tree = {key: tree}
+    return tree
+
+
+def _error_tree(path, code, description):
+    tree = [code, {'desc': description}]
+    for key in reversed(path):
+        tree = {key: tree}
+    return tree
+
+
+class SimulatedSscDevice:
+    """One fake SSC device listening on its own TCP port"""
+
+    def __init__(self, name, state=None, host='127.0.0.1', port=0, subscriptions=True,
+                 latency=0.0, jitter=0.0, loss=0.0, disconnect_rate=0.0, meter_rate=0.0, seed=None):
+        self.name = name
+        self.state = copy.deepcopy(state if state is not None else DEFAULT_STATE)
+        self.host = host
+        self.port = port
+        self.subscriptions = subscriptions
+        self.latency = latency  # Seconds each request takes to answer
+        self.jitter = jitter    # Up to this many seconds are added at random
+        self.loss = loss        # Fraction of replies delayed by a retransmission
+        self.disconnect_rate = disconnect_rate  # Fraction of requests that drop the connection
+        self.meter_rate = meter_rate  # Meter samples pushed per second
+        self.random = random.Random(seed)
+        self.server = None
+        self.meter_task = None
+        self.clients = set()
+        self.request_count = 0
+        self.lost_count = 0
+        self.disconnect_count = 0
+        self.subscribers = {}  # writer -> set of subscribed address tuples
+        self.changed = []      # Addresses written by the request being handled
+
+    @property
+    def ip(self):
+        return self.host
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle_client, self.host, self.port)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f"Simulated device {self.name} listening on {self.host}:{self.port}")
+        if self.meter_rate:
+            self.meter_task = asyncio.get_running_loop().create_task(self._run_meter())
+        return self
+
+    async def stop(self):
+        """Stop listening and drop every client, like a speaker losing power"""
+        if self.meter_task is not None:
+            self.meter_task.cancel()
+            self.meter_task = None
+        if self.server is not None:
+            self.server.close()
+            self.disconnect_clients()
+            await self.server.wait_closed()
+            self.server = None
+
+    def disconnect_clients(self):
+        """Close every client connection; the device keeps listening"""
+        for writer in list(self.clients):
+            writer.close()
+
+    def handle_message(self, line, client=None):
+        """Return the SSC response to a single request line"""
+        self.request_count += 1
+        try:
+            query = json.loads(line)
+            if not isinstance(query, dict):
+                raise ValueError('request is not an object')
+        except ValueError:
+            return json.dumps({'osc': {'error': [400, {'desc': 'bad request'}]}})
+        subscribe = query.get('osc', {}).get('state', {}).get('subscribe') \
+            if isinstance(query.get('osc'), dict) else None
+        if subscribe is not None:
+            return self._subscribe(query, subscribe, client)
+        errors = []
+        changed = []
+        result = _resolve(query, self.state, errors, changed, [])
+        # Subscribers are told after the response has been written
+        self.changed.extend(tuple(path) for path in changed)
+        if errors:
+            return json.dumps({'osc': {'error': [_error_tree(p, 404, 'address not found') for p in errors]}})
+        return json.dumps(result)
+
+    def set_value(self, path, value):
+        """Change a value locally, as the front panel would"""
+        keys = [key for key in path.split('/') if key]
+        node = self.state
+        for key in keys[:-1]:
+            node = node[key]
+        if node[keys[-1]] != value:
+            node[keys[-1]] = value
+            self._notify(tuple(keys))
+
+    def _subscribe(self, query, subscribe, client):
+        if not self.subscriptions or not isinstance(subscribe, list):
+            return json.dumps({'osc': {'error': [_error_tree(['osc', 'state', 'subscribe'], 404,
+                                                             'address not found')]}})
+        paths = self.subscribers.setdefault(client, set())
+        for tree in subscribe:
+            if isinstance(tree, dict):
+                paths.update(_leaf_paths(tree))
+        return json.dumps(query)
+
+    def _notify(self, path):
+        node = self.state
+        for key in path:
+            node = node[key]
+        message = f'{json.dumps(_value_tree(path, node))}\r\n'.encode('utf-8')
+        for writer, paths in list(self.subscribers.items()):
+            if writer is not None and path in paths and not writer.is_closing():
+                writer.write(message)
+
+    async def _run_meter(self):
+        """Move the output meter like programme material, on a fixed schedule"""
+        loop = asyncio.get_running_loop()
+        meter = self.state['m']['audio']['out']
+        interval = 1.0 / self.meter_rate
+        start = loop.time()
+        tick = 0
+        while True:
+            tick += 1
+            await asyncio.sleep(max(0.0, start + tick * interval - loop.time()))
+            elapsed = tick * interval
+            meter['level'] = round(min(0.0, -18.0 + 6.0 * math.sin(elapsed * math.pi / 2.0)
+                                       + self.random.gauss(0.0, 3.0)), 1)
+            if self.subscribers:
+                self._notify(METER_KEYS)
+
+    def _delay(self):
+        if self.jitter:
+            return self.latency + self.random.uniform(0.0, self.jitter)
+        return self.latency
+
+    async def _handle_client(self, reader, writer):
+        self.clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                line = line.decode('utf-8').strip()
+                if not line:
+                    continue
+                if self.disconnect_rate and self.random.random() < self.disconnect_rate:
+                    self.disconnect_count += 1
+                    break
+                delay = self._delay()
+                if self.loss and self.random.random() < self.loss:
+                    self.lost_count += 1
+                    delay += RETRANSMIT_DELAY
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(f'{self.handle_message(line, writer)}\r\n'.encode('utf-8'))
+                changed, self.changed = self.changed, []
+                for path in changed:
+                    self._notify(path)
+                await writer.drain()
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            self.clients.discard(writer)
+            self.subscribers.pop(writer, None)
+            writer.close()
+
+
+async def start_fleet(count, prefix='sim', base_port=0, seed=None, **kwargs):
+    """Start count simulated devices and return them once all are listening"""
+    return await asyncio.gather(*(
+        SimulatedSscDevice(f"{prefix}-{i}", port=base_port + i if base_port else 0,
+                           seed=None if seed is None else seed + i, **kwargs).start()
+        for i in range(count)))
+
+
+class FleetAdvertiser:
+    """Announces simulated devices as _ssc._tcp services over mDNS on loopback"""
+
+    def __init__(self, interface='127.0.0.1'):
+        self.interface = interface
+        self.zeroconf = None
+        self.infos = []
+
+    async def start(self, devices):
+        from zeroconf import IPVersion, ServiceInfo
+        from zeroconf.asyncio import AsyncZeroconf
+        self.zeroconf = AsyncZeroconf(interfaces=[self.interface], ip_version=IPVersion.V4Only)
+        self.infos = [ServiceInfo(SERVICE_TYPE, f'{device.name}.{SERVICE_TYPE}',
+                                  addresses=[socket.inet_aton(device.ip)], port=device.port,
+                                  server=f'{device.name}.local.')
+                      for device in devices]
+        # Every name is unique on loopback, so the probing step can be skipped
+        registrations = await asyncio.gather(*(
+            self.zeroconf.async_register_service(info, cooperating_responders=True)
+            for info in self.infos))
+        await asyncio.gather(*registrations)
+        logger.info(f"Advertising {len(self.infos)} simulated devices on {self.interface}")
+        return self
+
+    async def stop(self):
+        if self.zeroconf is not None:
+            await self.zeroconf.async_close()
+            self.zeroconf = None
+
+
+async def _serve(args):
+    fleet = await start_fleet(args.devices, base_port=args.port, seed=args.seed,
+                              latency=args.latency / 1000.0, jitter=args.jitter / 1000.0,
+                              loss=args.loss, disconnect_rate=args.disconnect_rate,
+                              meter_rate=args.meter_rate)
+    for device in fleet:
+        print(f"{device.name} {device.host} {device.port}")
+    advertiser = await FleetAdvertiser().start(fleet) if args.advertise else None
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if advertiser is not None:
+            await advertiser.stop()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description='Simulated SSC devices on loopback')
+    parser.add_argument('--devices', '-n', type=int, default=2,
+                        help='Number of devices to simulate (default: 2)')
+    parser.add_argument('--port', '-p', type=int, default=0,
+                        help='First TCP port to use (default: any free port)')
+    parser.add_argument('--latency', '-l', type=float, default=0.0,
+                        help='Response time of every request in ms (default: 0)')
+    parser.add_argument('--jitter', '-j', type=float, default=0.0,
+                        help='Random extra response time of up to this many ms (default: 0)')
+    parser.add_argument('--loss', type=float, default=0.0,
+                        help='Fraction of replies delayed by a TCP retransmission (default: 0)')
+    parser.add_argument('--disconnect-rate', type=float, default=0.0,
+                        help='Fraction of requests that close the connection (default: 0)')
+    parser.add_argument('--meter-rate', type=float, default=0.0,
+                        help='Output meter samples pushed to subscribers per second (default: 0)')
+    parser.add_argument('--seed', type=int, help='Random seed for jitter, loss and disconnects')
+    parser.add_argument('--advertise', '-a', action='store_true',
+                        help='Announce the devices over mDNS on loopback')
+    args = parser.parse_args()
+    try:
+        asyncio.run(_serve(args))
+    except KeyboardInterrupt:
+        pass
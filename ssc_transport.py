@@ -0,0 +1,353 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Asynchronous SSC transport.
+
+All speaker I/O runs on a dedicated asyncio event loop in a background
+thread. Each device gets one long-lived TCP connection; requests on that
+connection are pipelined and requests to several devices are fanned out
+concurrently. Callers on the Qt thread get concurrent.futures.Future
+objects back and never block on the network.
+"""
+
+import asyncio
+import collections
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+SSC_PORT = 45
+DEFAULT_TIMEOUT = 2.0
+
+
+class SscError(Exception):
+    """Raised when an SSC request cannot be completed"""
+
+
+def device_address(host, interface=''):
+    """Return the host to connect to, adding the scope for link-local IPv6"""
+    if interface and ':' in host and '%' not in host:
+        return f"{host}%{interface.lstrip('%')}"
+    return host
+
+
+class SscConnection:
+    """Persistent, pipelined connection to a single SSC device.
+
+    SSC answers requests on a connection in the order they were sent, so
+    every request is written immediately and its future queued; each line
+    read from the device resolves the oldest outstanding future. Lines that
+    arrive with nothing outstanding (subscription updates) are passed to
+    on_message.
+
+    down is set by connection_supervisor while the device is unreachable;
+    requests then fail at once instead of waiting for a connect timeout.
+    """
+
+    def __init__(self, name, host, port=SSC_PORT, interface='', timeout=DEFAULT_TIMEOUT,
+                 on_message=None, metrics=None):
+        self.name = name
+        self.host = host
+        self.port = port
+        self.interface = interface
+        self.timeout = timeout
+        self.on_message = on_message
+        self.metrics = metrics  # instrumentation.Metrics, or None when disabled
+        self.connects = 0
+        self.down = False
+        self.last_activity = 0.0  # time.monotonic() of the last connect or received line
+        self.reader = None
+        self.writer = None
+        self.read_task = None
+        self.pending = collections.deque()
+        self.connect_lock = asyncio.Lock()
+        self.closed = asyncio.Event()
+
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self):
+        """Open the connection if it is not already open"""
+        async with self.connect_lock:
+            if self.connected:
+                return
+            address = device_address(self.host, self.interface)
+            start = time.perf_counter()
+            try:
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(address, self.port), self.timeout)
+            except (OSError, asyncio.TimeoutError) as e:
+                if self.metrics is not None:
+                    self.metrics.record_error(self.name, 'connect')
+                raise SscError(f"{self.name}: connect to {address}:{self.port} failed: {e!r}") from e
+            if self.metrics is not None:
+                self.metrics.record_connect(self.name, time.perf_counter() - start, self.connects > 0)
+            self.connects += 1
+            self.last_activity = time.monotonic()
+            self.closed.clear()
+            self.read_task = asyncio.get_running_loop().create_task(self._read_loop())
+            logger.info(f"Connected to {self.name} at {address}:{self.port}")
+
+    async def close(self):
+        """Close the connection and fail any outstanding requests"""
+        if self.read_task is not None:
+            self.read_task.cancel()
+            self.read_task = None
+        writer, self.writer, self.reader = self.writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except OSError:
+                pass
+        self._fail_pending(SscError(f"{self.name}: connection closed"))
+        self.closed.set()
+
+    async def wait_closed(self):
+        """Wait until the connection is closed or lost"""
+        await self.closed.wait()
+
+    async def request(self, command):
+        """Send one SSC command and return the raw response line"""
+        metrics = self.metrics
+        if metrics is not None:
+            start = time.perf_counter()
+        if not self.connected:
+            if self.down:
+                if metrics is not None:
+                    metrics.record_error(self.name, 'offline')
+                raise SscError(f"{self.name}: offline, reconnecting")
+            await self.connect()
+        future = asyncio.get_running_loop().create_future()
+        self.pending.append(future)
+        try:
+            self.writer.write(f'{command}\r\n'.encode('utf-8'))
+            await self.writer.drain()
+            response = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # The response stream is no longer in step with the queue, so
+            # the connection has to be dropped
+            await self.close()
+            if metrics is not None:
+                metrics.record_error(self.name, 'timeout')
+            raise SscError(f"{self.name}: request timed out")
+        except OSError as e:
+            future.cancel()
+            await self.close()
+            if metrics is not None:
+                metrics.record_error(self.name, 'send')
+            raise SscError(f"{self.name}: send failed: {e!r}") from e
+        except SscError:
+            if metrics is not None:
+                metrics.record_error(self.name, 'closed')
+            raise
+        if metrics is not None:
+            metrics.observe_request(self.name, time.perf_counter() - start)
+        return response
+
+    async def _read_loop(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    break
+                self.last_activity = time.monotonic()
+                line = line.decode('utf-8').strip()
+                if not line:
+                    continue
+                if self.pending:
+                    future = self.pending.popleft()
+                    if not future.done():
+                        future.set_result(line)
+                elif self.on_message is not None:
+                    try:
+                        self.on_message(line)
+                    except Exception as e:
+                        logger.error(f"{self.name}: message handler failed: {e}")
+                else:
+                    logger.debug(f"{self.name}: unsolicited message {line}")
+        except asyncio.CancelledError:
+            return
+        except OSError as e:
+            logger.error(f"{self.name}: read failed: {e!r}")
+        if self.writer is not None:
+            self.writer.close()
+        self.writer = None
+        self.reader = None
+        self._fail_pending(SscError(f"{self.name}: connection lost"))
+        self.closed.set()
+
+    def _fail_pending(self, error):
+        while self.pending:
+            future = self.pending.popleft()
+            if not future.done():
+                future.set_exception(error)
+
+
+class SscTransport:
+    """Owns the I/O event loop and one SscConnection per device.
+
+    The public methods are safe to call from any thread and return
+    concurrent.futures.Future objects. Coroutine methods (prefixed with
+    ``a``) must only be awaited on the transport loop itself.
+    """
+
+    def __init__(self, timeout=DEFAULT_TIMEOUT, metrics=None):
+        self.timeout = timeout
+        self.metrics = metrics  # instrumentation.Metrics, or None when disabled
+        self.loop = asyncio.new_event_loop()
+        self.connections = {}
+        self.thread = threading.Thread(target=self._run_loop, name='ssc-transport', daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=2.0):
+        """Close every connection, cancel remaining tasks and stop the loop"""
+        if not self.thread.is_alive():
+            return
+        try:
+            self.submit(self._shutdown()).result(timeout)
+        except Exception as e:
+            logger.error(f"Error closing connections: {e}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout)
+
+    async def _shutdown(self):
+        # Stop the tasks using the connections first, so none reopens one
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.aclose_all()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_forever()
+        self.loop.close()
+
+    def submit(self, coro):
+        """Schedule a coroutine on the transport loop from any thread"""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    # Thread-safe API
+
+    def set_devices(self, devices, interface='', connect=True):
+        """Replace the device set with the given pyssc-style devices"""
+        return self.submit(self.aset_devices(
+            [(d.name, d.ip, getattr(d, 'port', SSC_PORT)) for d in devices], interface, connect))
+
+    def apply_diff(self, diff, interface=''):
+        """Apply a device_tracking.DeviceDiff, leaving unchanged devices connected"""
+        return self.submit(self.aapply_diff(diff, interface))
+
+    def connect_all(self):
+        return self.submit(self.aconnect_all())
+
+    def reconnect_all(self):
+        return self.submit(self.areconnect_all())
+
+    def send(self, name, command):
+        return self.submit(self.arequest(name, command))
+
+    def send_all(self, command, names=None):
+        return self.submit(self.arequest_all(command, names))
+
+    def device_names(self):
+        return list(self.connections)
+
+    def set_metrics(self, metrics):
+        """Start (or with None, stop) recording metrics on every connection"""
+        def apply():
+            self.metrics = metrics
+            for conn in self.connections.values():
+                conn.metrics = metrics
+        self.loop.call_soon_threadsafe(apply)
+
+    # Coroutine API, for code already running on the transport loop
+
+    async def aset_devices(self, devices, interface='', connect=True):
+        wanted = {name: (host, port) for name, host, port in devices}
+        for name in list(self.connections):
+            conn = self.connections[name]
+            if wanted.get(name) != (conn.host, conn.port) or conn.interface != interface:
+                await self.connections.pop(name).close()
+        for name, (host, port) in wanted.items():
+            if name not in self.connections:
+                self.connections[name] = SscConnection(name, host, port, interface, self.timeout,
+                                                       metrics=self.metrics)
+        if connect:
+            await self.aconnect_all()
+
+    async def aapply_diff(self, diff, interface=''):
+        """Close removed devices and connect new or moved ones.
+
+        A record tagged with the interface it was discovered on is scoped to
+        that interface instead of the given one.
+
+        Returns a dict of each added or updated device name to None, or to
+        the error raised while connecting it.
+        """
+        stale = [self.connections.pop(record.name) for record in diff.removed + diff.updated
+                 if record.name in self.connections]
+        await asyncio.gather(*(conn.close() for conn in stale))
+        for record in diff.changed:
+            self.connections[record.name] = SscConnection(
+                record.name, record.ip, record.port, record.interface or interface, self.timeout,
+                metrics=self.metrics)
+        names = [record.name for record in diff.changed]
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(self.connections[name].connect() for name in names), return_exceptions=True)
+        if self.metrics is not None and names:
+            self.metrics.observe_connect_all(time.perf_counter() - start)
+        return {name: result if isinstance(result, Exception) else None
+                for name, result in zip(names, results)}
+
+    async def aconnect_all(self):
+        """Connect every device concurrently, raising if any fail"""
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(conn.connect() for conn in self.connections.values()), return_exceptions=True)
+        if self.metrics is not None:
+            self.metrics.observe_connect_all(time.perf_counter() - start)
+        errors = [r for r in results if isinstance(r, Exception)]
+        if errors:
+            raise SscError('; '.join(str(e) for e in errors))
+
+    async def areconnect_all(self):
+        await asyncio.gather(*(conn.close() for conn in self.connections.values()))
+        await self.aconnect_all()
+
+    async def aclose_all(self):
+        await asyncio.gather(*(conn.close() for conn in self.connections.values()))
+
+    async def arequest(self, name, command):
+        try:
+            conn = self.connections[name]
+        except KeyError:
+            raise SscError(f"Unknown device: {name}") from None
+        return await conn.request(command)
+
+    async def arequest_all(self, command, names=None):
+        """Send a command to several devices at once.
+
+        Returns a dict of device name to response line, or to the exception
+        raised for that device.
+        """
+        names = list(self.connections) if names is None else list(names)
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(self.arequest(name, command) for name in names), return_exceptions=True)
+        if self.metrics is not None:
+            self.metrics.observe_fanout(time.perf_counter() - start)
+        return dict(zip(names, results))
+
+
+def failed_devices(results):
+    """Names of devices whose entry in an arequest_all result is an error"""
+    return [name for name, result in results.items() if isinstance(result, Exception)]
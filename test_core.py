@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+Behaviour checks for the pure logic: the SSC codec, the command
+scheduler, the offline intent queue, speakerctl's argument handling,
+device diffs, discovery, reconnect backoff, groups and drift, OSC
+parsing, metering and the level history. Nothing here needs pyssc, Qt
+or a network; run with
+
+    python -m pytest -q test_core.py
+
+test_engine.py drives the engine against simulated speakers. The
+benchmarks in benchmarks/ measure speed; these check correctness.
+"""
+import asyncio
+import collections
+import json
+import random
+
+import numpy as np
+import pytest
+
+import speakerctl
+from command_scheduler import CommandScheduler
+from connection_supervisor import backoff_delay
+from control_surface import LEVEL, STEP, OscError, encode_osc, osc_event, parse_osc
+from device_groups import ALL_GROUP, DeviceGroup, GroupManager
+from device_tracking import DeviceRecord, DeviceTable
+from discovery_cache import DiscoveryCache
+from intent_queue import IntentQueue
+from level_history import CLICK, REMOTE, LevelHistory
+from metering import FLOOR_DB, MeterBank
+from multi_discovery import pick_interface
+from room_status import DeviceStatus, find_drift
+from ssc_codec import (LEVEL_PATH, SscResponseError, encode_get, encode_many, encode_set,
+                       extract, extract_level, response_error)
+
+
+# SSC codec
+
+def test_encode_get_and_set_are_nested_json():
+    assert json.loads(encode_get(LEVEL_PATH)) == {'audio': {'out': {'level': None}}}
+    assert json.loads(encode_set(LEVEL_PATH, 72.5)) == {'audio': {'out': {'level': 72.5}}}
+    assert json.loads(encode_set('/device/name', 'KH "150"')) == {'device': {'name': 'KH "150"'}}
+    assert json.loads(encode_set('/audio/out/mute', False)) == {'audio': {'out': {'mute': False}}}
+
+
+def test_encode_many_merges_addresses():
+    assert json.loads(encode_many({LEVEL_PATH: None, '/audio/out/mute': None})) == \
+        {'audio': {'out': {'level': None, 'mute': None}}}
+
+
+def test_extract_level_from_responses():
+    assert extract_level('{"audio":{"out":{"level":72}}}') == 72.0
+    assert extract_level('{ "audio" : { "out" : { "level" : -1.5e1 } } }') == -15.0
+    # Not the first member: falls back to a full decode
+    assert extract_level('{"audio":{"out":{"mute":false,"level":60.5}}}') == 60.5
+    assert extract('{"device":{"name":"KH 150"}}', '/device/name') == 'KH 150'
+
+
+@pytest.mark.parametrize('raw', [
+    'not json',
+    '[1, 2]',
+    '{"audio":{"out":{"level":true}}}',
+    '{"audio":{"out":{"level":"loud"}}}',
+    '{"osc":{"error":[{"audio":[404]}]}}',
+    '{"osc":[1]}',
+    '{"osc":"x"}',
+])
+def test_extract_level_rejects_bad_responses(raw):
+    with pytest.raises(SscResponseError):
+        extract_level(raw)
+
+
+def test_response_error():
+    assert response_error('{"audio":{"out":{"level":70}}}') is None
+    assert response_error('{"osc":{"error":[{"audio":[404]}]}}') == [{'audio': [404]}]
+
+
+# Command scheduler
+
+class FakeTransport:
+    """Records writes and answers each after a delay"""
+
+    def __init__(self, loop, delay=0.0):
+        self.loop = loop
+        self.delay = delay
+        self.writes = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def arequest(self, name, message):
+        self.writes.append((name, self.loop.time(), json.loads(message)['audio']['out']['level']))
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.in_flight -= 1
+        return message
+
+
+def run_scheduler(scenario, max_rate=20, delay=0.0):
+    async def main():
+        transport = FakeTransport(asyncio.get_running_loop(), delay)
+        acks = []
+        scheduler = CommandScheduler(transport, on_ack=acks.append, max_rate=max_rate)
+        await scenario(scheduler)
+        await asyncio.sleep(0.2)
+        scheduler.max_in_flight = transport.max_in_flight
+        return transport.writes, acks, scheduler
+    return asyncio.run(main())
+
+
+def test_scheduler_coalesces_to_the_newest_level():
+    async def scenario(scheduler):
+        for level in (70, 71, 72, 73, 74):
+            scheduler.set_level(['a', 'b'], level)
+    writes, acks, scheduler = run_scheduler(scenario)
+    assert sorted((name, level) for name, _, level in writes) == [('a', 74), ('b', 74)]
+    assert scheduler.dropped == 8
+    assert sorted((ack.name, ack.value, ack.error) for ack in acks) == [('a', 74, None), ('b', 74, None)]
+
+
+def test_scheduler_spaces_writes_to_a_device():
+    async def scenario(scheduler):
+        scheduler.set_level(['a'], 70)
+        await asyncio.sleep(0.01)
+        scheduler.set_level(['a'], 71)
+    writes, _, _ = run_scheduler(scenario, max_rate=10)
+    assert [level for _, _, level in writes] == [70, 71]
+    assert writes[1][1] - writes[0][1] >= 0.1 - 1e-3
+
+
+def test_scheduler_forget_drops_unsent_levels():
+    async def scenario(scheduler):
+        scheduler.set_level(['a'], 70)
+        await asyncio.sleep(0.01)
+        scheduler.set_level(['a'], 71)  # Waits for the rate limit
+        scheduler.forget(['a'])
+    writes, acks, _ = run_scheduler(scenario, max_rate=10)
+    assert [level for _, _, level in writes] == [70]
+    assert [ack.value for ack in acks] == [70]
+
+
+def test_scheduler_forget_keeps_an_in_flight_write_exclusive():
+    async def scenario(scheduler):
+        scheduler.set_level(['a'], 70)
+        await asyncio.sleep(0.01)  # 70 is in flight
+        scheduler.forget(['a'])
+        scheduler.set_level(['a'], 71)
+    writes, acks, scheduler = run_scheduler(scenario, max_rate=10, delay=0.03)
+    assert [level for _, _, level in writes] == [70, 71]
+    assert scheduler.max_in_flight == 1
+    assert writes[1][1] - writes[0][1] >= 0.1 - 1e-3
+    assert [ack.value for ack in acks] == [70, 71]
+
+
+def test_scheduler_set_levels_per_device():
+    async def scenario(scheduler):
+        scheduler.set_levels({'a': 70, 'b': 67})
+    writes, _, _ = run_scheduler(scenario)
+    assert sorted((name, level) for name, _, level in writes) == [('a', 70), ('b', 67)]
+
+
+# Offline intents
+
+def test_intents_keep_the_newest_level_per_device():
+    intents = IntentQueue()
+    intents.set_levels({'L': 60.0, 'R': 60.0}, now=0.0)
+    intents.set_levels({'L': 65.0}, now=1.0)
+    assert len(intents) == 2 and intents.level('L') == 65.0
+    intents.discard(['R'])
+    assert 'R' not in intents
+    assert intents.stats()['collapsed'] == 1
+
+
+def test_intents_take_skips_expired_levels():
+    intents = IntentQueue(max_age=10.0)
+    intents.set_levels({'L': 60.0}, now=0.0)
+    intents.set_levels({'R': 62.0}, now=5.0)
+    assert intents.take(['L', 'R', 'S'], now=12.0) == {'R': 62.0}
+    assert len(intents) == 0 and intents.expired == 1
+
+
+def test_intents_acknowledged_measures_from_the_reconnect():
+    intents = IntentQueue()
+    intents.set_levels({'L': 60.0}, now=0.0)
+    intents.take(['L'], now=10.0)
+    assert intents.acknowledged('L', 59.0, now=10.2) is None  # Not the queued level
+    assert intents.acknowledged('L', 60.0, now=10.25) == pytest.approx(0.25)
+    assert intents.acknowledged('L', 60.0, now=11.0) is None
+    assert intents.stats()['count'] == 1
+
+
+def test_intents_failed_requeues_unless_newer():
+    intents = IntentQueue()
+    intents.set_levels({'L': 60.0, 'R': 60.0}, now=0.0)
+    intents.take(['L', 'R'], now=1.0)
+    intents.set_levels({'R': 70.0}, now=2.0)
+    intents.failed('L', 60.0)
+    intents.failed('R', 60.0)
+    assert intents.take(['L', 'R'], now=3.0) == {'L': 60.0, 'R': 70.0}
+
+
+# speakerctl arguments
+
+@pytest.fixture
+def sent(monkeypatch):
+    requests = []
+
+    def call(request, path=None):
+        requests.append(request)
+        return {'ok': True, 'level': 0.0, 'devices': {}}
+    monkeypatch.setattr(speakerctl, 'call', call)
+    return requests
+
+
+def test_speakerctl_sends_zero_levels(sent):
+    assert speakerctl.main(['set', '0']) == 0
+    assert speakerctl.main(['step', '0']) == 0
+    assert sent == [{'cmd': 'set', 'level': 0.0}, {'cmd': 'step', 'delta': 0.0}]
+
+
+def test_speakerctl_drops_unset_options(sent):
+    speakerctl.main(['get'])
+    speakerctl.main(['get', '--refresh'])
+    speakerctl.main(['--json', 'set', '72'])
+    assert sent == [{'cmd': 'get'}, {'cmd': 'get', 'refresh': True}, {'cmd': 'set', 'level': 72.0}]
+
+
+def test_speakerctl_history_span(sent, monkeypatch):
+    monkeypatch.setattr(speakerctl, 'call', lambda request, path=None: sent.append(request) or {
+        'ok': True, 'changes': [], 'times': [], 'mins': [], 'maxs': [], 'records': 0, 'elapsed_ms': 0.1})
+    speakerctl.main(['history', 'week', '--device', 'L'])
+    assert sent == [{'cmd': 'history', 'span': 7 * 86400, 'device': 'L', 'points': 60, 'changes': 20}]
+
+
+def test_speakerctl_fade_options(sent, monkeypatch):
+    monkeypatch.setattr(speakerctl, 'call', lambda request, path=None: sent.append(request) or {
+        'ok': True, 'level': 60.0, 'ramp': {'duration_ms': 500.0, 'planned_ms': 500.0, 'writes': 10,
+                                            'late_p95_ms': 1.0, 'spread_p95_ms': 0.5}})
+    assert speakerctl.main(['fade', '60']) == 0
+    assert speakerctl.main(['fade', '0', '-d', '0.5', '--shape', 's-curve']) == 0
+    assert sent == [{'cmd': 'fade', 'level': 60.0, 'duration': 2.0, 'shape': 'linear'},
+                    {'cmd': 'fade', 'level': 0.0, 'duration': 0.5, 'shape': 's-curve'}]
+    with pytest.raises(SystemExit):
+        speakerctl.main(['fade', '60', '--shape', 'exponential'])
+    assert len(sent) == 2
+
+
+# Device diffs
+
+Device = collections.namedtuple('Device', 'name ip port')
+
+
+def test_device_table_diffs_snapshots():
+    table = DeviceTable()
+    diff = table.update([Device('L', '10.0.0.1', 45), Device('R', '10.0.0.2', 45)])
+    assert [r.name for r in diff.added] == ['L', 'R'] and not diff.removed
+    diff = table.update([Device('L', '10.0.0.9', 45), Device('S', '10.0.0.3', 45)])
+    assert [r.name for r in diff.added] == ['S']
+    assert [r.name for r in diff.removed] == ['R']
+    assert [(r.name, r.ip) for r in diff.updated] == [('L', '10.0.0.9')]
+    assert not table.update([Device('L', '10.0.0.9', 45), Device('S', '10.0.0.3', 45)])
+
+
+def test_device_table_keeps_named_devices():
+    table = DeviceTable()
+    table.update([Device('L', '10.0.0.1', 45)])
+    assert not table.update([], keep=['L'])
+    assert table.names() == ['L']
+
+
+def test_device_table_apply_reports_only_real_changes():
+    table = DeviceTable()
+    table.seed([DeviceRecord('L', '10.0.0.1', 45)])
+    source = DeviceTable()
+    diff = source.update([Device('L', '10.0.0.1', 45), Device('R', '10.0.0.2', 45)])
+    effective = table.apply(diff)
+    assert [r.name for r in effective.added] == ['R'] and not effective.updated
+
+
+def test_discovery_cache_merges_and_ages_out(tmp_path):
+    path = str(tmp_path / 'devices.json')
+    cache = DiscoveryCache(path, max_age=100)
+    left, right = DeviceRecord('L', '10.0.0.1', 45), DeviceRecord('R', '10.0.0.2', 45)
+    cache.store('en0', [left, right], now=1000.0).result()
+    # R was slow this time: it stays cached
+    assert cache.store('en0', [left], now=1010.0) is None
+    moved = left._replace(ip='10.0.0.9')
+    cache.store('en0', [moved], now=1050.0).result()
+    assert DiscoveryCache(path).load('%en0') == [moved, right]
+    # R not seen for longer than max_age
+    cache.store('en0', [moved], now=1150.0).result()
+    assert DiscoveryCache(path).load('en0') == [moved]
+
+
+def test_pick_interface_prefers_the_busiest():
+    found = [DeviceRecord('L', 'fe80::1', 45, 'en1'), DeviceRecord('R', 'fe80::2', 45, 'en0'),
+             DeviceRecord('S', 'fe80::3', 45, 'en0'), DeviceRecord('T', '10.0.0.4', 45)]
+    assert pick_interface(found) == 'en0'
+    tied = found[:2]
+    assert pick_interface(tied) == 'en1'  # Found first
+    assert pick_interface(tied, current='en0') == 'en0'
+    assert pick_interface(found[3:], current='en2') == 'en2'
+
+
+# Reconnect backoff
+
+def test_backoff_doubles_up_to_the_cap_with_jitter():
+    rng = random.Random(1)
+    for attempt in range(12):
+        ceiling = min(30.0, 0.5 * 2 ** attempt)
+        delays = [backoff_delay(attempt, rng) for _ in range(50)]
+        assert all(ceiling / 2 <= delay <= ceiling for delay in delays)
+    assert backoff_delay(3, rng, min_delay=0.01, max_delay=0.05) <= 0.05
+
+
+# Groups
+
+def test_unknown_group_is_an_error():
+    groups = GroupManager([DeviceGroup('Mains', ['L', 'R'])])
+    assert groups.get(None).name == ALL_GROUP
+    assert groups.get('Mains').resolve(['S', 'R', 'L']) == ['L', 'R']
+    with pytest.raises(ValueError):
+        groups.get('Main')
+
+
+def test_group_members_and_offsets():
+    assert DeviceGroup('Room').resolve(['L', 'R']) == ['L', 'R']
+    assert DeviceGroup('Empty', []).resolve(['L', 'R']) == []
+    group = DeviceGroup('Room', offsets={'S': -3.0})
+    assert group.targets(89.0, ['L', 'S'], 0, 90) == {'L': 89.0, 'S': 86.0}
+    assert group.targets(-5.0, ['L'], 0, 90) == {'L': 0}
+    assert group.group_level('S', 86.0) == 89.0
+
+
+def test_groups_load(tmp_path):
+    path = tmp_path / 'groups.json'
+    path.write_text(json.dumps({'groups': {'Mains': {'members': ['L']}, 'Room': {}}}))
+    groups = GroupManager.load(str(path))
+    assert groups.names() == [ALL_GROUP, 'Mains', 'Room']
+    assert groups.get('Room').members is None
+
+
+def test_find_drift_against_the_majority():
+    group = DeviceGroup('Room', offsets={'S': -3.0})
+    statuses = {status.name: status for status in (
+        DeviceStatus('L', True, 70.0, False, None),
+        DeviceStatus('R', True, 70.04, False, None),
+        DeviceStatus('S', True, 67.0, False, None),  # On its offset
+        DeviceStatus('C', True, 72.0, False, None),
+        DeviceStatus('W', True, 70.0, True, None),
+        DeviceStatus('X', False, None, None, 'connection closed'))}
+    assert find_drift(statuses, group) == (70.0, ['C', 'W'])
+    assert find_drift({'X': statuses['X']}, group) == (None, [])
+
+
+# OSC
+
+def test_osc_round_trip():
+    assert parse_osc(encode_osc('/speaker/level', 72.5)) == [('/speaker/level', [72.5])]
+    assert parse_osc(encode_osc('/speaker/up')) == [('/speaker/up', [])]
+    assert parse_osc(encode_osc('/x', 3, 'name')) == [('/x', [3, 'name'])]
+
+
+def test_osc_bundle():
+    messages = [encode_osc('/speaker/step', 0.5), encode_osc('/speaker/down')]
+    bundle = b'#bundle\0' + b'\0' * 8 + b''.join(
+        len(message).to_bytes(4, 'big') + message for message in messages)
+    assert parse_osc(bundle) == [('/speaker/step', [0.5]), ('/speaker/down', [])]
+
+
+@pytest.mark.parametrize('data', [b'garbage', b'/speaker/level', b'/speaker/level\0\0,f\0\0\0\0'])
+def test_osc_rejects_bad_packets(data):
+    with pytest.raises(OscError):
+        parse_osc(data)
+
+
+def test_osc_events():
+    assert osc_event('/speaker/level', [72]) == (LEVEL, 72.0)
+    assert osc_event('/speaker/fader', [2.0]) == (LEVEL, 90.0)
+    assert osc_event('/speaker/down', []) == (STEP, -1.0)
+    assert osc_event('/speaker/step', [True]) is None
+    assert osc_event('/other', [1.0]) is None
+
+
+# Metering
+
+def test_meter_bank_rms_and_peak_hold():
+    bank = MeterBank(capacity=4, peak_hold=1.0, peak_fall=10.0)
+    bank.add('a')
+    bank.add('b')
+    for value in (-10.0, -10.0, -10.0, -10.0, -20.0):
+        bank.push('a', value)
+    frame = bank.frame(0.0)
+    assert frame['a'].level == -20.0 and frame['a'].peak == -10.0
+    assert frame['a'].rms == pytest.approx(10 * np.log10((3 * 0.1 + 0.01) / 4), abs=1e-4)
+    assert frame['b'] == (FLOOR_DB, FLOOR_DB, FLOOR_DB)
+    assert bank.frame(0.5)['a'].peak == -10.0  # Held
+    assert bank.frame(2.0)['a'].peak == pytest.approx(-20.0)  # Fell 10 dB in the second after
+    assert bank.decaying()
+    bank.frame(100.0)
+    assert not bank.decaying()
+
+
+# Level history
+
+def test_history_skips_repeats_and_lists_changes(tmp_path):
+    history = LevelHistory(str(tmp_path), segment_records=8)
+    assert history.open()
+    assert history.record('L', 70.0, CLICK, when=100.0)
+    assert not history.record('L', 70.0, REMOTE, when=101.0)
+    assert history.record('L', 71.0, REMOTE, when=102.0)
+    assert history.record('R', 70.0, CLICK, when=103.0)
+    assert [(e.device, e.level, e.source) for e in history.changes(0)] == \
+        [('L', 70.0, CLICK), ('L', 71.0, REMOTE), ('R', 70.0, CLICK)]
+    assert [e.time for e in history.changes(101.0, device='L')] == [102.0]
+    history.close()
+
+
+def test_history_summaries_match_raw_records(tmp_path):
+    history = LevelHistory(str(tmp_path), segment_records=64)
+    history.open()
+    rng = np.random.default_rng(1)
+    levels = np.round(rng.uniform(40, 80, 1000), 1)
+    for index, level in enumerate(levels):
+        history.record('L', float(level), CLICK, when=index * 10.0)
+    assert len(history) == len(history.changes(0))
+    start, end = 0.0, 10000.0
+    envelope = history.query(start, end, points=10)  # 1000 s buckets, from the 600 s summaries
+    times = np.array([e.time for e in history.changes(0)])
+    recorded = np.array([e.level for e in history.changes(0)])
+    for t, low, high in zip(envelope.times, envelope.mins, envelope.maxs):
+        width = envelope.times[1] - envelope.times[0]
+        inside = recorded[(times >= t) & (times < t + width)]
+        assert low == pytest.approx(inside.min(), abs=1e-3)
+        assert high == pytest.approx(inside.max(), abs=1e-3)
+    history.close()
+
+
+def test_history_reopens_and_is_exclusive(tmp_path):
+    history = LevelHistory(str(tmp_path), segment_records=4)
+    history.open()
+    for index in range(10):
+        history.record('L', 60.0 + index, CLICK, when=float(index))
+    history.close()
+    reopened = LevelHistory(str(tmp_path), segment_records=4)
+    assert reopened.open()
+    assert len(reopened) == 10
+    assert not reopened.record('L', 69.0, CLICK, when=20.0)  # Same as the last recorded level
+    assert not LevelHistory(str(tmp_path)).open()
+    reopened.close()
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Behaviour checks for the engine and its helpers against simulated
+speakers (ssc_simulator): acknowledged level writes, queued levels for
+offline speakers, the connection supervisor, ramps, snapshots and the
+status read. The fleet runs on its own loop in a thread, the engine on
+its transport loop, as in the benchmarks; run with
+
+    python -m pytest -q test_engine.py
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+import speaker_engine
+from connection_supervisor import OFFLINE, ONLINE, ConnectionSupervisor
+from device_tracking import DeviceRecord
+from level_ramp import S_CURVE, RampEngine, ramp_curve
+from room_status import aread_status
+from snapshots import DELAY_PATH, MUTE_PATH, SNAPSHOT_PATHS, SnapshotStore, acapture, arecall
+from speaker_engine import SpeakerEngine
+from ssc_codec import LEVEL_PATH, encode_get
+from ssc_simulator import start_fleet
+from ssc_transport import SscError, SscTransport
+
+
+@pytest.fixture
+def sim_loop():
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, name='simulator', daemon=True)
+    thread.start()
+    yield loop
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join(5)
+
+
+@pytest.fixture
+def fleet(sim_loop):
+    devices = asyncio.run_coroutine_threadsafe(start_fleet(3, seed=1, latency=0.001), sim_loop).result()
+    yield devices
+
+    async def stop():
+        await asyncio.gather(*(device.stop() for device in devices))
+    asyncio.run_coroutine_threadsafe(stop(), sim_loop).result()
+
+
+@pytest.fixture
+def engine(fleet, tmp_path):
+    engine = SpeakerEngine(devices=[DeviceRecord(d.name, d.host, d.port) for d in fleet]).start()
+    engine.snapshots = SnapshotStore(str(tmp_path / 'snapshots.json'))
+    run(engine, wait_for(lambda: len(engine.group_members()) == len(fleet)))
+    yield engine
+    engine.stop()
+
+
+def run(engine, coro, timeout=10):
+    """Run a coroutine on the engine's loop and return its result"""
+    return engine.transport.submit(coro).result(timeout)
+
+
+def on_simulator(sim_loop, coro):
+    """Run a coroutine on the fleet's loop and return its result"""
+    return asyncio.run_coroutine_threadsafe(coro, sim_loop).result(5)
+
+
+async def set_value(device, path, value):
+    device.set_value(path, value)
+
+
+async def wait_for(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise TimeoutError("Condition not reached")
+        await asyncio.sleep(0.005)
+
+
+def device_level(device):
+    return device.state['audio']['out']['level']
+
+
+def test_queued_level_does_not_override_a_later_direct_write(engine, fleet):
+    first = fleet[0].name
+
+    async def scenario():
+        engine.supervisor._set_state(first, OFFLINE)
+        await engine.aset_level(60.0)  # Queued for the offline speaker
+        assert engine.intents.level(first) == 60.0
+        # A level push brings it back before the supervisor reports it online
+        engine._on_level(first, 55.0)
+        assert first in engine.group_members() and first in engine.intents
+        await engine.aset_level(70.0)  # Written to it directly
+        assert first not in engine.intents
+        engine.supervisor._set_state(first, ONLINE)
+        await asyncio.sleep(0.2)
+    run(engine, scenario())
+    assert [device_level(device) for device in fleet] == [70.0] * len(fleet)
+
+
+# Acknowledged level writes
+
+def test_set_level_returns_what_each_speaker_reports(engine, fleet):
+    assert run(engine, engine.aset_level(72.5)) == {device.name: 72.5 for device in fleet}
+    assert run(engine, engine.aset_level(200.0)) == {device.name: 90.0 for device in fleet}
+    assert engine.ack_waiters == {}
+    assert run(engine, engine.aget_level(refresh=True)) == 90.0
+
+
+def test_set_level_times_out_naming_the_silent_speakers(engine, fleet, monkeypatch):
+    monkeypatch.setattr(speaker_engine, 'ACK_TIMEOUT', 0.05)
+    slow = fleet[1]
+    slow.latency = 0.3
+    with pytest.raises(SscError, match=f"within 0.05 s from {slow.name}$"):
+        run(engine, engine.aset_level(65.0))
+    assert engine.ack_waiters == {}
+    slow.latency = 0.001
+    monkeypatch.setattr(speaker_engine, 'ACK_TIMEOUT', 5.0)
+    # The late write still lands, and the next set is acknowledged as usual
+    assert run(engine, engine.aset_level(66.0))[slow.name] == 66.0
+
+
+def test_fade_fails_the_set_it_replaces(engine, fleet):
+    for device in fleet:
+        device.latency = 0.05
+
+    async def scenario():
+        pending = asyncio.ensure_future(engine.aset_level(60.0))
+        await asyncio.sleep(0.01)  # The write is in flight
+        report = await engine.afade(50.0, 0.2)
+        with pytest.raises(SscError, match='replaced by a fade'):
+            await pending
+        return report
+    report = run(engine, scenario())
+    assert report['final'] == {device.name: 50.0 for device in fleet}
+    assert not report['cancelled'] and report['errors'] == 0
+    assert engine.ack_waiters == {}
+    assert [device_level(device) for device in fleet] == [50.0] * len(fleet)
+
+
+def test_write_after_forget_waits_for_the_one_in_flight(engine, fleet, monkeypatch):
+    name = fleet[0].name
+    fleet[0].latency = 0.05
+    writes = []  # (loop time sent, writes to name then in flight)
+    in_flight = [0]
+    request = engine.transport.arequest
+
+    async def counting_request(device, command):
+        if device != name or command == encode_get(LEVEL_PATH):
+            return await request(device, command)
+        in_flight[0] += 1
+        writes.append((asyncio.get_running_loop().time(), in_flight[0]))
+        try:
+            return await request(device, command)
+        finally:
+            in_flight[0] -= 1
+    monkeypatch.setattr(engine.transport, 'arequest', counting_request)
+
+    async def scenario():
+        pending = asyncio.ensure_future(engine.aset_level(60.0))
+        await asyncio.sleep(0.01)  # The write to name is in flight
+        engine._forget([name], "test")
+        with pytest.raises(SscError, match='dropped: test'):
+            await pending
+        return await engine.aset_level(61.0)
+    assert run(engine, scenario())[name] == 61.0
+    assert [count for _, count in writes] == [1, 1]
+    assert writes[1][0] - writes[0][0] >= 1.0 / speaker_engine.LEVEL_WRITE_RATE
+    assert device_level(fleet[0]) == 61.0
+
+
+# Offline speakers
+
+def test_level_set_while_offline_lands_on_reconnect(engine, fleet, sim_loop):
+    engine.supervisor.min_backoff = engine.supervisor.max_backoff = 0.05
+    gone = fleet[0]
+    on_simulator(sim_loop, gone.stop())
+    run(engine, wait_for(lambda: engine.supervisor.states.get(gone.name) == OFFLINE))
+    assert gone.name not in engine.group_members()
+    result = run(engine, engine.aset_level(64.0))
+    assert result == {gone.name: None, fleet[1].name: 64.0, fleet[2].name: 64.0}
+    assert engine.intents.level(gone.name) == 64.0
+    on_simulator(sim_loop, gone.start())
+    run(engine, wait_for(lambda: device_level(gone) == 64.0))
+    assert len(engine.intents) == 0
+    run(engine, wait_for(lambda: engine.intents.stats()['count'] == 1))
+
+
+# Connection supervisor
+
+def test_supervisor_backs_off_and_reports_state_changes(fleet, sim_loop):
+    device = fleet[0]
+    transport = SscTransport(timeout=0.5).start()
+    changes = []
+    supervisor = ConnectionSupervisor(transport, on_state=lambda name, state: changes.append(state),
+                                      min_backoff=0.02, max_backoff=0.05, seed=1)
+    try:
+        transport.submit(transport.aset_devices([(device.name, device.host, device.port)])).result(5)
+        supervisor.add([device.name]).result(5)
+        transport.submit(wait_for(lambda: changes == [ONLINE])).result(5)
+        on_simulator(sim_loop, device.stop())
+        transport.submit(wait_for(lambda: supervisor.attempts.get(device.name, 0) >= 3)).result(5)
+        assert changes == [ONLINE, OFFLINE]  # Reported once, however many retries fail
+        on_simulator(sim_loop, device.start())
+        transport.submit(wait_for(lambda: changes[-1] == ONLINE)).result(5)
+        assert changes == [ONLINE, OFFLINE, ONLINE]
+        assert supervisor.attempts[device.name] == 0
+        assert transport.send(device.name, '{"audio":{"out":{"level":null}}}').result(5)
+    finally:
+        supervisor.stop().result(5)
+        transport.stop()
+
+
+# Ramps
+
+def test_ramp_reaches_its_ends_and_reports(engine, fleet):
+    ramps = RampEngine(engine.transport)
+    starts = {device.name: 60.0 for device in fleet}
+    ends = {fleet[0].name: 70.0, fleet[1].name: 65.0, fleet[2].name: 60.0}
+    report = run(engine, ramps.aramp(starts, ends, 0.25, S_CURVE))
+    assert report['shape'] == S_CURVE and report['ticks'] == len(ramp_curve(0.25))
+    assert report['final'] == ends
+    assert 0 < report['writes'] <= report['ticks'] * len(fleet)
+    assert report['errors'] == 0 and not report['cancelled']
+    assert [device_level(device) for device in fleet] == [70.0, 65.0, 60.0]
+    assert ramps.ramps == {}
+
+
+def test_ramp_stops_when_cancelled(engine, fleet):
+    ramps = RampEngine(engine.transport)
+    names = [device.name for device in fleet]
+
+    async def scenario():
+        ramp = asyncio.ensure_future(ramps.aramp(dict.fromkeys(names, 60.0), dict.fromkeys(names, 80.0), 2.0))
+        await asyncio.sleep(0.2)
+        ramps.acancel(names[:1])
+        return await ramp
+    report = run(engine, scenario())
+    assert report['cancelled'] and report['duration_ms'] < 1000.0
+    assert all(60.0 < device_level(device) < 80.0 for device in fleet)
+
+
+# Snapshots
+
+def test_snapshot_capture_and_recall(engine, fleet, sim_loop):
+    names = [device.name for device in fleet]
+    on_simulator(sim_loop, set_value(fleet[1], MUTE_PATH, True))
+    captured = run(engine, acapture(engine.transport, names))
+    assert captured[fleet[1].name] == {LEVEL_PATH: 80.0, MUTE_PATH: True, DELAY_PATH: 0.0,
+                                       SNAPSHOT_PATHS[3]: False}
+    run(engine, engine.aset_level(55.0))
+    on_simulator(sim_loop, set_value(fleet[1], MUTE_PATH, False))
+    results = run(engine, arecall(engine.transport, dict(captured, ghost={LEVEL_PATH: 1.0})))
+    assert sorted(results) == sorted(names)  # Unknown devices are skipped
+    assert not any(isinstance(raw, Exception) for raw in results.values())
+    assert [device_level(device) for device in fleet] == [80.0] * len(fleet)
+    assert fleet[1].state['audio']['out']['mute'] is True
+
+
+def test_snapshot_capture_keeps_the_addresses_a_device_knows(engine, fleet):
+    paths = (LEVEL_PATH, '/audio/out/nothere')
+    captured = run(engine, acapture(engine.transport, [fleet[0].name], paths))
+    assert captured == {fleet[0].name: {LEVEL_PATH: 80.0}}
+
+
+def test_engine_snapshot_round_trip(engine, fleet):
+    run(engine, engine.aset_level(75.0))
+    assert sorted(run(engine, engine.asave_snapshot('show'))) == [device.name for device in fleet]
+    run(engine, engine.aset_level(62.0))
+    outcome = run(engine, engine.arecall_snapshot('show'))
+    assert outcome == {device.name: 'ok' for device in fleet}
+    assert [device_level(device) for device in fleet] == [75.0] * len(fleet)
+    assert run(engine, engine.aget_level()) == 75.0
+    with pytest.raises(ValueError):
+        run(engine, engine.arecall_snapshot('missing'))
+
+
+# Status and drift
+
+def test_status_reports_drift_and_offline_speakers(engine, fleet, sim_loop):
+    run(engine, engine.aset_level(70.0))
+    on_simulator(sim_loop, set_value(fleet[1], LEVEL_PATH, 64.0))
+    status = run(engine, engine.astatus())
+    assert status['level'] == 70.0 and status['drifted'] == [fleet[1].name]
+    on_simulator(sim_loop, fleet[2].stop())
+    statuses = run(engine, aread_status(engine.transport, [device.name for device in fleet]))
+    assert statuses[fleet[0].name].online and statuses[fleet[0].name].mute is False
+    assert not statuses[fleet[2].name].online and statuses[fleet[2].name].error